@@ -0,0 +1,38 @@
+from django.contrib import admin
+from django.utils.html import format_html
+from .models import SlowQuery
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'duration_ms', 'view', 'method', 'short_sql', 'has_plan']
+    list_filter = ['view', 'database', 'created_at']
+    search_fields = ['sql', 'view', 'path']
+    ordering = ['-created_at']
+    readonly_fields = [
+        'created_at', 'duration_ms', 'database', 'view', 'method', 'path',
+        'fingerprint', 'repeats', 'sql', 'params', 'plan_display', 'plan_error',
+    ]
+    exclude = ['plan']
+    date_hierarchy = 'created_at'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    @admin.display(description='SQL')
+    def short_sql(self, obj):
+        return obj.sql if len(obj.sql) <= 120 else f"{obj.sql[:120]}…"
+    
+    @admin.display(description='Plan', boolean=True)
+    def has_plan(self, obj):
+        return bool(obj.plan)
+    
+    @admin.display(description='Plan')
+    def plan_display(self, obj):
+        return format_html('<pre style="white-space: pre-wrap">{}</pre>', obj.plan) if obj.plan else '-'
+    
+    @admin.display(description='Times logged')
+    def repeats(self, obj):
+        return SlowQuery.objects.filter(fingerprint=obj.fingerprint).count()
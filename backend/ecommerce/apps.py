@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class EcommerceConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "ecommerce"
+
+    def ready(self):
+        # Register the database and cache system checks
+        from . import checks  # noqa: F401
+        # Install the query timer behind MetricsMiddleware
+        from . import metrics  # noqa: F401
+        # Install the slow-query log on every connection
+        from . import slow_queries  # noqa: F401
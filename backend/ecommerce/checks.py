@@ -0,0 +1,108 @@
+"""
+System checks that the database and cache configured in settings are live.
+
+``check_databases`` runs with ``manage.py check --database default`` (and
+``migrate``); ``check_caches`` and ``check_connection_settings`` run with every
+``check``. ``verify_startup`` runs all of them when the WSGI/ASGI application
+loads if ``STARTUP_CHECKS`` is on, so a worker with an unreachable database or
+cache fails at boot instead of on its first request.
+"""
+
+import uuid
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.checks import Error, Tags, Warning, register
+from django.core.management.base import SystemCheckError
+from django.db import connections
+
+
+@register(Tags.database)
+def check_databases(app_configs, databases=None, **kwargs):
+    """Open a connection (or take one from the pool) and run a trivial query."""
+    errors = []
+    for alias in databases or []:
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception as e:
+            pooled = bool(connection.settings_dict.get('OPTIONS', {}).get('pool'))
+            errors.append(Error(
+                f"Could not query database {alias!r}{' through its connection pool' if pooled else ''}: {e}",
+                hint='Check the DB_* settings; DB_POOL requires psycopg[pool] >= 3.' if pooled else 'Check the DB_* settings.',
+                id='ecommerce.E001',
+            ))
+        finally:
+            # Hand the connection back before the workers start serving
+            connection.close()
+    return errors
+
+
+@register(Tags.caches)
+def check_caches(app_configs, **kwargs):
+    """Write and read back a probe key on every configured cache."""
+    errors = []
+    for alias in settings.CACHES:
+        key = f'ecommerce:check:{uuid.uuid4().hex}'
+        try:
+            cache = caches[alias]
+            cache.set(key, 1, 30)
+            live = cache.get(key) == 1
+            cache.delete(key)
+        except Exception as e:
+            live, detail = False, f': {e}'
+        else:
+            detail = ''
+        if not live:
+            errors.append(Error(
+                f"Cache {alias!r} did not return a value written to it{detail}",
+                hint='Check REDIS_URL.',
+                id='ecommerce.E002',
+            ))
+    return errors
+
+
+@register(Tags.database, Tags.caches)
+def check_connection_settings(app_configs, **kwargs):
+    """Flag settings that silently cost connections or per-process state, or cannot work."""
+    messages = []
+    for alias, config in settings.DATABASES.items():
+        pooled = bool(config.get('OPTIONS', {}).get('pool'))
+        if pooled and not (find_spec('psycopg') and find_spec('psycopg_pool')):
+            # Django's pool is psycopg 3 only; with psycopg2 the first connection fails
+            messages.append(Error(
+                f"Database {alias!r} has DB_POOL set but psycopg 3 and psycopg_pool are not installed.",
+                hint='pip install "psycopg[binary,pool]", or unset DB_POOL.',
+                id='ecommerce.E003',
+            ))
+        if not pooled and config.get('CONN_MAX_AGE', 0) == 0 and not settings.DEBUG:
+            messages.append(Warning(
+                f"Database {alias!r} opens a new connection for every request.",
+                hint='Set DB_CONN_MAX_AGE or DB_POOL=True.',
+                id='ecommerce.W001',
+            ))
+    throttle_alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')
+    if (
+        getattr(settings, 'THROTTLE_STORE', 'local') == 'cache'
+        and settings.CACHES.get(throttle_alias, {}).get('BACKEND', '').endswith('LocMemCache')
+    ):
+        messages.append(Warning(
+            'THROTTLE_STORE is "cache" but the throttle cache is per-process local memory.',
+            hint='Set REDIS_URL so every worker shares the buckets, or use THROTTLE_STORE=local.',
+            id='ecommerce.W002',
+        ))
+    return messages
+
+
+def verify_startup():
+    """Run the database and cache checks now; raise ``SystemCheckError`` on errors."""
+    errors = [
+        message
+        for message in checks.run_checks(tags=[Tags.database, Tags.caches], databases=list(settings.DATABASES))
+        if message.is_serious()
+    ]
+    if errors:
+        raise SystemCheckError('\n'.join(str(error) for error in errors))
@@ -0,0 +1,115 @@
+"""
+gzip and brotli compression for API responses.
+
+``CompressionMiddleware`` picks an encoding per request from ``Accept-Encoding``,
+honouring q-values and preferring brotli when the ``brotli`` package is
+installed. Responses are left alone when:
+
+* they are shorter than ``COMPRESSION_MIN_SIZE`` bytes (default 1024), which
+  fit in a packet or two anyway
+* their type is not in ``COMPRESSION_CONTENT_TYPES`` (JSON and plain text by
+  default; HTML is left out because admin pages carry CSRF tokens, which
+  compression would expose to BREACH)
+* they are streaming or already encoded
+* compressing does not make them smaller
+
+Levels default to gzip 6 and brotli 4 (``COMPRESSION_GZIP_LEVEL``,
+``COMPRESSION_BROTLI_QUALITY``), which are fast enough to compress per request.
+``COMPRESSION_ENABLED=False`` leaves compression to a proxy in front.
+"""
+
+import gzip
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_CONTENT_TYPES = ('application/json', 'text/plain')
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+
+
+def accepted_encodings(header):
+    """``Accept-Encoding`` as ``{coding: q}``, lower-cased."""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header, available):
+    """The encoding in ``available`` (in order of preference) the client rates highest, or None."""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY))
+    # mtime=0 keeps the output, and so ETags of it, stable
+    return gzip.compress(content, compresslevel=getattr(settings, 'COMPRESSION_GZIP_LEVEL', DEFAULT_GZIP_LEVEL), mtime=0)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses with brotli or gzip; list it after ``MetricsMiddleware`` so timings include it."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESSION_ENABLED', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+        self.content_types = tuple(getattr(settings, 'COMPRESSION_CONTENT_TYPES', DEFAULT_CONTENT_TYPES))
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.content_types:
+            return response
+        # Small responses of a compressible type could be large next time
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), available_encodings())
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ, so a strong ETag has to become weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
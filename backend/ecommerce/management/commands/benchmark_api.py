@@ -0,0 +1,267 @@
+import json
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from store.authentication import tokens_for_user
+from store.models import CartItem, Product, Review
+
+ADJECTIVES = ['Classic', 'Modern', 'Rustic', 'Compact', 'Deluxe', 'Organic', 'Wireless', 'Vintage', 'Portable', 'Ergonomic']
+NOUNS = ['Lamp', 'Chair', 'Mug', 'Backpack', 'Headphones', 'Notebook', 'Blanket', 'Kettle', 'Speaker', 'Desk']
+SCENARIOS = ['browse', 'search', 'rating_sort', 'add_to_cart', 'checkout']
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)]
+
+
+class Workload:
+    """
+    Seeded data and one request per scenario, as a shopper would send it.
+
+    Scenarios return ``(response, timed_from)``; ``timed_from`` is set when
+    untimed setup ran first.
+    """
+
+    def __init__(self, products, users, reviews_per_product, seed):
+        rng = random.Random(seed)
+        encoded = make_password('benchmark-password')
+        self.users = User.objects.bulk_create([
+            User(username=f'shopper{n}', email=f'shopper{n}@example.com', password=encoded)
+            for n in range(users)
+        ])
+        self.product_ids = [product.id for product in Product.objects.bulk_create([
+            Product(
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {n}',
+                description=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS).lower()} for everyday use',
+                price=Decimal(rng.randint(500, 20000)) / 100,
+                inventory_count=1_000_000,
+            )
+            for n in range(products)
+        ])]
+        reviews = []
+        for product_id in self.product_ids:
+            for user in rng.sample(self.users, min(reviews_per_product, len(self.users))):
+                reviews.append(Review(user=user, product_id=product_id, rating=rng.randint(1, 5), title='Benchmark'))
+        Review.objects.bulk_create(reviews, batch_size=1000)
+        self.headers = {
+            user.id: {'HTTP_AUTHORIZATION': f'Bearer {tokens_for_user(user).access_token}'}
+            for user in self.users
+        }
+        self.pages = max(math.ceil(products / 12), 1)
+
+    def browse(self, client, rng, users):
+        if rng.random() < 0.5:
+            return client.get('/api/products/', {'page': rng.randint(1, self.pages)}), None
+        return client.get(f'/api/products/{rng.choice(self.product_ids)}/'), None
+
+    def search(self, client, rng, users):
+        return client.get('/api/products/', {'search': rng.choice(NOUNS + ADJECTIVES).lower()}), None
+
+    def rating_sort(self, client, rng, users):
+        return client.get('/api/products/', {'ordering': '-average_rating', 'page': rng.randint(1, min(self.pages, 3))}), None
+
+    def add_to_cart(self, client, rng, users):
+        user = rng.choice(users)
+        data = {'product_id': rng.choice(self.product_ids), 'quantity': 1}
+        return client.post('/api/cart/', data, content_type='application/json', **self.headers[user.id]), None
+
+    def checkout(self, client, rng, users):
+        # Fill the cart outside the timed request; workers never share a shopper
+        user = rng.choice(users)
+        CartItem.objects.filter(user=user).delete()
+        CartItem.objects.bulk_create([
+            CartItem(user=user, product_id=product_id, quantity=rng.randint(1, 3))
+            for product_id in rng.sample(self.product_ids, min(3, len(self.product_ids)))
+        ])
+        started = time.perf_counter()
+        response = client.post(
+            '/api/orders/', {'shipping_address': '1 Benchmark Way'}, content_type='application/json', **self.headers[user.id]
+        )
+        return response, started
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and report throughput and latency percentiles for the main API flows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios',
+            default=','.join(SCENARIOS),
+            help=f'Comma-separated scenarios to run (default: {",".join(SCENARIOS)})'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests per scenario (default: 200)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Concurrent client threads (default: 4)'
+        )
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=500,
+            help='Products to seed (default: 500)'
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help='Shoppers to seed (default: 50)'
+        )
+        parser.add_argument(
+            '--reviews-per-product',
+            type=int,
+            default=5,
+            help='Reviews to seed per product (default: 5)'
+        )
+        parser.add_argument(
+            '--stripe-latency-ms',
+            type=float,
+            default=0,
+            help='Simulated Stripe PaymentIntent latency during checkout (default: 0)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed for data and request mix (default: 1)'
+        )
+        parser.add_argument(
+            '--json',
+            help='Write the results as JSON to this file ("-" for stdout)'
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON results of an earlier run to compare against'
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if options['users'] < options['workers'] or options['products'] < 1:
+            raise CommandError('Seed at least one product and at least as many users as workers.')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        # Benchmark data goes into a test database that is dropped afterwards
+        setup_test_environment()
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+            # A file rather than shared memory, so concurrent writers wait instead of failing
+            connection.settings_dict['TEST']['NAME'] = 'benchmark_api.sqlite3'
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with self.stubbed_stripe(options['stripe_latency_ms']), override_settings(
+                THROTTLE_RATES={'login': None, 'register': None, 'checkout': None},
+                STRIPE_SECRET_KEY='sk_test_benchmark',
+            ):
+                results = self.run(scenarios, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'config': {
+                key: options[key]
+                for key in ['requests', 'workers', 'products', 'users', 'reviews_per_product', 'stripe_latency_ms', 'seed']
+            } | {'database': connection.vendor},
+            'scenarios': results,
+        }
+        self.print_report(results, baseline)
+        if options['json'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        elif options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['json']}")
+
+    def stubbed_stripe(self, latency_ms):
+        def create(**params):
+            time.sleep(latency_ms / 1000)
+            return mock.Mock(id=f'pi_bench_{random.getrandbits(48):x}', client_secret='pi_bench_secret')
+
+        return mock.patch('stripe.PaymentIntent.create', side_effect=create)
+
+    def run(self, scenarios, options):
+        self.stdout.write(
+            f"Seeding {options['products']} products, {options['users']} users, "
+            f"{options['reviews_per_product']} reviews per product on {connection.vendor}"
+        )
+        workload = Workload(options['products'], options['users'], options['reviews_per_product'], options['seed'])
+        self.stdout.write(f"{options['requests']} requests per scenario on {options['workers']} threads\n")
+        results = {}
+        for name in scenarios:
+            results[name] = self.run_scenario(
+                workload, getattr(workload, name), options['requests'], options['workers'], options['seed']
+            )
+        return results
+
+    def run_scenario(self, workload, scenario, requests, workers, seed):
+        shares = [requests // workers + (1 if n < requests % workers else 0) for n in range(workers)]
+
+        def worker(index):
+            client, rng = Client(), random.Random(seed * 1000 + index)
+            users = workload.users[index::workers]
+            latencies, errors = [], 0
+            try:
+                # One untimed request to warm up the connection and caches
+                scenario(client, rng, users)
+                for _ in range(shares[index]):
+                    started = time.perf_counter()
+                    response, timed_from = scenario(client, rng, users)
+                    latencies.append(time.perf_counter() - (timed_from or started))
+                    errors += response.status_code >= 400
+            finally:
+                connections.close_all()
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(worker, range(workers)))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for worker_latencies, _errors in outcomes for latency in worker_latencies)
+        return {
+            'requests': len(latencies),
+            'errors': sum(errors for _latencies, errors in outcomes),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+
+    def print_report(self, results, baseline=None):
+        self.stdout.write(f"{'scenario':<14} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, result in results.items():
+            line = (
+                f"{name:<14} {result['throughput_rps']:8.1f} {result['p50_ms']:8.2f} "
+                f"{result['p95_ms']:8.2f} {result['p99_ms']:8.2f} {result['errors']:7d}"
+            )
+            before = (baseline or {}).get('scenarios', {}).get(name)
+            if before:
+                line += (
+                    f"  throughput {result['throughput_rps'] / before['throughput_rps']:.2f}x, "
+                    f"p95 {result['p95_ms'] - before['p95_ms']:+.2f} ms"
+                )
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
@@ -0,0 +1,104 @@
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+class Command(BaseCommand):
+    help = 'Compare request throughput with a new database connection per request versus reused connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='/api/products/',
+            help='Endpoint to request (default: /api/products/)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Requests per mode (default: 500)'
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=60,
+            help='CONN_MAX_AGE for the persistent mode when settings do not set one (default: 60)'
+        )
+
+    def modes(self, max_age):
+        """(label, CONN_MAX_AGE, pool options) for each mode to measure."""
+        configured = connection.settings_dict
+        pool = configured['OPTIONS'].get('pool')
+        max_age = configured.get('CONN_MAX_AGE') or max_age
+        modes = [
+            ('new connection per request', 0, None),
+            (f'persistent (CONN_MAX_AGE={max_age})', max_age, None),
+        ]
+        if pool:
+            modes.append(('psycopg connection pool', 0, pool))
+        return modes
+
+    def configure(self, max_age, pool):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.settings_dict['OPTIONS'].pop('pool', None)
+        if pool:
+            connection.settings_dict['OPTIONS']['pool'] = pool
+
+    def request(self, handler, path, host):
+        """One request through the full WSGI stack, request_started to request_finished."""
+        environ = {'PATH_INFO': path, 'HTTP_HOST': host}
+        setup_testing_defaults(environ)
+        statuses = []
+        response = handler(environ, lambda status, headers: statuses.append(status))
+        b''.join(response)
+        # Sends request_finished, which closes or keeps the connection per CONN_MAX_AGE
+        response.close()
+        return statuses[0]
+
+    def run(self, label, handler, path, host, requests):
+        opened = []
+
+        def count(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count)
+        try:
+            status = self.request(handler, path, host)
+            if not status.startswith('200'):
+                raise CommandError(f'GET {path} returned {status}')
+            started = time.perf_counter()
+            for _ in range(requests):
+                self.request(handler, path, host)
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count)
+        self.stdout.write(
+            f'{label:<32} {requests / elapsed:8.1f} req/s  {elapsed / requests * 1000:6.2f} ms/req  '
+            f'{len(opened)} connections opened'
+        )
+        return requests / elapsed
+
+    def handle(self, *args, **options):
+        host = next((h for h in settings.ALLOWED_HOSTS if h not in ('*', '') and not h.startswith('.')), 'localhost')
+        original = (connection.settings_dict.get('CONN_MAX_AGE', 0), connection.settings_dict['OPTIONS'].get('pool'))
+        self.stdout.write(
+            f"GET {options['path']} x {options['requests']} on {connection.vendor} "
+            f"({connection.settings_dict['NAME']})"
+        )
+        handler = WSGIHandler()
+        results = []
+        try:
+            for label, max_age, pool in self.modes(options['max_age']):
+                self.configure(max_age, pool)
+                results.append((label, self.run(label, handler, options['path'], host, options['requests'])))
+        finally:
+            self.configure(*original)
+
+        baseline = results[0][1]
+        for label, rate in results[1:]:
+            self.stdout.write(self.style.SUCCESS(f'{label}: {rate / baseline:.2f}x a connection per request'))
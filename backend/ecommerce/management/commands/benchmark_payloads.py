@@ -0,0 +1,108 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.renderers import JSONRenderer
+
+from ecommerce import compression
+from ecommerce.renderers import ORJSONRenderer
+from orders.models import Order, OrderItem
+from .benchmark_api import Workload
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON rendering and response compression on product list, product detail and order list payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Renders and compressions timed per payload (default: 200)'
+        )
+        parser.add_argument(
+            '--reviews',
+            type=int,
+            default=50,
+            help='Reviews on the product shown in the detail payload (default: 50)'
+        )
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=20,
+            help='Orders, of three items each, in the order list payload (default: 20)'
+        )
+
+    def handle(self, *args, **options):
+        # Payloads come from a test database that is dropped afterwards
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            payloads = self.payloads(options['reviews'], options['orders'])
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        iterations = options['iterations']
+        encodings = compression.available_encodings()
+        if compression.brotli is None:
+            self.stdout.write('brotli is not installed; measuring gzip only')
+        for name, data in payloads:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            stdlib = self.time(lambda: JSONRenderer().render(data), iterations)
+            fast = self.time(lambda: ORJSONRenderer().render(data), iterations)
+            content = JSONRenderer().render(data)
+            if ORJSONRenderer().render(data) != content:
+                self.stdout.write(self.style.ERROR('  orjson output differs from JSONRenderer'))
+            self.stdout.write(f'  {"JSONRenderer":<16} {stdlib * 1e6:9.1f} µs  {len(content):8d} bytes')
+            self.stdout.write(f'  {"ORJSONRenderer":<16} {fast * 1e6:9.1f} µs  {stdlib / fast:.1f}x faster')
+            for encoding in encodings:
+                compressed = compression.compress(content, encoding)
+                elapsed = self.time(lambda: compression.compress(content, encoding), iterations)
+                self.stdout.write(
+                    f'  {encoding:<16} {elapsed * 1e6:9.1f} µs  {len(compressed):8d} bytes  '
+                    f'{len(compressed) / len(content):.0%} of the original'
+                )
+
+    def time(self, fn, iterations):
+        """Mean seconds per call, after one warm-up call."""
+        fn()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - started) / iterations
+
+    def payloads(self, reviews, orders):
+        workload = Workload(products=100, users=max(reviews, 1), reviews_per_product=reviews, seed=1)
+        rng = random.Random(1)
+        user = workload.users[0]
+        created = Order.objects.bulk_create([
+            Order(user=user, total_amount=Decimal('0'), status='delivered', shipping_address='1 Benchmark Way')
+            for _ in range(orders)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product_id=product_id, quantity=rng.randint(1, 3),
+                unit_price=Decimal(rng.randint(500, 20000)) / 100, product_name=f'Product {product_id}',
+            )
+            for order in created
+            for product_id in rng.sample(workload.product_ids, 3)
+        ])
+        client = Client()
+        requests = [
+            ('product list', '/api/products/', {}),
+            ('product detail', f'/api/products/{workload.product_ids[0]}/', {}),
+            ('order list', '/api/orders/', workload.headers[user.id]),
+        ]
+        payloads = []
+        for name, path, headers in requests:
+            response = client.get(path, **headers)
+            if response.status_code != 200:
+                raise CommandError(f'GET {path} returned {response.status_code}')
+            payloads.append((name, response.data))
+        return payloads
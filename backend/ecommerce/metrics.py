@@ -0,0 +1,298 @@
+"""
+Per-request performance metrics, exported in the Prometheus text format.
+
+``MetricsMiddleware`` times every request into a latency histogram per route.
+A sampled share of requests (``METRICS_SAMPLE_RATE``, default 1.0) also gets a
+breakdown:
+
+* database queries and their time, from a wrapper installed on every connection
+* serializer time, spent in ``to_representation`` of the API's serializers,
+  which mix in ``TimedSerializerMixin``
+* external call time, for the Stripe, Slack and email calls wrapped in
+  ``external_call``
+
+The breakdown is added to the aggregates and returned in a ``Server-Timing``
+header. For requests that are not sampled the middleware only reads the clock
+twice and updates one histogram; the query wrapper and the serializer timer
+return straight away when no request is being sampled.
+
+Aggregates live in process memory: each worker process serves its own at
+``/metrics``.
+"""
+
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+
+from . import throttling
+
+DEFAULT_SAMPLE_RATE = 1.0
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by route.'),
+    'http_requests_total': ('counter', 'Requests by route and status code.'),
+    'http_requests_sampled_total': ('counter', 'Requests whose query, serializer and external time was measured.'),
+    'http_request_db_queries_total': ('counter', 'Database queries run by sampled requests.'),
+    'http_request_db_seconds_total': ('counter', 'Time sampled requests spent in database queries.'),
+    'http_request_serializer_seconds_total': ('counter', 'Time sampled requests spent building serializer data.'),
+    'http_request_external_seconds_total': ('counter', 'Time sampled requests spent in external calls.'),
+    'external_call_duration_seconds': ('histogram', 'Latency of calls to external services.'),
+    'external_call_errors_total': ('counter', 'External calls that raised.'),
+    'throttle_rejections_total': ('counter', 'Requests rejected by the token-bucket throttles.'),
+}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus +Inf; buckets are inclusive upper bounds
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        """``(le, cumulative count)`` pairs, ending with ``+Inf``."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield ('+Inf' if bound == float('inf') else repr(bound)), total
+
+
+class Registry:
+    """Counters and histograms keyed by metric name and a tuple of label pairs."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self.counters[name, labels] += amount
+
+    def histogram(self, name, labels):
+        # Call with the lock held
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = self.histograms[name, labels] = Histogram()
+        return histogram
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            self.histogram(name, labels).observe(value)
+
+    def record_request(self, method, route, status, elapsed, timings=None):
+        labels = (('method', method), ('route', route))
+        with self.lock:
+            self.histogram('http_request_duration_seconds', labels).observe(elapsed)
+            self.counters['http_requests_total', labels + (('status', str(status)),)] += 1
+            if timings is not None:
+                self.counters['http_requests_sampled_total', labels] += 1
+                self.counters['http_request_db_queries_total', labels] += timings.db_queries
+                self.counters['http_request_db_seconds_total', labels] += timings.db_seconds
+                self.counters['http_request_serializer_seconds_total', labels] += timings.serializer_seconds
+                self.counters['http_request_external_seconds_total', labels] += timings.external_seconds
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self, extra=()):
+        """The registry, plus ``extra`` ``(name, labels, value)`` counters, as Prometheus text."""
+        with self.lock:
+            counters = list(self.counters.items()) + [((name, labels), value) for name, labels, value in extra]
+            histograms = [(key, list(histogram.samples()), histogram.sum) for key, histogram in self.histograms.items()]
+        lines = {}
+        for (name, labels), value in counters:
+            lines.setdefault(name, []).append(f'{name}{format_labels(labels)} {format_value(value)}')
+        for (name, labels), samples, total in histograms:
+            out = lines.setdefault(name, [])
+            for le, count in samples:
+                out.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {count}')
+            out.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+            out.append(f'{name}_count{format_labels(labels)} {samples[-1][1]}')
+        text = []
+        for name in sorted(lines):
+            kind, description = METRICS.get(name, ('untyped', ''))
+            text.append(f'# HELP {name} {description}')
+            text.append(f'# TYPE {name} {kind}')
+            text.extend(lines[name])
+        return '\n'.join(text) + '\n'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+
+class RequestTimings:
+    """The breakdown collected for one sampled request."""
+    __slots__ = ('db_queries', 'db_seconds', 'serializer_seconds', 'external_seconds', 'in_serializer')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.external_seconds = 0.0
+        self.in_serializer = False
+
+
+# Timings of the request being sampled in this thread or task, if any
+current_timings = ContextVar('current_timings', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_queries += 1
+        timings.db_seconds += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # Outermost, so execute_wrapper() blocks open at connect time still pop their own wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+class TimedSerializerMixin:
+    """
+    Count ``to_representation`` toward the sampled request's serializer time.
+
+    List it before the DRF base class. With ``many=True`` each item is timed
+    by the child; nested serializers count once, inside their parent.
+    """
+
+    def to_representation(self, instance):
+        timings = current_timings.get()
+        if timings is None or timings.in_serializer:
+            return super().to_representation(instance)
+        timings.in_serializer = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timings.in_serializer = False
+            timings.serializer_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def external_call(service):
+    """Time a call to ``service`` (e.g. ``'stripe'``); works around ``await`` too."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        registry.inc('external_call_errors_total', (('service', service),))
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe('external_call_duration_seconds', (('service', service),), elapsed)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.external_seconds += elapsed
+
+
+def route_label(request):
+    """The URL pattern that matched, so label values stay bounded."""
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+def server_timing(elapsed, timings):
+    return (
+        f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.db_queries} queries", '
+        f'serializer;dur={timings.serializer_seconds * 1000:.1f}, '
+        f'external;dur={timings.external_seconds * 1000:.1f}, '
+        f'total;dur={elapsed * 1000:.1f}'
+    )
+
+
+class MetricsMiddleware:
+    """Record request metrics; list it first in ``MIDDLEWARE`` to time the whole stack."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings() if self.sampled() else None
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings() if self.sampled() else None
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, timings)
+
+    def finish(self, request, response, elapsed, timings):
+        registry.record_request(request.method, route_label(request), response.status_code, elapsed, timings)
+        if timings is not None:
+            response['Server-Timing'] = server_timing(elapsed, timings)
+        return response
+
+
+def throttle_samples():
+    return [
+        ('throttle_rejections_total', (('scope', scope),), count)
+        for scope, count in sorted(throttling.rejection_counts().items())
+    ]
+
+
+def render():
+    return registry.render(extra=throttle_samples())
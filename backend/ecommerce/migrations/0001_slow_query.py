@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        help_text="Hash of the SQL with IN lists collapsed, shared by repeats of the same query",
+                        max_length=40,
+                    ),
+                ),
+                ("sql", models.TextField()),
+                ("params", models.TextField(blank=True)),
+                ("duration_ms", models.FloatField()),
+                ("database", models.CharField(default="default", max_length=100)),
+                (
+                    "view",
+                    models.CharField(
+                        blank=True,
+                        help_text="URL name or route of the request that ran the query",
+                        max_length=200,
+                    ),
+                ),
+                ("method", models.CharField(blank=True, max_length=10)),
+                ("path", models.CharField(blank=True, max_length=500)),
+                ("plan", models.TextField(blank=True)),
+                ("plan_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name_plural": "slow queries",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["created_at"], name="ecommerce_s_created_6b41e2_idx"
+                    ),
+                    models.Index(
+                        fields=["fingerprint", "created_at"],
+                        name="ecommerce_s_fingerp_0c36a9_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
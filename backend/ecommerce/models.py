@@ -0,0 +1,26 @@
+from django.db import models
+
+class SlowQuery(models.Model):
+    """A query that ran longer than ``SLOW_QUERY_THRESHOLD_MS``, with its plan; see ``ecommerce.slow_queries``."""
+    fingerprint = models.CharField(max_length=40, help_text='Hash of the SQL with IN lists collapsed, shared by repeats of the same query')
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    duration_ms = models.FloatField()
+    database = models.CharField(max_length=100, default='default')
+    view = models.CharField(max_length=200, blank=True, help_text='URL name or route of the request that ran the query')
+    method = models.CharField(max_length=10, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    plan = models.TextField(blank=True)
+    plan_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'slow queries'
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['fingerprint', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.duration_ms:.0f} ms in {self.view or 'no view'}"
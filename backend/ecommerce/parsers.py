@@ -0,0 +1,32 @@
+"""
+JSON parsing with orjson, falling back to DRF's ``JSONParser``.
+
+orjson reads UTF-8 only and rejects integers over 64 bits. Other charsets and
+bodies it cannot read go to DRF's parser, which returns the same data or
+raises the same ``ParseError`` it always has.
+"""
+
+import io
+
+import orjson
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from .renderers import ORJSONRenderer
+
+UTF8 = ('utf-8', 'utf8')
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower() not in UTF8:
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
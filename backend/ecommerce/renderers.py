@@ -0,0 +1,47 @@
+"""
+JSON rendering with orjson, byte-for-byte the output of DRF's ``JSONRenderer``.
+
+orjson only covers the default compact, UTF-8 output. Anything else goes to
+DRF's renderer: indented output (``Accept: application/json; indent=4``, the
+browsable API), ``UNICODE_JSON``/``COMPACT_JSON`` turned off, and values orjson
+would write differently, such as integers over 64 bits. Types orjson does not
+know, and datetimes, are converted by DRF's own encoder. Decimals that would
+come out in exponent form or not at all (NaN, infinities) are handed back to
+DRF whole, so they render or fail exactly as before. Plain floats go straight
+to orjson, which would write a NaN or an exponent differently; the API's only
+floats are average ratings.
+"""
+
+from decimal import Decimal
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+encoder = JSONRenderer.encoder_class()
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def default(obj):
+    """DRF's conversions for types orjson leaves to us."""
+    if isinstance(obj, Decimal):
+        value = float(obj)
+        # In this range json and orjson write floats alike; outside it json uses
+        # exponents (1e+16, orjson 1e16) and rejects NaN, so let DRF render those
+        if 1e-4 <= abs(value) < 1e16 or value == 0:
+            return value
+        raise TypeError(f'{obj} is rendered by JSONRenderer')
+    return encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Keep the output a strict JavaScript subset, as DRF does
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,13 @@
+"""
+Settings package; DJANGO_ENV picks the profile (``dev`` by default, or ``prod``).
+
+Point DJANGO_SETTINGS_MODULE at ``ecommerce.settings.dev`` or
+``ecommerce.settings.prod`` to choose one directly.
+"""
+
+from decouple import config
+
+if config('DJANGO_ENV', default='dev') == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    from .dev import *  # noqa: F401,F403
@@ -0,0 +1,19 @@
+"""
+Local development settings.
+"""
+
+from .base import *  # noqa: F401,F403
+from .base import REST_FRAMEWORK, config
+
+DEBUG = config('DEBUG', default=True, cast=bool)
+
+ALLOWED_HOSTS = ['*']
+
+REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+    'ecommerce.renderers.ORJSONRenderer',
+    'rest_framework.renderers.BrowsableAPIRenderer',
+]
+
+# Print emails to the console until a SendGrid key is configured
+if not config('SENDGRID_API_KEY', default=''):
+    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
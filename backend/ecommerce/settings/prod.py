@@ -0,0 +1,36 @@
+"""
+Production settings.
+
+DEBUG is always off, SECRET_KEY and ALLOWED_HOSTS must come from the
+environment, templates are compiled once per process and the database and
+cache are checked when the application loads.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, TEMPLATES, config, Csv
+
+DEBUG = False
+
+SECRET_KEY = config('SECRET_KEY')
+
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', cast=Csv())
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    raise ImproperlyConfigured('Set DB_NAME to run with the production settings.')
+
+# Keep compiled templates in memory instead of re-reading them per render
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+STARTUP_CHECKS = config('STARTUP_CHECKS', default=True, cast=bool)
+
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
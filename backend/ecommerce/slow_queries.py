@@ -0,0 +1,251 @@
+"""
+Slow-query log with ``EXPLAIN`` capture.
+
+A wrapper installed on every database connection times each query. Queries
+that take longer than ``SLOW_QUERY_THRESHOLD_MS`` (default 200; 0 turns the
+log off) are logged as warnings on the ``ecommerce.slow_queries`` logger, with
+the view that ran them, taken from the request ``SlowQueryMiddleware`` tracks.
+
+A sampled share of them (``SLOW_QUERY_SAMPLE_RATE``, default 1.0), capped by a
+token bucket (``SLOW_QUERY_RATE``, default ``'30/min'`` per process), is handed
+to one background thread. That thread runs ``EXPLAIN`` on its own connection
+and saves a ``SlowQuery`` row, browsable in the admin. The request never waits
+on it: when the thread falls behind by ``SLOW_QUERY_MAX_PENDING`` captures,
+new ones are dropped. Only ``SELECT`` statements are explained, and never with
+``ANALYZE``, so the query does not run a second time.
+
+Parameters are used for ``EXPLAIN`` but not stored: they carry password
+hashes, emails, addresses and payment secrets. ``SLOW_QUERY_STORE_PARAMS=True``
+keeps them, for debugging on data that is safe to expose in the admin.
+
+Rows older than ``SLOW_QUERY_RETENTION_DAYS`` (default 7) are purged as new
+ones come in.
+"""
+
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from . import throttling
+
+DEFAULT_THRESHOLD_MS = 200
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_RATE = '30/min'
+DEFAULT_MAX_PENDING = 100
+DEFAULT_RETENTION_DAYS = 7
+PURGE_EVERY = 100
+MAX_PARAMS_LENGTH = 2000
+EXPLAINABLE = ('SELECT', 'WITH')
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+logger = logging.getLogger(__name__)
+
+# The request being served in this thread or task, if any
+current_request = ContextVar('current_request', default=None)
+
+# Set on the capture thread so its own EXPLAIN and INSERT are not logged
+_capturing = threading.local()
+
+
+def fingerprint(sql):
+    """Hash of ``sql`` with whitespace normalised and ``IN (%s, ...)`` lists of any length collapsed."""
+    normalised = WHITESPACE.sub(' ', IN_LIST.sub('(...)', sql)).strip()
+    return hashlib.sha1(normalised.encode()).hexdigest()
+
+
+def view_label(request):
+    if request is None:
+        return ''
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return ''
+    return match.view_name or match.route
+
+
+class SlowQueryLog:
+    """Rate-limits captures and runs them on a single background thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bucket = None
+        self.pending = 0
+        self.captured = 0
+        self.executor = None
+        self.pid = None
+
+    def allow(self):
+        """Sample, then take a token from the per-process bucket."""
+        sample_rate = getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+        if sample_rate < 1 and random.random() >= sample_rate:
+            return False
+        capacity, refill_rate = throttling.parse_rate(getattr(settings, 'SLOW_QUERY_RATE', DEFAULT_RATE))
+        now = time.monotonic()
+        with self.lock:
+            tokens = throttling.refill(self.bucket, capacity, refill_rate, now)
+            allowed, tokens, _wait = throttling.take_token(tokens, refill_rate)
+            self.bucket = (tokens, now)
+            if allowed and self.pending >= getattr(settings, 'SLOW_QUERY_MAX_PENDING', DEFAULT_MAX_PENDING):
+                return False
+            if allowed:
+                self.pending += 1
+            return allowed
+
+    def submit(self, entry):
+        with self.lock:
+            # A forked worker does not inherit the parent's thread
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query')
+                self.pid = os.getpid()
+            executor = self.executor
+        executor.submit(self.capture_in_worker_thread, entry)
+
+    def capture_in_worker_thread(self, entry):
+        _capturing.active = True
+        close_old_connections()
+        try:
+            capture(entry)
+            with self.lock:
+                self.captured += 1
+                purge = self.captured % PURGE_EVERY == 0
+            if purge:
+                purge_old()
+        except Exception:
+            logger.exception('Could not record slow query')
+        finally:
+            with self.lock:
+                self.pending -= 1
+            close_old_connections()
+            _capturing.active = False
+
+    def reset(self):
+        with self.lock:
+            self.bucket = None
+            self.pending = 0
+            self.captured = 0
+
+
+log = SlowQueryLog()
+
+
+def explain(alias, sql, params):
+    """The plan of ``sql`` as text, from a connection of this thread's own."""
+    connection = connections[alias]
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        # PostgreSQL returns one line per row; SQLite's detail is the last column
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def capture(entry):
+    """Explain a logged query and save it as a ``SlowQuery``."""
+    from .models import SlowQuery
+
+    plan, plan_error = '', ''
+    if entry['many']:
+        plan_error = 'executemany() is not explained'
+    elif not entry['sql'].lstrip().upper().startswith(EXPLAINABLE):
+        plan_error = 'Only SELECT statements are explained'
+    else:
+        try:
+            plan = explain(entry['database'], entry['sql'], entry['params'])
+        except Exception as e:
+            plan_error = f"{type(e).__name__}: {e}"
+    params = ''
+    if getattr(settings, 'SLOW_QUERY_STORE_PARAMS', False) and entry['params'] is not None:
+        params = repr(entry['params'])
+    return SlowQuery.objects.using(entry['database']).create(
+        fingerprint=fingerprint(entry['sql']),
+        sql=entry['sql'],
+        params=params[:MAX_PARAMS_LENGTH],
+        duration_ms=entry['duration_ms'],
+        database=entry['database'],
+        view=entry['view'][:200],
+        method=entry['method'],
+        path=entry['path'][:500],
+        plan=plan,
+        plan_error=plan_error,
+    )
+
+
+def purge_old():
+    from .models import SlowQuery
+
+    days = getattr(settings, 'SLOW_QUERY_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    return SlowQuery.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()[0]
+
+
+def log_slow_query(execute, sql, params, many, context):
+    threshold_ms = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS)
+    if not threshold_ms or getattr(_capturing, 'active', False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= threshold_ms:
+            request = current_request.get()
+            view = view_label(request)
+            logger.warning('Slow query (%.0f ms) in %s: %s', duration_ms, view or 'no view', WHITESPACE.sub(' ', sql)[:300])
+            if log.allow():
+                log.submit({
+                    'database': context['connection'].alias,
+                    'sql': sql,
+                    'params': params,
+                    'many': many,
+                    'duration_ms': duration_ms,
+                    'view': view,
+                    'method': request.method if request is not None else '',
+                    'path': request.path if request is not None else '',
+                })
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    # Outermost, so execute_wrapper() blocks open at connect time still pop their own wrapper
+    if log_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_query)
+
+
+connection_created.connect(install_slow_query_log)
+
+
+class SlowQueryMiddleware:
+    """Make the current request known to the slow-query log, for the view name it records."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_request.reset(token)
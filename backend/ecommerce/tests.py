@@ -0,0 +1,675 @@
+import gzip
+import io
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from django.utils import timezone
+from django.utils.functional import lazy
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from orders import urls as order_urls
+from orders.models import ArchivedOrder, ArchivedOrderItem, InventoryHold, Order, OrderItem
+from store import urls as store_urls
+from store.authentication import forget_version
+from store.models import Product, CartItem, Review
+from store.serializers import ProductSerializer
+from . import checks, compression, metrics, slow_queries, throttling
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .models import SlowQuery
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketStoreTests(SimpleTestCase):
+    def check_store(self, store):
+        # 3 tokens, refilled at one per 10 seconds
+        capacity, refill_rate = 3, 0.1
+        results = [store.take('bucket', capacity, refill_rate, 1000.0)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        allowed, wait = store.take('bucket', capacity, refill_rate, 1000.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 10.0)
+        self.assertTrue(store.take('bucket', capacity, refill_rate, 1010.0)[0])
+        self.assertFalse(store.take('bucket', capacity, refill_rate, 1010.0)[0])
+        # Never refills past capacity
+        self.assertEqual([store.take('bucket', capacity, refill_rate, 5000.0)[0] for _ in range(4)], [True, True, True, False])
+        # Other buckets are independent
+        self.assertTrue(store.take('other', capacity, refill_rate, 1000.0)[0])
+
+    def test_local_store(self):
+        self.check_store(throttling.LocalBucketStore())
+
+    def test_local_store_evicts_least_recently_used(self):
+        store = throttling.LocalBucketStore(max_keys=2)
+        for key in ['a', 'b', 'a', 'c']:
+            store.take(key, 1, 1.0, 0.0)
+        self.assertEqual(list(store.buckets), ['a', 'c'])
+
+    def test_cache_store(self):
+        cache.clear()
+        self.check_store(throttling.CacheBucketStore())
+
+    def test_cache_store_does_not_overspend_under_concurrency(self):
+        cache.clear()
+        store = throttling.CacheBucketStore()
+        get = store.cache.get
+
+        def slow_get(*args, **kwargs):
+            # Widen the window between reading and writing the bucket
+            value = get(*args, **kwargs)
+            threading.Event().wait(0.01)
+            return value
+
+        results = []
+        # Long enough for every thread to get the lock in turn
+        with mock.patch.object(store.cache, 'get', slow_get), mock.patch.object(throttling, 'LOCK_WAIT', 5):
+            threads = [
+                threading.Thread(target=lambda: results.append(store.take('bucket', 5, 0.001, 1000.0)[0]))
+                for _ in range(10)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results.count(True), 5)
+
+    def test_cache_store_rejects_while_bucket_is_locked(self):
+        cache.clear()
+        store = throttling.CacheBucketStore()
+        cache.add(throttling.LOCK_KEY.format(key='bucket'), 1)
+        with mock.patch.object(throttling, 'LOCK_WAIT', 0):
+            self.assertEqual(store.take('bucket', 3, 0.1, 1000.0), (False, 0))
+        cache.delete(throttling.LOCK_KEY.format(key='bucket'))
+        self.assertTrue(store.take('bucket', 3, 0.1, 1000.0)[0])
+
+    def test_cache_store_lock_is_only_released_by_its_holder(self):
+        cache.clear()
+        store = throttling.CacheBucketStore()
+        token = store.acquire('bucket:lock')
+        # The lock expired and another worker took it
+        cache.set('bucket:lock', 'other')
+        store.release('bucket:lock', token)
+        self.assertEqual(cache.get('bucket:lock'), 'other')
+        store.release('bucket:lock', 'other')
+        self.assertIsNone(cache.get('bucket:lock'))
+
+    def test_redis_store_takes_in_one_script(self):
+        redis_cache = RedisCache('redis://localhost:6379/0', {'KEY_PREFIX': 'pactle'})
+        client = mock.Mock()
+        client.eval.return_value = [0, '2.5']
+        redis_cache._cache = mock.Mock(get_client=mock.Mock(return_value=client))
+        store = throttling.CacheBucketStore()
+        store.cache = redis_cache
+        with mock.patch.object(redis_cache, 'add') as add:
+            self.assertEqual(store.take('bucket', 3, 0.1, 1000.0), (False, 2.5))
+        add.assert_not_called()
+        client.eval.assert_called_once_with(throttling.TAKE_SCRIPT, 1, 'pactle:1:bucket', 3, '0.1', '1000.0', 31)
+
+    def test_parse_rate(self):
+        self.assertEqual(throttling.parse_rate('10/min'), (10, 10 / 60))
+        self.assertEqual(throttling.parse_rate('5/s'), (5, 5.0))
+
+
+class ThrottledEndpointTests(APITestCase):
+    def setUp(self):
+        throttling.reset()
+        cache.clear()
+        self.clock = Clock()
+        throttling.TokenBucketThrottle.timer = self.clock
+        self.addCleanup(setattr, throttling.TokenBucketThrottle, 'timer', throttling.time.time)
+
+    def login(self):
+        return self.client.post('/api/token/', {'username': 'nobody', 'password': 'wrong'}, format='json')
+
+    @override_settings(THROTTLE_RATES={'login': '2/min'})
+    def test_login_is_limited_per_ip(self):
+        self.assertEqual([self.login().status_code for _ in range(3)], [401, 401, 429])
+        response = self.login()
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(throttling.rejection_counts()['login'], 2)
+        self.clock.now += 30
+        self.assertEqual(self.login().status_code, 401)
+        # Another client has its own bucket
+        self.assertEqual(self.client.post('/api/token/', {'username': 'x', 'password': 'y'}, REMOTE_ADDR='10.0.0.2').status_code, 401)
+
+    @override_settings(THROTTLE_RATES={'checkout': '1/min'}, THROTTLE_STORE='cache')
+    def test_checkout_is_limited_per_user_in_shared_store(self):
+        product = Product.objects.create(name='Lamp', description='Test', price=Decimal('10.00'), inventory_count=10)
+        users = [User.objects.create_user(username=f'buyer{n}', password='secret') for n in range(2)]
+        statuses = []
+        for user in [users[0], users[0], users[1]]:
+            CartItem.objects.get_or_create(user=user, product=product)
+            self.client.force_authenticate(user)
+            statuses.append(self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json').status_code)
+        self.assertEqual(statuses, [201, 429, 201])
+        self.assertEqual(throttling.rejection_counts()['checkout'], 1)
+        # Reads are not throttled
+        self.client.force_authenticate(users[0])
+        self.assertEqual(self.client.get('/api/orders/').status_code, 200)
+
+    @override_settings(THROTTLE_RATES={'checkout': '1/min'}, THROTTLE_KEYS={'checkout': 'ip'})
+    def test_key_strategy_is_configured_per_scope(self):
+        product = Product.objects.create(name='Lamp', description='Test', price=Decimal('10.00'), inventory_count=10)
+        statuses = []
+        for n in range(2):
+            user = User.objects.create_user(username=f'buyer{n}', password='secret')
+            CartItem.objects.create(user=user, product=product)
+            self.client.force_authenticate(user)
+            statuses.append(self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json').status_code)
+        # Both users share the bucket of their IP
+        self.assertEqual(statuses, [201, 429])
+
+    @override_settings(THROTTLE_KEYS={'login': 'session'})
+    def test_unknown_key_strategy_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            throttling.LoginThrottle().get_key_by()
+
+    @override_settings(
+        THROTTLE_RATES={'register': None},
+        PASSWORD_HASHING_WORKERS=0,
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    )
+    def test_scope_can_be_disabled(self):
+        for n in range(8):
+            response = self.client.post('/api/register/', {'username': f'u{n}', 'email': f'u{n}@example.com', 'password': 'pw'}, format='json')
+            self.assertNotEqual(response.status_code, 429)
+
+
+class StartupCheckTests(SimpleTestCase):
+    databases = {'default'}
+
+    def test_live_database_and_cache_pass(self):
+        self.assertEqual(checks.check_databases(None, databases=['default']), [])
+        self.assertEqual(checks.check_caches(None), [])
+
+    def test_database_check_only_runs_when_asked(self):
+        self.assertEqual(checks.check_databases(None), [])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_cache_that_loses_writes_fails(self):
+        self.assertEqual([error.id for error in checks.check_caches(None)], ['ecommerce.E002'])
+
+    @override_settings(
+        THROTTLE_STORE='cache',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    )
+    def test_shared_throttle_store_on_local_cache_warns(self):
+        self.assertIn('ecommerce.W002', [warning.id for warning in checks.check_connection_settings(None)])
+
+    def test_pool_without_psycopg3_is_an_error(self):
+        pooled = {'default': {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'shop', 'OPTIONS': {'pool': True}}}
+        with override_settings(DATABASES=pooled), mock.patch('ecommerce.checks.find_spec', return_value=None):
+            errors = [error for error in checks.check_connection_settings(None) if error.id == 'ecommerce.E003']
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].is_serious())
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        metrics.registry.clear()
+        throttling.reset()
+        Product.objects.create(name='Lamp', description='Test', price=Decimal('10.00'), inventory_count=10)
+
+    def scrape(self, **extra):
+        response = self.client.get('/metrics', **extra)
+        return response.status_code, response.content.decode()
+
+    def test_sampled_request_reports_breakdown(self):
+        response = self.client.get('/api/products/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, external;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        status, text = self.scrape()
+        self.assertEqual(status, 200)
+        labels = '{method="GET",route="api/products/$"}'
+        self.assertIn(f'http_requests_sampled_total{labels} 1', text)
+        self.assertIn(f'http_request_duration_seconds_count{labels} 1', text)
+        self.assertIn(f'http_request_duration_seconds_bucket{{method="GET",route="api/products/$",le="+Inf"}} 1', text)
+        self.assertIn('http_requests_total{method="GET",route="api/products/$",status="200"} 1', text)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        queries = int(text.split(f'http_request_db_queries_total{labels} ')[1].split()[0])
+        self.assertGreater(queries, 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_only_timed(self):
+        response = self.client.get('/api/products/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        _status, text = self.scrape()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="api/products/$"} 1', text)
+        self.assertNotIn('http_requests_sampled_total{method="GET",route="api/products/$"}', text)
+
+    def test_external_calls_count_toward_the_request(self):
+        timings = metrics.RequestTimings()
+        token = metrics.current_timings.set(timings)
+        try:
+            with metrics.external_call('stripe'):
+                pass
+            with self.assertRaises(RuntimeError), metrics.external_call('slack'):
+                raise RuntimeError('down')
+        finally:
+            metrics.current_timings.reset(token)
+        self.assertGreater(timings.external_seconds, 0)
+        _status, text = self.scrape()
+        self.assertIn('external_call_duration_seconds_count{service="stripe"} 1', text)
+        self.assertIn('external_call_errors_total{service="slack"} 1', text)
+
+    def test_serializer_time_comes_from_api_serializers(self):
+        class PlainSerializer(serializers.Serializer):
+            name = serializers.CharField()
+
+        timings = metrics.RequestTimings()
+        token = metrics.current_timings.set(timings)
+        try:
+            ProductSerializer(Product.objects.with_ratings(), many=True).data
+            counted = timings.serializer_seconds
+            self.assertGreater(counted, 0)
+            self.assertFalse(timings.in_serializer)
+            # DRF's own serializers are left alone
+            PlainSerializer({'name': 'Lamp'}).data
+            self.assertEqual(timings.serializer_seconds, counted)
+        finally:
+            metrics.current_timings.reset(token)
+
+    def test_scrape_access(self):
+        self.assertEqual(self.scrape(REMOTE_ADDR='10.0.0.9')[0], 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.scrape()[0], 403)
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer s3cret', REMOTE_ADDR='10.0.0.9')[0], 200)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.samples()), [('0.1', 2), ('1.0', 3), ('+Inf', 4)])
+
+
+def seed(size):
+    """
+    A store where every relation an endpoint renders has ``size`` rows.
+
+    ``size`` products, each reviewed by the buyer and the first product also by
+    ``size`` other users; ``size`` cart items; ``size`` pending and ``size``
+    archived orders of ``size`` items each, with stock held for the first.
+    """
+    buyer = User.objects.get(username='buyer')
+    products = Product.objects.bulk_create([
+        Product(name=f'Product {n}', description='Seeded', price=Decimal('5.00') + n, inventory_count=100)
+        for n in range(size)
+    ])
+    unreviewed = Product.objects.create(name='Unreviewed', description='Seeded', price=Decimal('3.00'), inventory_count=100)
+    reviewers = User.objects.bulk_create([User(username=f'reviewer{n}') for n in range(size)])
+    Review.objects.bulk_create(
+        [Review(user=buyer, product=product, rating=1 + n % 5, title='Mine') for n, product in enumerate(products)]
+        + [Review(user=reviewer, product=products[0], rating=1 + n % 5) for n, reviewer in enumerate(reviewers)]
+    )
+    CartItem.objects.bulk_create([CartItem(user=buyer, product=product, quantity=2) for product in products])
+    now = timezone.now()
+    orders = Order.objects.bulk_create([
+        Order(user=buyer, total_amount=Decimal('10.00') * size, shipping_address='1 Main St', stripe_payment_intent_id=f'pi_{n}')
+        for n in range(size)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=2, unit_price=product.price, product_name=product.name)
+        for order in orders for product in products
+    ])
+    InventoryHold.objects.bulk_create([
+        InventoryHold(order=orders[0], product=product, quantity=2, expires_at=now + timedelta(minutes=15))
+        for product in products
+    ])
+    archived = ArchivedOrder.objects.bulk_create([
+        ArchivedOrder(id=10_000 + n, user=buyer, total_amount=Decimal('10.00'), status='delivered', created_at=now, updated_at=now)
+        for n in range(size)
+    ])
+    ArchivedOrderItem.objects.bulk_create([
+        ArchivedOrderItem(
+            id=10_000 + n * size + m, order=order, product_id=product.id, quantity=1,
+            unit_price=product.price, product_name=product.name, created_at=now,
+        )
+        for n, order in enumerate(archived) for m, product in enumerate(products)
+    ])
+    return {
+        'product': products[0],
+        'unreviewed': unreviewed,
+        'review': Review.objects.get(user=buyer, product=products[0]),
+        'cart_item': CartItem.objects.filter(user=buyer).first(),
+        'order': orders[0],
+        'order_ids': [order.id for order in orders],
+        'archived': archived[0],
+    }
+
+
+def confirm_payment_with_stripe(client, seeded):
+    # Without a webhook secret the view asks Stripe and marks the order paid itself
+    with override_settings(STRIPE_WEBHOOK_SECRET=''):
+        return client.post(f"/api/orders/{seeded['order'].id}/confirm_payment/")
+
+
+def stripe_event(payload, signature, secret):
+    return {'id': 'evt_1', 'type': 'payment_intent.succeeded', 'data': {'object': {'id': 'pi_0', 'metadata': {}}}}
+
+
+# (route name, method, as admin?, request(client, seeded)) -> query budget.
+# Budgets are the counts with a seeded store; they must not grow with the data.
+QUERY_BUDGETS = [
+    ('product-list', 'get', False, lambda c, d: c.get('/api/products/'), 2),
+    ('product-list', 'get', False, lambda c, d: c.get('/api/products/?ordering=-average_rating'), 2),
+    ('product-list', 'get', False, lambda c, d: c.get('/api/products/?search=product'), 2),
+    ('product-detail', 'get', False, lambda c, d: c.get(f"/api/products/{d['product'].id}/"), 2),
+    ('product-in-stock', 'get', False, lambda c, d: c.get(f"/api/products/{d['product'].id}/in_stock/"), 1),
+    ('product-reviews', 'get', False, lambda c, d: c.get(f"/api/products/{d['product'].id}/reviews/"), 2),
+    ('review-list', 'get', False, lambda c, d: c.get('/api/reviews/'), 2),
+    ('review-list', 'post', False, lambda c, d: c.post('/api/reviews/', {'product': d['unreviewed'].id, 'rating': 4}, format='json'), 4),
+    ('review-detail', 'get', False, lambda c, d: c.get(f"/api/reviews/{d['review'].id}/"), 1),
+    ('review-detail', 'patch', False, lambda c, d: c.patch(f"/api/reviews/{d['review'].id}/", {'rating': 2}, format='json'), 2),
+    ('review-detail', 'delete', False, lambda c, d: c.delete(f"/api/reviews/{d['review'].id}/"), 2),
+    ('review-my-reviews', 'get', False, lambda c, d: c.get('/api/reviews/my_reviews/'), 1),
+    ('review-product-reviews', 'get', False, lambda c, d: c.get(f"/api/reviews/product_reviews/?product_id={d['product'].id}"), 1),
+    ('cart-list', 'get', False, lambda c, d: c.get('/api/cart/'), 2),
+    ('cart-list', 'post', False, lambda c, d: c.post('/api/cart/', {'product_id': d['unreviewed'].id, 'quantity': 1}, format='json'), 6),
+    ('cart-detail', 'get', False, lambda c, d: c.get(f"/api/cart/{d['cart_item'].id}/"), 2),
+    ('cart-detail', 'patch', False, lambda c, d: c.patch(f"/api/cart/{d['cart_item'].id}/", {'quantity': 3}, format='json'), 2),
+    ('cart-detail', 'delete', False, lambda c, d: c.delete(f"/api/cart/{d['cart_item'].id}/"), 2),
+    ('cart-total', 'get', False, lambda c, d: c.get('/api/cart/total/'), 1),
+    ('cart-clear', 'delete', False, lambda c, d: c.delete('/api/cart/clear/'), 1),
+    ('register', 'post', False, lambda c, d: c.post('/api/register/', {'username': 'newcomer', 'email': 'new@example.com', 'password': 'pw'}, format='json'), 4),
+    ('order-list', 'get', False, lambda c, d: c.get('/api/orders/'), 3),
+    ('order-list', 'get', False, lambda c, d: c.get('/api/orders/?archived=true'), 3),
+    ('order-list', 'post', False, lambda c, d: c.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json'), 15),
+    ('order-detail', 'get', False, lambda c, d: c.get(f"/api/orders/{d['order'].id}/"), 2),
+    ('order-detail', 'get', False, lambda c, d: c.get(f"/api/orders/{d['archived'].id}/?archived=true"), 2),
+    ('order-detail', 'patch', False, lambda c, d: c.patch(f"/api/orders/{d['order'].id}/", {'status': 'cancelled'}, format='json'), 10),
+    ('order-detail', 'delete', False, lambda c, d: c.delete(f"/api/orders/{d['order'].id}/"), 5),
+    ('order-confirm-payment', 'post', False, lambda c, d: c.post(f"/api/orders/{d['order'].id}/confirm_payment/"), 1),
+    ('order-confirm-payment', 'post', False, confirm_payment_with_stripe, 11),
+    ('order-cache-stats', 'get', True, lambda c, d: c.get('/api/orders/cache_stats/'), 0),
+    ('order-bulk-transition', 'post', True, lambda c, d: c.post('/api/orders/bulk-transition/', {'status': 'cancelled', 'order_ids': d['order_ids']}, format='json'), 7),
+    ('stripe-webhook', 'post', False, lambda c, d: c.post('/api/stripe/webhook/', {}, format='json'), 7),
+    ('sales-report', 'get', True, lambda c, d: c.get('/api/analytics/sales/'), 3),
+]
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            if pattern.name and pattern.name != 'api-root':
+                yield pattern.name
+        else:
+            yield from route_names(pattern.url_patterns)
+
+
+@override_settings(
+    STRIPE_WEBHOOK_SECRET='whsec_test',
+    PASSWORD_HASHING_WORKERS=0,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    THROTTLE_RATES={'login': None, 'register': None, 'checkout': None},
+)
+class QueryBudgetTests(APITestCase):
+    """Every store and orders route runs a fixed number of queries, whatever the data size."""
+    SIZES = (1, 4, 12)
+
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.admin = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        self.patches = [
+            mock.patch('stripe.Webhook.construct_event', side_effect=stripe_event),
+            mock.patch('stripe.PaymentIntent.retrieve', return_value=mock.Mock(status='succeeded')),
+        ]
+        for patch in self.patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def count_queries(self, size, as_admin, request):
+        with transaction.atomic():
+            seeded = seed(size)
+            cache.clear()
+            forget_version()
+            self.client.force_authenticate(self.admin if as_admin else self.buyer)
+            with CaptureQueriesContext(connection) as queries:
+                response = request(self.client, seeded)
+            self.assertLess(response.status_code, 400, response.content)
+            transaction.set_rollback(True)
+        return len(queries)
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {name for name, *_ in QUERY_BUDGETS}
+        routes = set(route_names(store_urls.urlpatterns)) | set(route_names(order_urls.urlpatterns))
+        self.assertEqual(routes - budgeted, set())
+
+    def test_query_counts_stay_within_budget(self):
+        for name, method, as_admin, request, budget in QUERY_BUDGETS:
+            counts = [self.count_queries(size, as_admin, request) for size in self.SIZES]
+            with self.subTest(route=name, method=method, counts=counts):
+                self.assertEqual(len(set(counts)), 1, f'query count grows with the data: {counts}')
+                self.assertLessEqual(counts[0], budget)
+
+
+class SlowQueryLogTests(APITestCase):
+    def setUp(self):
+        slow_queries.log.reset()
+        self.entries = []
+        # Capture inline: the background thread's own connection cannot see the test transaction
+        for patcher in [
+            mock.patch.object(slow_queries.log, 'submit', side_effect=self.entries.append),
+            mock.patch.object(slow_queries, 'logger'),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Every query counts as slow
+        slow = self.settings(SLOW_QUERY_THRESHOLD_MS=0.000001)
+        slow.enable()
+        self.addCleanup(slow.disable)
+        Product.objects.create(name='Lamp', description='Test', price=Decimal('10.00'), inventory_count=10)
+        self.entries.clear()
+
+    def test_records_view_and_plan(self):
+        self.client.get('/api/products/', {'search': 'lamp'})
+        entry = next(entry for entry in self.entries if 'store_product' in entry['sql'])
+        self.assertEqual((entry['view'], entry['method'], entry['path']), ('product-list', 'GET', '/api/products/'))
+        slow_query = slow_queries.capture(entry)
+        self.assertEqual(slow_query.view, 'product-list')
+        self.assertTrue(slow_query.plan)
+        self.assertEqual(slow_query.plan_error, '')
+        self.assertEqual(slow_query.fingerprint, slow_queries.fingerprint(entry['sql']))
+        self.assertEqual(slow_query.params, '')
+        slow_queries.logger.warning.assert_called()
+
+    def test_params_are_only_stored_when_enabled(self):
+        user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        entry = next(entry for entry in self.entries if entry['sql'].startswith('INSERT INTO "auth_user"'))
+        self.assertEqual(slow_queries.capture(entry).params, '')
+        with self.settings(SLOW_QUERY_STORE_PARAMS=True):
+            self.assertIn(user.email, slow_queries.capture(entry).params)
+
+    @override_settings(SLOW_QUERY_RATE='2/min')
+    def test_rate_limited(self):
+        self.client.get('/api/products/')
+        self.assertEqual(len(self.entries), 2)
+
+    @override_settings(SLOW_QUERY_SAMPLE_RATE=0)
+    def test_unsampled_queries_are_not_captured(self):
+        self.client.get('/api/products/')
+        self.assertEqual(self.entries, [])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_zero_threshold_turns_the_log_off(self):
+        self.client.get('/api/products/')
+        self.assertEqual(self.entries, [])
+
+    def test_capture_thread_queries_are_not_logged(self):
+        slow_queries._capturing.active = True
+        try:
+            list(Product.objects.all())
+        finally:
+            slow_queries._capturing.active = False
+        self.assertEqual(self.entries, [])
+
+    def test_only_selects_are_explained(self):
+        Product.objects.filter(name='Lamp').update(inventory_count=5)
+        entry = next(entry for entry in self.entries if entry['sql'].startswith('UPDATE'))
+        self.assertEqual(entry['view'], '')
+        slow_query = slow_queries.capture(entry)
+        self.assertEqual(slow_query.plan, '')
+        self.assertIn('Only SELECT', slow_query.plan_error)
+        self.assertEqual(Product.objects.get().inventory_count, 5)
+
+    def test_fingerprint_ignores_in_list_length(self):
+        self.assertEqual(
+            slow_queries.fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            slow_queries.fingerprint('SELECT *  FROM t WHERE id IN (%s)'),
+        )
+
+    def test_purge_old(self):
+        old = SlowQuery.objects.create(fingerprint='a', sql='SELECT 1', duration_ms=300)
+        SlowQuery.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=30))
+        SlowQuery.objects.create(fingerprint='b', sql='SELECT 2', duration_ms=300)
+        self.assertEqual(slow_queries.purge_old(), 1)
+        self.assertEqual(list(SlowQuery.objects.values_list('fingerprint', flat=True)), ['b'])
+
+    def test_admin_pages(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        self.client.get('/api/products/')
+        slow_query = slow_queries.capture(next(entry for entry in self.entries if 'store_product' in entry['sql']))
+        self.assertEqual(self.client.get('/admin/ecommerce/slowquery/').status_code, 200)
+        response = self.client.get(f'/admin/ecommerce/slowquery/{slow_query.id}/change/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'product-list')
+
+
+class ORJSONRendererTests(APITestCase):
+    def assertSameOutput(self, data, accepted_media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_matches_drf_output(self):
+        self.assertSameOutput({
+            'price': Decimal('19.99'),
+            'whole': Decimal('10'),
+            'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'naive': datetime(2024, 5, 1, 12, 30),
+            'day': date(2024, 5, 1),
+            'at': time(9, 15),
+            'wait': timedelta(minutes=90),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'name': 'Caf\u00e9 \u2028 \u2029 \U0001f600',
+            'label': lazy(lambda: 'lazy', str)(),
+            'ints': {1: 'one', 2: 'two'},
+            'items': (1, 2.5, None, True, 2 ** 70),
+            'ratings': [4.333333333333333, 0.1, 3.0],
+        })
+
+    def test_exponent_and_nan_decimals_fall_back(self):
+        self.assertSameOutput({'big': Decimal('1e20'), 'small': Decimal('0.00001')})
+        with self.assertRaises(ValueError):
+            ORJSONRenderer().render({'price': Decimal('NaN')})
+
+    def test_indent_falls_back(self):
+        self.assertSameOutput({'a': [1, 2]}, 'application/json; indent=2')
+
+    def test_api_payloads_match(self):
+        user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        product = Product.objects.create(name='Lamp \u2014 brass', description='Test', price=Decimal('10.50'), inventory_count=10)
+        Review.objects.create(user=user, product=product, rating=4, title='Good', comment='Bright \u2028 lamp')
+        for url in ['/api/products/', f'/api/products/{product.id}/']:
+            response = self.client.get(url)
+            self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+
+class ORJSONParserTests(SimpleTestCase):
+    def parse(self, parser, body, encoding='utf-8'):
+        return parser.parse(io.BytesIO(body), 'application/json', {'encoding': encoding})
+
+    def test_matches_drf_parser(self):
+        for body in [b'{"a": [1, 2.5, null, true], "b": "caf\xc3\xa9"}', b'{"big": 1180591620717411303424}', b'[]']:
+            self.assertEqual(self.parse(ORJSONParser(), body), self.parse(JSONParser(), body))
+
+    def test_other_charsets_fall_back(self):
+        body = '{"name": "caf\u00e9"}'.encode('latin-1')
+        self.assertEqual(self.parse(ORJSONParser(), body, 'latin-1'), {'name': 'caf\u00e9'})
+
+    def test_errors_match_drf(self):
+        for body in [b'', b'{"a": ', b'{"a": NaN}']:
+            with self.assertRaises(ParseError) as fast:
+                self.parse(ORJSONParser(), body)
+            with self.assertRaises(ParseError) as drf:
+                self.parse(JSONParser(), body)
+            self.assertEqual(fast.exception.detail, drf.exception.detail)
+
+
+class FakeBrotli:
+    @staticmethod
+    def compress(content, quality):
+        return b'br' + gzip.compress(content)
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        for n in range(12):
+            Product.objects.create(name=f'Lamp {n}', description='A bright brass lamp. ' * 10, price=Decimal('10.00'), inventory_count=10)
+
+    def test_gzip(self):
+        plain = self.client.get('/api/products/')
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_not_compressed_without_accept_encoding(self):
+        response = self.client.get('/api/products/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @override_settings(COMPRESSION_MIN_SIZE=100_000)
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_html_is_not_compressed(self):
+        response = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_brotli_preferred_when_installed(self):
+        with mock.patch.object(compression, 'brotli', FakeBrotli):
+            response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, br;q=0.5')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_choose_encoding(self):
+        available = ('br', 'gzip')
+        self.assertEqual(compression.choose_encoding('', available), None)
+        self.assertEqual(compression.choose_encoding('identity', available), None)
+        self.assertEqual(compression.choose_encoding('gzip;q=0', available), None)
+        self.assertEqual(compression.choose_encoding('*', available), 'br')
+        self.assertEqual(compression.choose_encoding('*;q=0.1, GZIP', available), 'gzip')
+        self.assertEqual(compression.choose_encoding('br;q=bad, gzip;q=0.2', available), 'gzip')
@@ -0,0 +1,270 @@
+"""
+Token-bucket throttling for the auth and checkout endpoints.
+
+Each client gets a bucket per scope that holds up to ``N`` tokens and refills
+at ``N`` per period (a rate such as ``'10/min'``), so short bursts pass and
+sustained floods are cut to the refill rate. A check touches a single bucket,
+whatever the traffic.
+
+Buckets live in one of two stores, picked with ``THROTTLE_STORE``:
+
+* ``'local'`` (default) keeps them in process memory. Limits apply per worker
+  process and cost no I/O.
+* ``'cache'`` keeps them in the ``THROTTLE_CACHE_ALIAS`` cache so every worker
+  shares them. On Redis a check is one Lua script, which refills and takes
+  atomically, so concurrent workers cannot overspend a bucket. Other caches
+  have no such primitive; there a check holds a per-bucket lock taken with
+  ``add``, waiting at most ``LOCK_WAIT`` for it.
+
+Rates come from ``THROTTLE_RATES`` (scope -> rate, ``None`` to disable), with
+``DEFAULT_RATES`` as fallback. ``THROTTLE_KEYS`` (scope -> ``'user'`` or
+``'ip'``), with ``DEFAULT_KEYS`` as fallback, picks whether a scope's buckets
+are per user or per client IP. Rejected requests are counted per scope; see
+``rejection_counts``.
+"""
+
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_RATES = {
+    'login': '10/min',
+    'register': '5/min',
+    'checkout': '20/min',
+}
+DEFAULT_KEYS = {
+    'login': 'ip',
+    'register': 'ip',
+    'checkout': 'user',
+}
+KEY_STRATEGIES = ('user', 'ip')
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+DEFAULT_LOCAL_MAX_KEYS = 100_000
+REJECTIONS_KEY = 'throttle:rejections:{scope}'
+LOCK_KEY = '{key}:lock'
+# A lock left by a worker that died mid-check expires after this long
+LOCK_TIMEOUT = 2
+LOCK_WAIT = 0.05
+LOCK_POLL = 0.002
+
+# refill() and take_token() as one atomic step on a Redis hash. The wait is
+# returned as a string because Redis truncates Lua numbers to integers.
+TAKE_SCRIPT = """
+local capacity, refill_rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = capacity
+if state[1] then
+    tokens = math.min(capacity, tonumber(state[1]) + math.max(now - tonumber(state[2]), 0) * refill_rate)
+end
+local allowed, wait = 0, 0
+if tokens >= 1 then
+    allowed, tokens = 1, tokens - 1
+else
+    wait = (1 - tokens) / refill_rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {allowed, tostring(wait)}
+"""
+
+
+def parse_rate(rate):
+    """``'10/min'`` -> ``(capacity, tokens per second)``."""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period]
+
+
+def refill(state, capacity, refill_rate, now):
+    """Tokens in a bucket last seen as ``state`` (or None for a full one) at ``now``."""
+    if state is None:
+        return float(capacity)
+    tokens, updated = state
+    return min(float(capacity), tokens + max(now - updated, 0) * refill_rate)
+
+
+def take_token(tokens, refill_rate):
+    """Return ``(allowed, tokens left, seconds to wait)``."""
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / refill_rate
+
+
+class LocalBucketStore:
+    """Buckets in process memory, evicting the least recently used past ``max_keys``."""
+
+    def __init__(self, max_keys=DEFAULT_LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.rejections = Counter()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate, now):
+        with self.lock:
+            tokens = refill(self.buckets.get(key), capacity, refill_rate, now)
+            allowed, tokens, wait = take_token(tokens, refill_rate)
+            self.buckets[key] = (tokens, now)
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed, wait
+
+    def record_rejection(self, scope):
+        with self.lock:
+            self.rejections[scope] += 1
+
+    def rejection_counts(self):
+        with self.lock:
+            return dict(self.rejections)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+            self.rejections.clear()
+
+
+class CacheBucketStore:
+    """Buckets in a shared Django cache, so limits hold across worker processes."""
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, refill_rate, now):
+        # A bucket left alone until it is full again is the same as no entry
+        timeout = int(capacity / refill_rate) + 1
+        if isinstance(self.cache, RedisCache):
+            return self.take_in_redis(key, capacity, refill_rate, now, timeout)
+        return self.take_locked(key, capacity, refill_rate, now, timeout)
+
+    def take_in_redis(self, key, capacity, refill_rate, now, timeout):
+        key = self.cache.make_and_validate_key(key)
+        client = self.cache._cache.get_client(key, write=True)
+        allowed, wait = client.eval(TAKE_SCRIPT, 1, key, capacity, repr(refill_rate), repr(now), timeout)
+        return bool(allowed), float(wait)
+
+    def take_locked(self, key, capacity, refill_rate, now, timeout):
+        lock_key = LOCK_KEY.format(key=key)
+        token = self.acquire(lock_key)
+        if token is None:
+            # Only a client flooding this very bucket keeps the lock busy that long
+            return False, LOCK_WAIT
+        try:
+            tokens = refill(self.cache.get(key), capacity, refill_rate, now)
+            allowed, tokens, wait = take_token(tokens, refill_rate)
+            self.cache.set(key, (tokens, now), timeout)
+        finally:
+            self.release(lock_key, token)
+        return allowed, wait
+
+    def acquire(self, lock_key):
+        """Take the lock with ``add``, which only writes a missing key. Returns its token, or None."""
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_WAIT
+        while not self.cache.add(lock_key, token, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(LOCK_POLL)
+        return token
+
+    def release(self, lock_key, token):
+        # A holder that ran past LOCK_TIMEOUT must not delete the next holder's lock
+        if self.cache.get(lock_key) == token:
+            self.cache.delete(lock_key)
+
+    def record_rejection(self, scope):
+        key = REJECTIONS_KEY.format(scope=scope)
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+    def rejection_counts(self):
+        scopes = set(DEFAULT_RATES) | set(getattr(settings, 'THROTTLE_RATES', {}))
+        counts = self.cache.get_many([REJECTIONS_KEY.format(scope=scope) for scope in scopes])
+        return {scope: counts.get(REJECTIONS_KEY.format(scope=scope), 0) for scope in scopes}
+
+
+_local_store = LocalBucketStore()
+
+
+def get_store():
+    if getattr(settings, 'THROTTLE_STORE', 'local') == 'cache':
+        return CacheBucketStore(getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default'))
+    return _local_store
+
+
+def reset():
+    """Forget the in-process buckets and counters."""
+    _local_store.clear()
+
+
+def rejection_counts():
+    """Rejected requests per scope since the process (local) or cache (shared) started."""
+    return get_store().rejection_counts()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle requests per client with a token bucket.
+
+    Subclasses set ``scope``. The scope's entry in ``THROTTLE_KEYS`` (or
+    ``DEFAULT_KEYS``) is ``'user'`` (the user id when authenticated, the client
+    IP otherwise) or ``'ip'``; scopes in neither are keyed by user.
+    """
+    scope = None
+    timer = time.time
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_rate(self):
+        rates = getattr(settings, 'THROTTLE_RATES', {})
+        return rates[self.scope] if self.scope in rates else DEFAULT_RATES.get(self.scope)
+
+    def get_key_by(self):
+        keys = getattr(settings, 'THROTTLE_KEYS', {})
+        key_by = keys[self.scope] if self.scope in keys else DEFAULT_KEYS.get(self.scope, 'user')
+        if key_by not in KEY_STRATEGIES:
+            raise ImproperlyConfigured(f'THROTTLE_KEYS[{self.scope!r}] must be "user" or "ip", not {key_by!r}.')
+        return key_by
+
+    def get_cache_key(self, request, view):
+        if self.get_key_by() == 'user' and request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.id}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        rate = self.get_rate()
+        if rate is None:
+            return True
+        capacity, refill_rate = parse_rate(rate)
+        store = get_store()
+        allowed, self.wait_seconds = store.take(self.get_cache_key(request, view), capacity, refill_rate, self.timer())
+        if not allowed:
+            store.record_rejection(self.scope)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class RegisterThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+
+class CheckoutThrottle(TokenBucketThrottle):
+    scope = 'checkout'
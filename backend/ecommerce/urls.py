@@ -18,11 +18,16 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from ecommerce.throttling import LoginThrottle
+from ecommerce.views import metrics_view
+from store.authentication import ClaimsTokenObtainPairSerializer, ClaimsTokenRefreshSerializer
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/async/', include('store.async_urls')),
     path('api/', include('store.urls')),
     path('api/', include('orders.urls')),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/', TokenObtainPairView.as_view(serializer_class=ClaimsTokenObtainPairSerializer, throttle_classes=[LoginThrottle]), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshView.as_view(serializer_class=ClaimsTokenRefreshSerializer), name='token_refresh'),
 ]
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from . import metrics
+
+DEFAULT_METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+
+    With ``METRICS_TOKEN`` set, scrapers must send ``Authorization: Bearer <token>``;
+    otherwise only ``METRICS_ALLOWED_IPS`` (loopback by default) may read it.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', DEFAULT_METRICS_ALLOWED_IPS)
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,5 +1,19 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from django.db.models import Count
+from django.utils import timezone
+from .models import Order, OrderItem, InventoryHold, OutboxEvent, ArchivedOrder, ArchivedOrderItem, DailySales, DailyProductSales
+
+class OrderIdSearchMixin:
+    """Match a searched order number exactly instead of scanning ids as text"""
+    order_id_lookup = 'id'
+    
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        term = search_term.strip().lstrip('#')
+        # Longer numbers cannot be a bigint id
+        if term.isdigit() and len(term) <= 18:
+            results |= queryset.filter(**{self.order_id_lookup: int(term)})
+        return results, may_have_duplicates
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -7,18 +21,107 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['total_price']
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(OrderIdSearchMixin, admin.ModelAdmin):
     list_display = ['id', 'user', 'total_amount', 'status', 'items_count', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['user__username', 'id']
-    readonly_fields = ['created_at', 'updated_at', 'items_count']
+    search_fields = ['user__username__ilike']
+    readonly_fields = ['created_at', 'updated_at', 'items_count', 'paid_at', 'shipped_at', 'delivered_at', 'cancelled_at']
     inlines = [OrderItemInline]
     ordering = ['-created_at']
+    list_select_related = ['user']
+    actions = ['mark_shipped', 'mark_delivered', 'mark_cancelled']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(order_items_count=Count('order_items'))
+    
+    @admin.display(description='Items', ordering='order_items_count')
+    def items_count(self, obj):
+        return obj.items_count
+    
+    def transition_selected(self, request, queryset, status):
+        updated, skipped = Order.objects.bulk_transition(queryset.values_list('id', flat=True), status)
+        message = f'{updated} orders marked {status}.'
+        if skipped:
+            message += f' {skipped} skipped because their status does not allow it.'
+        self.message_user(request, message)
+    
+    @admin.action(description='Mark selected orders as shipped')
+    def mark_shipped(self, request, queryset):
+        self.transition_selected(request, queryset, 'shipped')
+    
+    @admin.action(description='Mark selected orders as delivered')
+    def mark_delivered(self, request, queryset):
+        self.transition_selected(request, queryset, 'delivered')
+    
+    @admin.action(description='Mark selected orders as cancelled')
+    def mark_cancelled(self, request, queryset):
+        self.transition_selected(request, queryset, 'cancelled')
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(OrderIdSearchMixin, admin.ModelAdmin):
+    order_id_lookup = 'order_id'
     list_display = ['order', 'product', 'quantity', 'unit_price', 'total_price']
     list_filter = ['created_at', 'product']
-    search_fields = ['order__id', 'product__name']
+    search_fields = ['product__name__ilike']
     readonly_fields = ['total_price', 'created_at']
     ordering = ['-created_at']
+    # Order.__str__ shows the customer's username
+    list_select_related = ['order__user', 'product']
+
+@admin.register(InventoryHold)
+class InventoryHoldAdmin(OrderIdSearchMixin, admin.ModelAdmin):
+    order_id_lookup = 'order_id'
+    list_display = ['id', 'order', 'product', 'quantity', 'status', 'expires_at', 'created_at']
+    list_filter = ['status', 'expires_at']
+    search_fields = ['product__name__ilike']
+    readonly_fields = ['created_at', 'updated_at']
+    ordering = ['-created_at']
+    list_select_related = ['order__user', 'product']
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(OrderIdSearchMixin, admin.ModelAdmin):
+    order_id_lookup = 'order_id'
+    list_display = ['id', 'event_type', 'order', 'status', 'attempts', 'available_at', 'delivered_at']
+    list_filter = ['status', 'event_type']
+    search_fields = ['event_type']
+    readonly_fields = ['created_at', 'delivered_at', 'last_error']
+    ordering = ['-created_at']
+    list_select_related = ['order__user']
+    actions = ['requeue']
+    
+    @admin.action(description='Requeue selected events for delivery')
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='delivered').update(status='pending', attempts=0, available_at=timezone.now())
+        self.message_user(request, f'{updated} events requeued.')
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ['product_id', 'product_name', 'quantity', 'unit_price', 'total_price', 'created_at']
+    exclude = ['product_image_url']
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(OrderIdSearchMixin, admin.ModelAdmin):
+    list_display = ['id', 'user', 'total_amount', 'status', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username__ilike']
+    readonly_fields = [
+        'user', 'total_amount', 'status', 'stripe_payment_intent_id', 'shipping_address',
+        'paid_at', 'shipped_at', 'delivered_at', 'cancelled_at', 'created_at', 'updated_at', 'archived_at',
+    ]
+    inlines = [ArchivedOrderItemInline]
+    ordering = ['-created_at']
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'revenue', 'units', 'orders']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'product_id', 'product_name', 'revenue', 'units', 'orders']
+    search_fields = ['product_name']
+    date_hierarchy = 'date'
+    ordering = ['-date', '-revenue']
@@ -0,0 +1,166 @@
+"""
+Daily sales rollups.
+
+``DailySales`` and ``DailyProductSales`` hold paid revenue, units and orders
+per day, so analytics queries read a few hundred small rows instead of
+aggregating every ``OrderItem``. An item counts once its order is paid
+(processing, shipped or delivered) and is attributed to the day it was ordered.
+
+``refresh_sales_rollups`` is incremental: it finds the days touched since the
+stored high-water mark (new items, or orders whose status changed) and
+recomputes just those days. Recomputing whole days keeps a refresh idempotent.
+The mark trails the clock by ``SALES_ROLLUP_SETTLE_SECONDS`` so rows written by
+transactions that were still open during a refresh are picked up by the next.
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrderItem, DailyProductSales, DailySales, OrderItem, RollupState
+
+SALES_ROLLUP = 'sales'
+PAID_STATUSES = ('processing', 'shipped', 'delivered')
+DEFAULT_SETTLE_SECONDS = 60
+
+
+def get_settle_delay():
+    return timedelta(seconds=getattr(settings, 'SALES_ROLLUP_SETTLE_SECONDS', DEFAULT_SETTLE_SECONDS))
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def days_filter(days):
+    """Match rows created on any of ``days`` with index-friendly ranges."""
+    q = Q()
+    for day in days:
+        start, end = day_bounds(day)
+        q |= Q(created_at__gte=start, created_at__lt=end)
+    return q
+
+
+def touched_days(since, until):
+    """Days with items added, or orders changed, in ``(since, until]``."""
+    new_items = OrderItem.objects.filter(created_at__gt=since, created_at__lte=until)
+    changed_orders = OrderItem.objects.filter(order__updated_at__gt=since, order__updated_at__lte=until)
+    days = set()
+    for items in (new_items, changed_orders):
+        days.update(
+            items.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct()
+        )
+    return days
+
+
+def paid_items(days):
+    """Paid live and archived items, restricted to ``days`` unless it is None."""
+    querysets = [
+        OrderItem.objects.filter(order__status__in=PAID_STATUSES),
+        # Only delivered orders are archived with a paid status
+        ArchivedOrderItem.objects.filter(order__status='delivered'),
+    ]
+    if days is not None:
+        querysets = [queryset.filter(days_filter(days)) for queryset in querysets]
+    return [queryset.annotate(day=TruncDate('created_at')) for queryset in querysets]
+
+
+def compute_rollups(days=None):
+    """Aggregate paid items into ``({day: row}, {(day, product_id): row})``."""
+    revenue = Sum(F('unit_price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    daily, by_product = {}, {}
+    # Live and archived items never share an order, so their counts add up
+    for items in paid_items(days):
+        for row in items.values('day').annotate(revenue=revenue, units=Sum('quantity'), orders=Count('order_id', distinct=True)):
+            totals = daily.setdefault(row['day'], {'revenue': Decimal('0.00'), 'units': 0, 'orders': 0})
+            for field in ('revenue', 'units', 'orders'):
+                totals[field] += row[field]
+        for row in items.values('day', 'product_id').annotate(
+            revenue=revenue, units=Sum('quantity'), orders=Count('order_id', distinct=True), name=Max('product_name')
+        ):
+            totals = by_product.setdefault(
+                (row['day'], row['product_id']),
+                {'revenue': Decimal('0.00'), 'units': 0, 'orders': 0, 'product_name': row['name']}
+            )
+            for field in ('revenue', 'units', 'orders'):
+                totals[field] += row[field]
+    return daily, by_product
+
+
+def rebuild_days(days=None):
+    """Replace the rollup rows for ``days`` (every day when None). Returns the number of days written."""
+    daily, by_product = compute_rollups(days)
+    with transaction.atomic():
+        if days is None:
+            DailySales.objects.all().delete()
+            DailyProductSales.objects.all().delete()
+        else:
+            DailySales.objects.filter(date__in=days).delete()
+            DailyProductSales.objects.filter(date__in=days).delete()
+        DailySales.objects.bulk_create([DailySales(date=day, **totals) for day, totals in daily.items()])
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(date=day, product_id=product_id, **totals)
+            for (day, product_id), totals in by_product.items()
+        ])
+    return len(daily)
+
+
+def refresh_sales_rollups(rebuild=False, now=None):
+    """
+    Bring the rollups up to date. Returns the number of days recomputed.
+
+    The first refresh, or one with ``rebuild``, recomputes every day.
+    """
+    until = (now or timezone.now()) - get_settle_delay()
+    with transaction.atomic():
+        # Locking the state row keeps concurrent refreshes from interleaving
+        state, _ = RollupState.objects.select_for_update().get_or_create(name=SALES_ROLLUP)
+        if rebuild or state.refreshed_through is None:
+            rebuild_days()
+            refreshed = DailySales.objects.count()
+        else:
+            days = touched_days(state.refreshed_through, until)
+            if days:
+                rebuild_days(days)
+            refreshed = len(days)
+        state.refreshed_through = until
+        state.save()
+    return refreshed
+
+
+def sales_report(start, end, product_id=None, top=10):
+    """Totals, a per-day series and the best-selling products for ``start``..``end`` (inclusive)."""
+    if product_id is None:
+        rows = DailySales.objects.filter(date__range=(start, end))
+    else:
+        rows = DailyProductSales.objects.filter(product_id=product_id, date__range=(start, end))
+    days = list(rows.order_by('date').values('date', 'revenue', 'units', 'orders'))
+    totals = {
+        'revenue': sum((day['revenue'] for day in days), Decimal('0.00')),
+        'units': sum(day['units'] for day in days),
+        'orders': sum(day['orders'] for day in days),
+    }
+    products = (
+        DailyProductSales.objects.filter(date__range=(start, end))
+        .values('product_id')
+        .annotate(product_name=Max('product_name'), revenue=Sum('revenue'), units=Sum('units'), orders=Sum('orders'))
+        .order_by('-revenue', 'product_id')
+    )
+    if product_id is not None:
+        products = products.filter(product_id=product_id)
+    state = RollupState.objects.filter(name=SALES_ROLLUP).first()
+    return {
+        'start': start,
+        'end': end,
+        'refreshed_through': state.refreshed_through if state else None,
+        'totals': totals,
+        'days': days,
+        'top_products': list(products[:top]),
+    }
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "orders"
+
+    def ready(self):
+        # Register outbox handlers defined outside orders.outbox
+        from . import payments  # noqa: F401
+        # Connect the order detail cache invalidation signal
+        from . import cache  # noqa: F401
@@ -0,0 +1,59 @@
+"""
+Cold storage for old orders.
+
+``archive_orders`` moves delivered and cancelled orders older than a cutoff,
+with their items, from ``Order``/``OrderItem`` into ``ArchivedOrder``/
+``ArchivedOrderItem`` in batches, keeping the hot tables and their indexes
+small. Each batch is copied and deleted in one transaction.
+"""
+
+from django.db import transaction
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+ORDER_FIELDS = [
+    'id', 'user_id', 'total_amount', 'status', 'stripe_payment_intent_id',
+    'shipping_address', 'paid_at', 'shipped_at', 'delivered_at', 'cancelled_at',
+    'created_at', 'updated_at',
+]
+ITEM_FIELDS = [
+    'id', 'order_id', 'product_id', 'quantity', 'unit_price',
+    'product_name', 'product_image_url', 'created_at',
+]
+
+
+def archive_batch(cutoff, batch_size):
+    """Move one batch of orders created before ``cutoff``. Returns the number moved."""
+    with transaction.atomic():
+        ids = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(**values)
+            for values in Order.objects.filter(id__in=ids).values(*ORDER_FIELDS)
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(**values)
+            for values in OrderItem.objects.filter(order_id__in=ids).values(*ITEM_FIELDS)
+        ])
+        Order.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(cutoff, batch_size=500, max_batches=None):
+    """Archive every eligible order created before ``cutoff``. Returns the total moved."""
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+    return moved
@@ -0,0 +1,74 @@
+"""
+Response cache for orders in a terminal status.
+
+Delivered and cancelled orders never change, so their serialized detail is
+cached under the order id together with the ``updated_at`` it was rendered
+from; an entry is only served while that timestamp still matches. Saving an
+order also drops its entry. Hit and miss counters live in the cache backend
+so they aggregate across worker processes.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Order
+
+TERMINAL_STATUSES = ('delivered', 'cancelled')
+DEFAULT_TIMEOUT_SECONDS = 24 * 60 * 60
+HITS_KEY = 'orders:detail:hits'
+MISSES_KEY = 'orders:detail:misses'
+
+
+def cache_key(order_id):
+    return f'orders:detail:{order_id}'
+
+
+def is_cacheable(order):
+    return order.status in TERMINAL_STATUSES
+
+
+def get_cached(order):
+    """Return the cached representation of ``order``, or None on a miss."""
+    entry = cache.get(cache_key(order.id))
+    if entry is not None and entry[0] == order.updated_at.isoformat():
+        increment(HITS_KEY)
+        return entry[1]
+    increment(MISSES_KEY)
+    return None
+
+
+def set_cached(order, data):
+    timeout = getattr(settings, 'ORDER_CACHE_TIMEOUT_SECONDS', DEFAULT_TIMEOUT_SECONDS)
+    cache.set(cache_key(order.id), (order.updated_at.isoformat(), data), timeout)
+
+
+def invalidate(order_id):
+    cache.delete(cache_key(order_id))
+
+
+def increment(key):
+    # add() is a no-op if the counter exists; incr() is atomic on shared backends
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+@receiver(post_save, sender=Order)
+def invalidate_on_save(sender, instance, **kwargs):
+    invalidate(instance.id)
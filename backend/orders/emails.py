@@ -0,0 +1,71 @@
+"""
+Order confirmation emails.
+
+The outbox worker hands over every due confirmation in a batch; they are
+rendered from a template compiled once per process and sent over a single
+mail connection (one SMTP login per batch instead of one per order).
+"""
+
+import functools
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
+
+from ecommerce.metrics import external_call
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_NAME = 'orders/order_confirmation_email.html'
+
+
+@functools.lru_cache(maxsize=None)
+def confirmation_template():
+    return get_template(TEMPLATE_NAME)
+
+
+def is_configured():
+    return bool(getattr(settings, 'EMAIL_HOST_PASSWORD', ''))
+
+
+def build_confirmation_message(order, connection=None):
+    message = EmailMultiAlternatives(
+        subject=f'Order Confirmation - Order #{order.id}',
+        body=f'Thank you for your order #{order.id}. Total: ${order.total_amount}',
+        from_email=settings.EMAIL_HOST_USER,
+        to=[order.user.email],
+        connection=connection,
+    )
+    html_message = confirmation_template().render({'order': order, 'user': order.user})
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+
+def send_confirmation_emails(orders):
+    """
+    Send a confirmation for each order over one connection.
+
+    Returns ``{order_id: exception}`` for the orders whose email failed.
+    """
+    failures = {}
+    if not orders:
+        return failures
+    connection = get_connection(fail_silently=False)
+    try:
+        with external_call('email'):
+            connection.open()
+    except Exception as e:
+        return {order.id: e for order in orders}
+    try:
+        for order in orders:
+            try:
+                message = build_confirmation_message(order, connection=connection)
+                with external_call('email'):
+                    message.send()
+            except Exception as e:
+                logger.exception('Failed to send order email for order %s', order.id)
+                failures[order.id] = e
+    finally:
+        connection.close()
+    return failures
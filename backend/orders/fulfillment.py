@@ -0,0 +1,43 @@
+"""
+Bulk status changes for fulfillment.
+
+Shipping exports arrive as CSV files with one order per row. The ids are read
+here and handed to ``Order.objects.bulk_transition``, which moves the orders in
+chunked UPDATEs and skips any order whose current status does not allow it.
+"""
+
+import csv
+import io
+
+from .models import Order
+
+# Statuses fulfillment may set in bulk; processing is reserved for confirmed payments
+BULK_TARGET_STATUSES = ('shipped', 'delivered', 'cancelled')
+ORDER_ID_COLUMN = 'order_id'
+
+
+def order_ids_from_csv(file):
+    """Read the ``order_id`` column of an uploaded CSV file. Raises ValueError on bad input."""
+    content = file.read()
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(content))
+    if not reader.fieldnames or ORDER_ID_COLUMN not in reader.fieldnames:
+        raise ValueError(f"CSV must have an '{ORDER_ID_COLUMN}' column")
+    order_ids = []
+    for line, row in enumerate(reader, start=2):
+        value = (row[ORDER_ID_COLUMN] or '').strip().lstrip('#')
+        if not value:
+            continue
+        try:
+            order_ids.append(int(value))
+        except ValueError:
+            raise ValueError(f"Invalid order id {value!r} on line {line}")
+    return order_ids
+
+
+def bulk_transition(order_ids, status):
+    """Move ``order_ids`` to ``status``; returns ``(updated, skipped)``."""
+    if status not in BULK_TARGET_STATUSES:
+        raise ValueError(f"Orders cannot be moved to {status!r} in bulk")
+    return Order.objects.bulk_transition(order_ids, status)
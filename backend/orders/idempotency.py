@@ -0,0 +1,121 @@
+"""
+``Idempotency-Key`` support for mutating API endpoints.
+
+A client that retries a request with the same key gets the stored response of
+the first attempt instead of running the view again. Keys are scoped to the
+authenticated user and bound to a fingerprint of the request, so reusing a key
+for a different request is rejected. Stored responses expire after
+``IDEMPOTENCY_KEY_TTL_SECONDS``; ``purge_idempotency_keys`` deletes them.
+"""
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(b'\0')
+    digest.update(request.get_full_path().encode())
+    digest.update(b'\0')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def claim_key(user_id, key, request, fingerprint):
+    """
+    Reserve ``key`` for this request.
+
+    Returns ``(True, record)`` when the caller should run the view, or
+    ``(False, record)`` with the existing record when the key was used before.
+    """
+    now = timezone.now()
+    ttl = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+    # An expired key that has not been purged yet is free to reuse
+    IdempotencyKey.objects.filter(user_id=user_id, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user_id=user_id,
+                key=key,
+                method=request.method,
+                path=request.path[:255],
+                fingerprint=fingerprint,
+                expires_at=now + ttl,
+            )
+        return True, record
+    except IntegrityError:
+        return False, IdempotencyKey.objects.get(user_id=user_id, key=key)
+
+
+def idempotent(view_method):
+    """Make a viewset action replay its stored response for a repeated ``Idempotency-Key``."""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {'detail': f'{IDEMPOTENCY_HEADER} must be at most 255 characters.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        claimed, record = claim_key(request.user.id, key, request, fingerprint)
+        if not claimed:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {'detail': f'{IDEMPOTENCY_HEADER} was already used for a different request.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.response_status is None:
+                return Response(
+                    {'detail': f'A request with this {IDEMPOTENCY_HEADER} is still being processed.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response(record.response_body, status=record.response_status, headers={REPLAY_HEADER: 'true'})
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            # Unhandled errors are not stored, so the client may retry
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            record.response_status = response.status_code
+            # Encode like the JSON renderer so a replay returns the same payload
+            record.response_body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+            record.save(update_fields=['response_status', 'response_body'])
+        return response
+    return wrapper
+
+
+def purge_expired_keys(batch_size=1000, now=None):
+    """Delete expired keys in batches. Returns the number deleted."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,167 @@
+"""
+Inventory reservations for orders awaiting payment.
+
+Checkout places a hold on the ordered quantities so concurrent checkouts cannot
+sell the same units. Availability is stock minus active (unexpired) holds.
+Holds are converted into real stock decrements when payment is confirmed, and
+released when the order is cancelled or the hold expires. Cancelling an order
+that was already paid puts its converted units back in stock.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from store.models import Product
+from .models import InventoryHold
+
+DEFAULT_HOLD_TTL_SECONDS = 15 * 60
+
+
+class InsufficientStock(Exception):
+    """Raised when an order asks for more units than are available."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        names = ', '.join(product.name for product, _requested, _available in shortages)
+        super().__init__(f"Insufficient stock for: {names}")
+
+
+def get_hold_ttl():
+    return timedelta(seconds=getattr(settings, 'INVENTORY_HOLD_TTL_SECONDS', DEFAULT_HOLD_TTL_SECONDS))
+
+
+def active_holds(now=None):
+    """Holds that still count against availability."""
+    return InventoryHold.objects.filter(status='active', expires_at__gt=now or timezone.now())
+
+
+def held_quantities(product_ids, now=None):
+    """Return ``{product_id: units held}`` for the given products in one query."""
+    rows = (
+        active_holds(now)
+        .filter(product_id__in=product_ids)
+        .values('product_id')
+        .annotate(held=Sum('quantity'))
+    )
+    return {row['product_id']: row['held'] for row in rows}
+
+
+def available_quantities(products, now=None):
+    """Return ``{product_id: stock minus active holds}`` for the given products."""
+    held = held_quantities([product.id for product in products], now)
+    return {
+        product.id: max(product.inventory_count - held.get(product.id, 0), 0)
+        for product in products
+    }
+
+
+def reserve_stock(order, lines):
+    """
+    Place holds for ``lines`` (an iterable of ``(product_id, quantity)``) on ``order``.
+
+    Product rows are locked in id order for the duration of the surrounding
+    transaction so two checkouts for the same product serialize on the check.
+    """
+    requested = {}
+    for product_id, quantity in lines:
+        requested[product_id] = requested.get(product_id, 0) + quantity
+
+    now = timezone.now()
+    with transaction.atomic():
+        products = list(
+            Product.objects.select_for_update().filter(id__in=requested).order_by('id')
+        )
+        available = available_quantities(products, now)
+        shortages = [
+            (product, requested[product.id], available[product.id])
+            for product in products
+            if requested[product.id] > available[product.id]
+        ]
+        if shortages:
+            raise InsufficientStock(shortages)
+
+        expires_at = now + get_hold_ttl()
+        return InventoryHold.objects.bulk_create([
+            InventoryHold(order=order, product=product, quantity=requested[product.id], expires_at=expires_at)
+            for product in products
+        ])
+
+
+def release_holds(order):
+    """Give back the stock held for ``order``. Returns the number of holds released."""
+    return order.inventory_holds.filter(status='active').update(
+        status='released', updated_at=timezone.now()
+    )
+
+
+def convert_holds(order):
+    """
+    Turn the holds of a paid order into real stock decrements.
+
+    Every hold that has not been converted yet is applied, including ones that
+    expired or were swept before the payment landed: the customer has paid for
+    those units. Stock is floored at zero.
+    """
+    with transaction.atomic():
+        holds = list(
+            order.inventory_holds.select_for_update().exclude(status='converted').order_by('product_id')
+        )
+        # One UPDATE for every product, with each product's held quantity picked by a CASE
+        held = {}
+        for hold in holds:
+            held[hold.product_id] = held.get(hold.product_id, 0) + hold.quantity
+        if held:
+            quantity = Case(
+                *[When(id=product_id, then=Value(units)) for product_id, units in held.items()],
+                output_field=IntegerField(),
+            )
+            Product.objects.filter(id__in=held).update(
+                inventory_count=Greatest(F('inventory_count') - quantity, Value(0))
+            )
+        InventoryHold.objects.filter(id__in=[hold.id for hold in holds]).update(
+            status='converted', updated_at=timezone.now()
+        )
+    return len(holds)
+
+
+def restock_converted_holds(holds):
+    """
+    Put the units of the converted ``holds`` (a queryset) back in stock and mark
+    them released, for paid orders that are cancelled. Returns the number of holds.
+    """
+    with transaction.atomic():
+        holds = list(holds.select_for_update().filter(status='converted').order_by('product_id'))
+        returned = {}
+        for hold in holds:
+            returned[hold.product_id] = returned.get(hold.product_id, 0) + hold.quantity
+        if returned:
+            quantity = Case(
+                *[When(id=product_id, then=Value(units)) for product_id, units in returned.items()],
+                output_field=IntegerField(),
+            )
+            Product.objects.filter(id__in=returned).update(inventory_count=F('inventory_count') + quantity)
+        InventoryHold.objects.filter(id__in=[hold.id for hold in holds]).update(
+            status='released', updated_at=timezone.now()
+        )
+    return len(holds)
+
+
+def release_expired_holds(batch_size=500, now=None):
+    """Release expired holds in batches of ``batch_size``. Returns the total released."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            InventoryHold.objects.filter(status='active', expires_at__lte=now)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        released += InventoryHold.objects.filter(id__in=ids, status='active').update(
+            status='released', updated_at=now
+        )
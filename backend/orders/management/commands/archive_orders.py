@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.archive import archive_orders
+
+class Command(BaseCommand):
+    help = 'Move delivered and cancelled orders older than N months into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=12,
+            help='Archive orders created more than this many months ago (default: 12)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of orders moved per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many batches (default: no limit)'
+        )
+
+    def handle(self, *args, **options):
+        # A month is taken as 30 days
+        cutoff = timezone.now() - timedelta(days=30 * options['months'])
+        moved = archive_orders(cutoff, batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Archived {moved} orders created before {cutoff:%Y-%m-%d}')
+        )
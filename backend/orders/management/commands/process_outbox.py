@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from orders.notifications import flush_digest
+from orders.outbox import drain
+
+class Command(BaseCommand):
+    help = 'Deliver pending order side effects (Slack, email) from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of delivery threads (default: 4)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of events claimed per poll (default: 50)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the outbox is empty (default: 1.0)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the events that are currently due and exit'
+        )
+
+    def handle(self, *args, **options):
+        total_delivered = total_failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            try:
+                while True:
+                    delivered, failed = drain(
+                        batch_size=options['batch_size'],
+                        workers=options['workers'],
+                        executor=executor,
+                    )
+                    total_delivered += delivered
+                    total_failed += failed
+                    flush_digest()
+                    if delivered or failed:
+                        self.stdout.write(f'Delivered {delivered} events, {failed} failed')
+                        continue
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Interrupted, waiting for in-flight deliveries'))
+        # Don't drop orders still buffered for a Slack digest
+        flush_digest(force=True)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Outbox worker finished: {total_delivered} delivered, {total_failed} failed')
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from orders.idempotency import purge_expired_keys
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records (run periodically, e.g. hourly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of keys deleted per DELETE statement (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys')
+        )
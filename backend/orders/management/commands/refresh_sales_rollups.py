@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from orders.analytics import refresh_sales_rollups
+
+class Command(BaseCommand):
+    help = 'Update the daily sales rollups with orders placed or changed since the last refresh'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every day instead of only the days touched since the last refresh'
+        )
+
+    def handle(self, *args, **options):
+        days = refresh_sales_rollups(rebuild=options['rebuild'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Recomputed sales rollups for {days} days')
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from orders.inventory import release_expired_holds
+
+class Command(BaseCommand):
+    help = 'Release inventory holds whose reservation window has expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of holds released per UPDATE statement (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        released = release_expired_holds(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Released {released} expired inventory holds')
+        )
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0001_initial"),
+        ("store", "0002_review"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryHold",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "Active"),
+                            ("released", "Released"),
+                            ("converted", "Converted"),
+                        ],
+                        default="active",
+                        max_length=20,
+                    ),
+                ),
+                ("expires_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="inventory_holds",
+                        to="orders.order",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="inventory_holds",
+                        to="store.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["product", "status", "expires_at"],
+                        name="orders_inve_product_05b7e8_idx",
+                    ),
+                    models.Index(
+                        fields=["status", "expires_at"],
+                        name="orders_inve_status_94c141_idx",
+                    ),
+                    models.Index(
+                        fields=["order"], name="orders_inve_order_i_3be582_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_outboxevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="stripe_client_secret",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:58
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_existing_items(apps, schema_editor):
+    """Fill the snapshot of existing order items from their current product."""
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Product = apps.get_model("store", "Product")
+    product = Product.objects.filter(pk=OuterRef("product_id"))
+    OrderItem.objects.filter(product_name="").update(
+        product_name=Subquery(product.values("name")[:1]),
+        product_image_url=Subquery(product.values("image_url")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0006_idempotencykey"),
+        ("store", "0002_review"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_image_url",
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_name",
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.RunPython(snapshot_existing_items, migrations.RunPython.noop),
+    ]
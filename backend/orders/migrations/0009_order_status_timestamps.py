@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0008_archived_orders"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="cancelled_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="delivered_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="paid_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="shipped_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:07
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0009_order_status_timestamps"),
+        ("store", "0002_review"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("product_id", models.BigIntegerField()),
+                ("product_name", models.CharField(blank=True, max_length=200)),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                ("units", models.PositiveIntegerField(default=0)),
+                ("orders", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "Daily product sales",
+                "ordering": ["date", "product_id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                ("units", models.PositiveIntegerField(default=0)),
+                ("orders", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "Daily sales",
+                "ordering": ["date"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RollupState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("refreshed_through", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="archivedorderitem",
+            index=models.Index(
+                fields=["created_at"], name="orders_arch_created_6ae688_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["updated_at"], name="orders_orde_updated_94e16c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["created_at"], name="orders_orde_created_861eeb_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dailyproductsales",
+            index=models.Index(
+                fields=["product_id", "date"], name="orders_dail_product_f371d1_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="dailyproductsales",
+            unique_together={("date", "product_id")},
+        ),
+    ]
@@ -1,8 +1,45 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 from store.models import Product
 from decimal import Decimal
 
+class InvalidTransition(ValueError):
+    """Raised when an order is asked to move to a status it cannot reach from its current one."""
+
+class OrderQuerySet(models.QuerySet):
+    def bulk_transition(self, order_ids, status, chunk_size=1000):
+        """
+        Move the given orders to ``status`` with one UPDATE per chunk.
+
+        Only orders whose current status allows the transition are changed; the
+        check is part of the UPDATE's WHERE clause, so no order is loaded.
+        Cancelled orders give back their held stock, and paid ones the stock
+        they consumed, in the same transaction as the UPDATE.
+        Returns ``(updated, skipped)``.
+        """
+        from .inventory import restock_converted_holds
+        
+        sources = Order.sources_for(status)
+        now = timezone.now()
+        updates = {'status': status, 'updated_at': now}
+        if status in Order.STATUS_TIMESTAMPS:
+            updates[Order.STATUS_TIMESTAMPS[status]] = now
+        order_ids = list(dict.fromkeys(order_ids))
+        updated = 0
+        for start in range(0, len(order_ids), chunk_size):
+            chunk = order_ids[start:start + chunk_size]
+            if status != 'cancelled':
+                updated += self.filter(id__in=chunk, status__in=sources).update(**updates)
+                continue
+            with transaction.atomic():
+                updated += self.filter(id__in=chunk, status__in=sources).update(**updates)
+                # Give back stock held or consumed by the orders that were just cancelled
+                holds = InventoryHold.objects.filter(order_id__in=chunk, order__status='cancelled')
+                holds.filter(status='active').update(status='released', updated_at=now)
+                restock_converted_holds(holds)
+        return updated, len(order_ids) - updated
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -12,27 +49,75 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Allowed status changes; delivered and cancelled are final
+    TRANSITIONS = {
+        'pending': ['processing', 'cancelled'],
+        'processing': ['shipped', 'cancelled'],
+        'shipped': ['delivered'],
+        'delivered': [],
+        'cancelled': [],
+    }
+    
+    # Timestamp field recorded when an order enters a status
+    STATUS_TIMESTAMPS = {
+        'processing': 'paid_at',
+        'shipped': 'shipped_at',
+        'delivered': 'delivered_at',
+        'cancelled': 'cancelled_at',
+    }
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     stripe_payment_intent_id = models.CharField(max_length=255, blank=True, null=True)
+    stripe_client_secret = models.CharField(max_length=255, blank=True, null=True)
     shipping_address = models.TextField(blank=True, null=True)
+    paid_at = models.DateTimeField(blank=True, null=True)
+    shipped_at = models.DateTimeField(blank=True, null=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    cancelled_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user']),
             models.Index(fields=['status']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['stripe_payment_intent_id']),
+            # Sales rollups: orders whose status changed since the last refresh
+            models.Index(fields=['updated_at']),
         ]
     
     def __str__(self):
         return f"Order {self.id} - {self.user.username} - ${self.total_amount}"
     
+    @classmethod
+    def sources_for(cls, status):
+        """Statuses from which an order may move to ``status``"""
+        return [source for source, targets in cls.TRANSITIONS.items() if status in targets]
+    
+    def can_transition_to(self, status):
+        return status in self.TRANSITIONS.get(self.status, [])
+    
+    def transition_to(self, status, save=True):
+        """Move to ``status``, recording when it happened. Raises InvalidTransition."""
+        if not self.can_transition_to(status):
+            raise InvalidTransition(f"Order {self.id} cannot go from {self.status} to {status}")
+        self.status = status
+        if status in self.STATUS_TIMESTAMPS:
+            setattr(self, self.STATUS_TIMESTAMPS[status], timezone.now())
+        if save:
+            self.save()
+    
     @property
     def items_count(self):
+        # Annotated by OrderViewSet.get_queryset for listings
+        if hasattr(self, 'order_items_count'):
+            return self.order_items_count
         return self.order_items.count()
 
 class OrderItem(models.Model):
@@ -40,17 +125,220 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Product details as they were at purchase time
+    product_name = models.CharField(max_length=200, blank=True)
+    product_image_url = models.URLField(max_length=500, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         indexes = [
             models.Index(fields=['order']),
             models.Index(fields=['product']),
+            # Sales rollups: items added since the last refresh
+            models.Index(fields=['created_at']),
         ]
     
     def __str__(self):
-        return f"{self.order.id} - {self.product.name} x{self.quantity}"
+        return f"{self.order_id} - {self.product_name} x{self.quantity}"
+    
+    def save(self, *args, **kwargs):
+        if not self.product_name and self.product_id:
+            self.product_name = self.product.name
+            self.product_image_url = self.product.image_url
+        super().save(*args, **kwargs)
     
     @property
     def total_price(self):
         return self.unit_price * self.quantity
+
+class InventoryHold(models.Model):
+    """Units of a product reserved for an order until payment completes."""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('released', 'Released'),
+        ('converted', 'Converted'),
+    ]
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='inventory_holds')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_holds')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Availability lookups: active holds for a set of products
+            models.Index(fields=['product', 'status', 'expires_at']),
+            # Sweeper: active holds past their expiry
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['order']),
+        ]
+    
+    def __str__(self):
+        return f"Hold {self.id} - order {self.order_id} - product {self.product_id} x{self.quantity} ({self.status})"
+
+class OutboxEvent(models.Model):
+    """A side effect of an order, recorded in the order's transaction and delivered by the outbox worker."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+    
+    event_type = models.CharField(max_length=100)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='outbox_events', blank=True, null=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Worker polling: pending events that are due
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['order']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} #{self.id} ({self.status})"
+
+class StripeEvent(models.Model):
+    """A Stripe webhook event that has been received, kept to drop redeliveries."""
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.event_id}"
+
+class IdempotencyKey(models.Model):
+    """The stored outcome of a mutating request sent with an ``Idempotency-Key`` header."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    # Null while the original request is still being processed
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['user', 'key']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.key} ({self.method} {self.path})"
+
+class ArchivedOrder(models.Model):
+    """A delivered or cancelled order moved out of the hot ``Order`` table by ``archive_orders``."""
+    # Keeps the original order id
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    stripe_payment_intent_id = models.CharField(max_length=255, blank=True, null=True)
+    shipping_address = models.TextField(blank=True, null=True)
+    paid_at = models.DateTimeField(blank=True, null=True)
+    shipped_at = models.DateTimeField(blank=True, null=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    cancelled_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Archived order {self.id} - ${self.total_amount}"
+    
+    @property
+    def items_count(self):
+        return self.order_items.count()
+
+class ArchivedOrderItem(models.Model):
+    """An item of an archived order; renders from its purchase-time snapshot only."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='order_items')
+    # Plain column rather than a foreign key: archived history never joins products
+    product_id = models.BigIntegerField()
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    product_name = models.CharField(max_length=200, blank=True)
+    product_image_url = models.URLField(max_length=500, blank=True, null=True)
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['order']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_id} - {self.product_name} x{self.quantity}"
+    
+    @property
+    def total_price(self):
+        return self.unit_price * self.quantity
+
+class DailySales(models.Model):
+    """Paid revenue, units and orders for one day, maintained by ``refresh_sales_rollups``."""
+    date = models.DateField(unique=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'Daily sales'
+    
+    def __str__(self):
+        return f"{self.date} - ${self.revenue}"
+
+class DailyProductSales(models.Model):
+    """Paid revenue, units and orders for one product on one day."""
+    date = models.DateField()
+    # Plain column like ArchivedOrderItem: rollups outlive deleted products
+    product_id = models.BigIntegerField()
+    product_name = models.CharField(max_length=200, blank=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['date', 'product_id']
+        unique_together = ['date', 'product_id']
+        indexes = [
+            models.Index(fields=['product_id', 'date']),
+        ]
+        verbose_name_plural = 'Daily product sales'
+    
+    def __str__(self):
+        return f"{self.date} - {self.product_name} - ${self.revenue}"
+
+class RollupState(models.Model):
+    """High-water mark of a rollup: everything up to ``refreshed_through`` is reflected in it."""
+    name = models.CharField(max_length=100, unique=True)
+    refreshed_through = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} through {self.refreshed_through}"
@@ -0,0 +1,302 @@
+"""
+Slack notifications for orders, delivered by the outbox worker.
+
+These run outside the request cycle (see ``orders.outbox``). Delivery failures
+are re-raised so the worker can retry them with backoff.
+
+Slack messages go through one ``SlackClient`` per process, which keeps a
+pooled keep-alive session, applies timeouts and retries rate-limited (429) and
+5xx responses. When ``SLACK_DIGEST_INTERVAL_SECONDS`` is set, order volume
+above ``SLACK_DIGEST_THRESHOLD`` messages per interval is folded into a single
+digest message per interval instead of one message per order.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+
+from ecommerce.metrics import external_call
+
+SLACK_API_URL = 'https://slack.com/api/chat.postMessage'
+
+DEFAULT_TIMEOUT_SECONDS = 5
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 0.5
+# Never sleep longer than this on a single Retry-After; the outbox retries later instead
+MAX_RETRY_AFTER_SECONDS = 30
+DIGEST_MAX_LINES = 40
+
+
+class SlackError(Exception):
+    """Slack rejected a message or could not be reached after retries."""
+
+
+class SlackClient:
+    """Posts messages to an incoming webhook or ``chat.postMessage`` over a shared session."""
+
+    def __init__(self, webhook_url='', bot_token='', channel='', timeout=DEFAULT_TIMEOUT_SECONDS,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF_SECONDS, pool_size=10, sleep=time.sleep):
+        self.webhook_url = webhook_url
+        self.bot_token = bot_token
+        self.channel = channel
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+
+    @classmethod
+    def from_settings(cls):
+        # Use channel name if provided, otherwise fall back to channel ID
+        channel = getattr(settings, 'SLACK_CHANNEL_NAME', 'pactle-shopping')
+        if getattr(settings, 'SLACK_CHANNEL_ID', ''):
+            channel = settings.SLACK_CHANNEL_ID
+        return cls(
+            webhook_url=getattr(settings, 'SLACK_WEBHOOK_URL', ''),
+            bot_token=getattr(settings, 'SLACK_BOT_TOKEN', ''),
+            channel=channel,
+            timeout=getattr(settings, 'SLACK_TIMEOUT_SECONDS', DEFAULT_TIMEOUT_SECONDS),
+            max_retries=getattr(settings, 'SLACK_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+        )
+
+    @property
+    def is_configured(self):
+        return bool(self.webhook_url or self.bot_token)
+
+    def post(self, message):
+        """Send ``message`` (a dict with ``text`` and ``blocks``), retrying transient failures."""
+        # Webhook URL is the easier setup and wins when both are configured
+        if self.webhook_url:
+            url, headers, payload = self.webhook_url, {}, message
+        else:
+            url = SLACK_API_URL
+            headers = {'Authorization': f'Bearer {self.bot_token}'}
+            payload = {'channel': self.channel, **message}
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with external_call('slack'):
+                    response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt > self.max_retries:
+                    raise SlackError(f"Slack unreachable after {attempt} attempts: {e}") from e
+                self.sleep(self.backoff * 2 ** (attempt - 1))
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt > self.max_retries:
+                    raise SlackError(f"Slack returned {response.status_code} after {attempt} attempts")
+                self.sleep(self.retry_after(response, attempt))
+                continue
+
+            if response.status_code >= 400:
+                raise SlackError(f"Slack returned {response.status_code}: {response.text[:200]}")
+
+            if not self.webhook_url:
+                # chat.postMessage reports failures in the body with HTTP 200
+                response_data = response.json()
+                if not response_data.get('ok'):
+                    raise SlackError(f"Slack API error: {response_data.get('error', 'Unknown error')}")
+            return response
+
+    def retry_after(self, response, attempt):
+        """Seconds to wait before retrying, honoring Slack's Retry-After header."""
+        try:
+            delay = float(response.headers['Retry-After'])
+        except (KeyError, ValueError):
+            delay = self.backoff * 2 ** (attempt - 1)
+        return min(delay, MAX_RETRY_AFTER_SECONDS)
+
+
+class SlackDigest:
+    """
+    Rate-based batching of order messages.
+
+    The first ``threshold`` messages of every ``interval`` are sent as usual;
+    the rest are buffered and posted as one digest message per kind when the
+    interval rolls over or ``flush`` is called.
+    """
+
+    def __init__(self, client, interval, threshold, clock=time.monotonic):
+        self.client = client
+        self.interval = interval
+        self.threshold = threshold
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.window_started = clock()
+        self.sent_in_window = 0
+        self.pending = {}
+
+    def submit(self, kind, order, message):
+        """Send ``message`` now, or buffer ``order`` for the ``kind`` digest during a peak."""
+        due = self.roll_window()
+        with self.lock:
+            buffered = self.sent_in_window >= self.threshold
+            if buffered:
+                self.pending.setdefault(kind, []).append(digest_line(order))
+            else:
+                self.sent_in_window += 1
+        self.send_digests(due)
+        if not buffered:
+            self.client.post(message)
+
+    def roll_window(self):
+        """Start a new interval if the current one is over; return digests that became due."""
+        with self.lock:
+            if self.clock() - self.window_started < self.interval:
+                return {}
+            self.window_started = self.clock()
+            self.sent_in_window = 0
+            due, self.pending = self.pending, {}
+            return due
+
+    def flush(self):
+        """Post every buffered digest immediately."""
+        with self.lock:
+            due, self.pending = self.pending, {}
+        self.send_digests(due)
+
+    def flush_due(self):
+        self.send_digests(self.roll_window())
+
+    def send_digests(self, due):
+        for kind, lines in due.items():
+            self.client.post(digest_message(kind, lines))
+
+
+# Shared per-process client and digest, created on first use
+_client = None
+_digest = None
+_setup_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _setup_lock:
+        if _client is None:
+            _client = SlackClient.from_settings()
+        return _client
+
+
+def get_digest():
+    """The process-wide digest, or None when digest mode is off."""
+    global _digest
+    interval = getattr(settings, 'SLACK_DIGEST_INTERVAL_SECONDS', 0)
+    if not interval:
+        return None
+    client = get_client()
+    with _setup_lock:
+        if _digest is None:
+            _digest = SlackDigest(client, interval, getattr(settings, 'SLACK_DIGEST_THRESHOLD', 10))
+        return _digest
+
+
+def flush_digest(force=False):
+    """Post digests whose interval is over (or all of them with ``force``)."""
+    digest = get_digest()
+    if digest is None:
+        return
+    if force:
+        digest.flush()
+    else:
+        digest.flush_due()
+
+
+def order_fields(order, amount_label, status_text=None):
+    fields = [
+        {"type": "mrkdwn", "text": f"*Order ID:*\n#{order.id}"},
+        {"type": "mrkdwn", "text": f"*Customer:*\n{order.user.username}"},
+        {"type": "mrkdwn", "text": f"*{amount_label}:*\n${order.total_amount}"},
+    ]
+    if status_text:
+        fields.append({"type": "mrkdwn", "text": f"*Status:*\n{status_text}"})
+    else:
+        fields.append({"type": "mrkdwn", "text": f"*Items:*\n{order.items_count} items"})
+    return fields
+
+
+def header_block(text):
+    return {"type": "header", "text": {"type": "plain_text", "text": text, "emoji": True}}
+
+
+def context_block(text):
+    return {"type": "context", "elements": [{"type": "mrkdwn", "text": text}]}
+
+
+def order_created_message(order):
+    return {
+        "text": ":shopping_cart: *New Order Created!*",
+        "blocks": [
+            header_block("🛒 New Order Received"),
+            {"type": "section", "fields": order_fields(order, "Total Amount")},
+            {"type": "section", "text": {"type": "mrkdwn", "text": f"*Shipping Address:*\n{order.shipping_address}"}},
+            context_block(f"Order created at {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}"),
+        ]
+    }
+
+
+def payment_confirmed_message(order):
+    return {
+        "text": ":white_check_mark: *Payment Confirmed!*",
+        "blocks": [
+            header_block("✅ Payment Confirmed"),
+            {"type": "section", "fields": order_fields(order, "Amount Paid", status_text="Processing")},
+            context_block(f"Payment confirmed at {order.updated_at.strftime('%Y-%m-%d %H:%M:%S')}"),
+        ]
+    }
+
+
+DIGEST_TITLES = {
+    'order_created': ("🛒 {count} New Orders", ":shopping_cart: *{count} new orders*"),
+    'payment_confirmed': ("✅ {count} Payments Confirmed", ":white_check_mark: *{count} payments confirmed*"),
+}
+
+
+def digest_line(order):
+    return f"#{order.id} · {order.user.username} · ${order.total_amount}"
+
+
+def digest_message(kind, lines):
+    header, text = DIGEST_TITLES[kind]
+    count = len(lines)
+    body = '\n'.join(lines[:DIGEST_MAX_LINES])
+    if count > DIGEST_MAX_LINES:
+        body += f"\n…and {count - DIGEST_MAX_LINES} more"
+    return {
+        "text": text.format(count=count),
+        "blocks": [
+            header_block(header.format(count=count)),
+            {"type": "section", "text": {"type": "mrkdwn", "text": body}},
+        ]
+    }
+
+
+def notify(kind, order, message):
+    client = get_client()
+    if not client.is_configured:
+        return
+    digest = get_digest()
+    if digest is not None:
+        digest.submit(kind, order, message)
+    else:
+        client.post(message)
+
+
+def notify_order_created(order):
+    """Send notification to Slack when a new order is created"""
+    notify('order_created', order, order_created_message(order))
+
+
+def notify_payment_confirmed(order):
+    """Send notification to Slack when payment is confirmed"""
+    notify('payment_confirmed', order, payment_confirmed_message(order))
+
@@ -0,0 +1,219 @@
+"""
+Transactional outbox for order side effects.
+
+Views and serializers record events with ``enqueue`` inside the same database
+transaction as the order change that caused them, so an event exists if and
+only if the change committed. Handlers read the order as it is at delivery
+time, and skip orders cancelled in the meantime. The ``process_outbox`` management command drains pending
+events on a thread pool, retrying failed deliveries with exponential backoff.
+
+A claimed event is leased by pushing its ``available_at`` forward; if a worker
+dies mid-delivery the event becomes due again once the lease runs out.
+
+Event types registered with ``batch_handler`` receive all of their due events
+from a claimed batch in one call, for side effects that are cheaper in bulk.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import emails, notifications
+from .models import Order, OutboxEvent
+
+SLACK_ORDER_CREATED = 'slack.order_created'
+EMAIL_ORDER_CONFIRMATION = 'email.order_confirmation'
+SLACK_PAYMENT_CONFIRMED = 'slack.payment_confirmed'
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_RETRY_BASE_SECONDS = 2
+DEFAULT_RETRY_MAX_SECONDS = 600
+DEFAULT_LEASE_SECONDS = 300
+
+HANDLERS = {}
+BATCH_HANDLERS = {}
+
+logger = logging.getLogger(__name__)
+
+
+def handler(event_type):
+    """Register the decorated function as the delivery handler for ``event_type``."""
+    def register(func):
+        HANDLERS[event_type] = func
+        return func
+    return register
+
+
+def batch_handler(event_type):
+    """
+    Register the decorated function as the batch delivery handler for ``event_type``.
+
+    It is called with a list of events and returns ``{event_id: exception}``
+    for the events that failed.
+    """
+    def register(func):
+        BATCH_HANDLERS[event_type] = func
+        return func
+    return register
+
+
+@handler(SLACK_ORDER_CREATED)
+def deliver_order_created_slack(event):
+    # The Stripe call after checkout may have failed and cancelled the order
+    if event.order.status != 'cancelled':
+        notifications.notify_order_created(event.order)
+
+
+@batch_handler(EMAIL_ORDER_CONFIRMATION)
+def deliver_order_confirmation_emails(events):
+    if not emails.is_configured():
+        return {}
+    orders = (
+        Order.objects.exclude(status='cancelled')
+        .select_related('user').prefetch_related('order_items')
+        .in_bulk([event.order_id for event in events])
+    )
+    failures = emails.send_confirmation_emails(list(orders.values()))
+    return {event.id: failures[event.order_id] for event in events if event.order_id in failures}
+
+
+@handler(SLACK_PAYMENT_CONFIRMED)
+def deliver_payment_confirmed_slack(event):
+    notifications.notify_payment_confirmed(event.order)
+
+
+def enqueue(event_type, order=None, payload=None):
+    """Record an event; call inside the transaction that changes ``order``."""
+    return OutboxEvent.objects.create(event_type=event_type, order=order, payload=payload or {})
+
+
+def enqueue_order_created(order):
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(event_type=event_type, order=order, payload={})
+        for event_type in (SLACK_ORDER_CREATED, EMAIL_ORDER_CONFIRMATION)
+    ])
+
+
+def enqueue_payment_confirmed(order):
+    enqueue(SLACK_PAYMENT_CONFIRMED, order)
+
+
+def retry_delay(attempts):
+    """Exponential backoff for the given number of failed attempts."""
+    base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', DEFAULT_RETRY_BASE_SECONDS)
+    cap = getattr(settings, 'OUTBOX_RETRY_MAX_SECONDS', DEFAULT_RETRY_MAX_SECONDS)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), cap))
+
+
+def claim_batch(batch_size):
+    """Lease up to ``batch_size`` due events and return them."""
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'OUTBOX_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', available_at__lte=now)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(available_at=now + lease)
+    return events
+
+
+def deliver(event):
+    """Run the handler for ``event`` and record the outcome. Returns True on success."""
+    if event.event_type in BATCH_HANDLERS:
+        return deliver_batch([event]) == 1
+    try:
+        func = HANDLERS.get(event.event_type)
+        if func is None:
+            raise LookupError(f"No outbox handler registered for {event.event_type!r}")
+        func(event)
+    except Exception as e:
+        record_failure(event, e)
+        return False
+    else:
+        record_success([event])
+        return True
+
+
+def deliver_batch(events):
+    """Run the batch handler for events of one type. Returns the number delivered."""
+    try:
+        failures = BATCH_HANDLERS[events[0].event_type](events)
+    except Exception as e:
+        failures = {event.id: e for event in events}
+    delivered = [event for event in events if event.id not in failures]
+    record_success(delivered)
+    for event in events:
+        if event.id in failures:
+            record_failure(event, failures[event.id])
+    return len(delivered)
+
+
+def deliver_group(events):
+    """Deliver events of one type, in bulk when the type has a batch handler."""
+    if events[0].event_type in BATCH_HANDLERS:
+        return deliver_batch(events)
+    return sum(deliver(event) for event in events)
+
+
+def deliver_in_worker_thread(events):
+    """``deliver_group`` wrapped for pool threads, which each hold their own DB connection."""
+    close_old_connections()
+    try:
+        return deliver_group(events)
+    finally:
+        close_old_connections()
+
+
+def record_success(events):
+    # Each event was claimed with its own attempt count, so update them one by one
+    now = timezone.now()
+    for event in events:
+        OutboxEvent.objects.filter(id=event.id).update(
+            status='delivered', delivered_at=now, attempts=event.attempts + 1, last_error=''
+        )
+
+
+def record_failure(event, error):
+    attempts = event.attempts + 1
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    updates = {'attempts': attempts, 'last_error': f"{type(error).__name__}: {error}"}
+    if attempts >= max_attempts:
+        updates['status'] = 'failed'
+    else:
+        updates['available_at'] = timezone.now() + retry_delay(attempts)
+    OutboxEvent.objects.filter(id=event.id).update(**updates)
+    if attempts >= max_attempts:
+        logger.error('Outbox delivery of %s failed for good after %d attempts', event, attempts, exc_info=error)
+    else:
+        logger.warning('Outbox delivery of %s failed (attempt %d), retrying', event, attempts, exc_info=error)
+
+
+def drain(batch_size=50, workers=4, executor=None):
+    """
+    Deliver one batch of due events. Returns ``(delivered, failed)``.
+
+    Pass a long-lived ``executor`` to reuse its threads across batches.
+    """
+    events = claim_batch(batch_size)
+    if not events:
+        return 0, 0
+    # Batch-handled types travel as one task; everything else is one task per event
+    tasks, batches = [], {}
+    for event in events:
+        if event.event_type in BATCH_HANDLERS:
+            batches.setdefault(event.event_type, []).append(event)
+        else:
+            tasks.append([event])
+    tasks.extend(batches.values())
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            delivered = sum(pool.map(deliver_in_worker_thread, tasks))
+    else:
+        delivered = sum(executor.map(deliver_in_worker_thread, tasks))
+    return delivered, len(events) - delivered
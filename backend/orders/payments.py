@@ -0,0 +1,110 @@
+"""
+Payment state transitions driven by Stripe.
+
+Stripe webhook events are verified and deduplicated by ``StripeWebhookView``
+and then queued in the outbox; the handler registered here applies them to
+the order outside the request.
+
+Calls to the Stripe API go through the helpers below, which time them as
+external calls.
+"""
+
+from django.db import transaction
+import stripe
+
+from ecommerce.metrics import external_call
+from . import outbox
+from .inventory import convert_holds, release_holds
+from .models import Order
+
+STRIPE_EVENT = 'stripe.event'
+
+# Stripe event types that change order state
+HANDLED_EVENT_TYPES = {'payment_intent.succeeded', 'payment_intent.canceled'}
+
+
+def payment_intent_params(order):
+    return {
+        'amount': int(order.total_amount * 100),  # Convert to cents
+        'currency': 'usd',
+        'metadata': {'order_id': order.id},
+    }
+
+
+def create_payment_intent(order):
+    with external_call('stripe'):
+        return stripe.PaymentIntent.create(**payment_intent_params(order))
+
+
+def retrieve_payment_intent(payment_intent_id):
+    with external_call('stripe'):
+        return stripe.PaymentIntent.retrieve(payment_intent_id)
+
+
+def mark_order_paid(order):
+    """
+    Move a pending order to processing, consume its stock holds and queue the
+    payment Slack notification. Safe to call more than once for the same order.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if not order.can_transition_to('processing'):
+            return order
+        order.transition_to('processing')
+        convert_holds(order)
+        outbox.enqueue_payment_confirmed(order)
+    return order
+
+
+def mark_order_cancelled(order):
+    """Cancel a pending order and give its held stock back."""
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.status != 'pending':
+            return order
+        order.transition_to('cancelled')
+        release_holds(order)
+    return order
+
+
+class OrderNotReady(Exception):
+    """A Stripe event names an order that is not visible yet; the outbox retries it."""
+
+
+def enqueue_stripe_event(event):
+    """Queue a verified Stripe event for asynchronous processing."""
+    payment_intent = event['data']['object']
+    outbox.enqueue(STRIPE_EVENT, payload={
+        'event_id': event['id'],
+        'type': event['type'],
+        'payment_intent_id': payment_intent['id'],
+        'order_id': (payment_intent.get('metadata') or {}).get('order_id'),
+    })
+
+
+def order_for_event(payload):
+    """The order a queued Stripe event is about, or None when it is not one of ours."""
+    order = Order.objects.filter(stripe_payment_intent_id=payload['payment_intent_id']).first()
+    order_id = str(payload.get('order_id') or '')
+    if order is not None or not order_id.isdigit():
+        # Without our metadata the PaymentIntent was created outside this shop
+        return order
+    # The event can arrive before perform_create saves the PaymentIntent id
+    order = Order.objects.filter(pk=int(order_id)).first()
+    if order is None:
+        raise OrderNotReady(f"Order {order_id} for {payload['payment_intent_id']} not found")
+    if order.stripe_payment_intent_id and order.stripe_payment_intent_id != payload['payment_intent_id']:
+        # An earlier PaymentIntent for an order that has moved on to another one
+        return None
+    return order
+
+
+@outbox.handler(STRIPE_EVENT)
+def apply_stripe_event(event):
+    order = order_for_event(event.payload)
+    if order is None:
+        return
+    if event.payload['type'] == 'payment_intent.succeeded':
+        mark_order_paid(order)
+    elif event.payload['type'] == 'payment_intent.canceled':
+        mark_order_cancelled(order)
@@ -1,10 +1,28 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Order, OrderItem
+from ecommerce.metrics import TimedSerializerMixin
+from . import outbox
+from .inventory import InsufficientStock, release_holds, reserve_stock, restock_converted_holds
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from .fulfillment import BULK_TARGET_STATUSES, order_ids_from_csv
 from store.models import CartItem
-from store.serializers import ProductSerializer
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+# Statuses a customer may move their own order to, and the statuses it may be in
+CUSTOMER_STATUSES = ['cancelled']
+CUSTOMER_CANCELLABLE_STATUSES = ['pending']
+
+class OrderItemProductSerializer(TimedSerializerMixin, serializers.Serializer):
+    """The product as it was when the order was placed, read from the OrderItem snapshot"""
+    id = serializers.IntegerField(source='product_id')
+    name = serializers.CharField(source='product_name')
+    image_url = serializers.CharField(source='product_image_url')
+    price = serializers.DecimalField(source='unit_price', max_digits=10, decimal_places=2)
+
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product = OrderItemProductSerializer(source='*', read_only=True)
     total_price = serializers.ReadOnlyField()
     
     class Meta:
@@ -12,7 +30,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'quantity', 'unit_price', 'total_price', 'created_at']
         read_only_fields = ['created_at']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)
     items_count = serializers.ReadOnlyField()
     shipping_address = serializers.CharField(required=True, allow_blank=False)
@@ -24,60 +42,147 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'total_amount', 'stripe_payment_intent_id', 'created_at', 'updated_at']
     
     def get_client_secret(self, obj):
-        """Return the client secret for the payment intent"""
-        if obj.stripe_payment_intent_id:
-            try:
-                import stripe
-                from django.conf import settings
-                stripe.api_key = settings.STRIPE_SECRET_KEY
-                payment_intent = stripe.PaymentIntent.retrieve(obj.stripe_payment_intent_id)
-                return payment_intent.client_secret
-            except Exception as e:
-                print(f"Error retrieving client secret: {e}")
-                return None
-        return None
+        """Return the client secret for an order that is still awaiting payment"""
+        # Captured when the PaymentIntent is created; never fetched from Stripe here,
+        # and left out of list responses so it only travels with the order being paid
+        if isinstance(self.parent, serializers.ListSerializer) or obj.status != 'pending':
+            return None
+        return obj.stripe_client_secret
     
     def validate_shipping_address(self, value):
         if not value or not value.strip():
             raise serializers.ValidationError("Shipping address is required.")
         return value.strip()
     
+    def validate_status(self, value):
+        if self.instance is None or value == self.instance.status:
+            return value
+        # Payment, shipping and delivery come from Stripe and staff; customers may
+        # only cancel, and only before paying, since cancelling does not refund
+        request = self.context.get('request')
+        is_staff = request is not None and getattr(request.user, 'is_staff', False)
+        if not is_staff:
+            if value not in CUSTOMER_STATUSES:
+                raise serializers.ValidationError("You can only cancel an order.")
+            if self.instance.status not in CUSTOMER_CANCELLABLE_STATUSES:
+                raise serializers.ValidationError("Only pending orders can be cancelled.")
+        if not self.instance.can_transition_to(value):
+            raise serializers.ValidationError(f"Cannot change status from {self.instance.status} to {value}.")
+        return value
+    
+    def update(self, instance, validated_data):
+        status = validated_data.pop('status', instance.status)
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            if status != instance.status:
+                instance.transition_to(status, save=False)
+            instance.save()
+            if instance.status == 'cancelled':
+                release_holds(instance)
+                restock_converted_holds(instance.inventory_holds.all())
+        return instance
+    
     def create(self, validated_data):
-        user = self.context['request'].user
-        cart_items = CartItem.objects.filter(user=user)
+        user_id = self.context['request'].user.id
+        cart_items = list(CartItem.objects.filter(user_id=user_id).select_related('product'))
         
-        if not cart_items.exists():
+        if not cart_items:
             raise serializers.ValidationError("Cart is empty.")
         
         # Calculate total amount
         total_amount = sum(item.total_price for item in cart_items)
         
-        # Create order
-        order = Order.objects.create(
-            user=user,
-            total_amount=total_amount,
-            **validated_data
-        )
-        
-        # Create order items from cart items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.product.price
+        with transaction.atomic():
+            # Create order
+            order = Order.objects.create(
+                user_id=user_id,
+                total_amount=total_amount,
+                **validated_data
             )
-        
-        # Clear cart
-        cart_items.delete()
+            
+            # Hold stock until payment is confirmed
+            try:
+                reserve_stock(order, [(item.product_id, item.quantity) for item in cart_items])
+            except InsufficientStock as e:
+                raise serializers.ValidationError(str(e))
+            
+            # Create order items from cart items
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=cart_item.product,
+                    quantity=cart_item.quantity,
+                    unit_price=cart_item.product.price,
+                    product_name=cart_item.product.name,
+                    product_image_url=cart_item.product.image_url
+                )
+                for cart_item in cart_items
+            ])
+            
+            # Clear cart
+            CartItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
+            
+            # Slack notification and confirmation email, delivered by the outbox
+            # worker once the order commits
+            outbox.enqueue_order_created(order)
         
         return order
 
-class OrderDetailSerializer(serializers.ModelSerializer):
+class OrderDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)
     items_count = serializers.ReadOnlyField()
     
     class Meta:
         model = Order
         fields = ['id', 'user', 'total_amount', 'status', 'stripe_payment_intent_id', 'shipping_address', 'order_items', 'items_count', 'created_at', 'updated_at']
-        read_only_fields = ['user', 'total_amount', 'stripe_payment_intent_id', 'created_at', 'updated_at'] 
\ No newline at end of file
+        read_only_fields = ['user', 'total_amount', 'stripe_payment_intent_id', 'created_at', 'updated_at'] 
+class ArchivedOrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product = OrderItemProductSerializer(source='*', read_only=True)
+    total_price = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ['id', 'product', 'quantity', 'unit_price', 'total_price', 'created_at']
+        read_only_fields = fields
+
+class ArchivedOrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    order_items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    items_count = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            'id', 'user', 'total_amount', 'status', 'stripe_payment_intent_id', 'shipping_address', 'order_items', 'items_count',
+            'paid_at', 'shipped_at', 'delivered_at', 'cancelled_at', 'created_at', 'updated_at', 'archived_at',
+        ]
+        read_only_fields = fields
+
+class BulkTransitionSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=BULK_TARGET_STATUSES)
+    order_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    file = serializers.FileField(required=False)
+    
+    def validate(self, attrs):
+        if 'file' in attrs:
+            try:
+                attrs['order_ids'] = order_ids_from_csv(attrs.pop('file'))
+            except (ValueError, UnicodeDecodeError) as e:
+                raise serializers.ValidationError({'file': str(e)})
+        if not attrs.get('order_ids'):
+            raise serializers.ValidationError("Provide order_ids or a CSV file with an order_id column.")
+        return attrs
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    product = serializers.IntegerField(required=False, min_value=1)
+    top = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+    
+    def validate(self, attrs):
+        # Defaults to the last 30 days
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=29))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
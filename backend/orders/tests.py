@@ -1,3 +1,737 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+import stripe
+
+from store.models import Product, CartItem, Review
+from . import analytics, cache as order_cache, emails, notifications, outbox, payments
+from .inventory import available_quantities, convert_holds, release_expired_holds
+from .models import Order, OrderItem, InventoryHold, OutboxEvent, StripeEvent, IdempotencyKey, ArchivedOrder, InvalidTransition, DailySales, DailyProductSales
+from .notifications import SlackClient, SlackDigest, SlackError
+
+
+def make_product(**kwargs):
+    defaults = {
+        'name': 'Test Product',
+        'description': 'A product used in tests',
+        'price': Decimal('10.00'),
+        'inventory_count': 5,
+    }
+    defaults.update(kwargs)
+    return Product.objects.create(**defaults)
+
+
+class InventoryHoldTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        self.product = make_product(inventory_count=3)
+
+    def checkout(self, quantity):
+        CartItem.objects.create(user=self.user, product=self.product, quantity=quantity)
+        return self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json')
+
+    def test_checkout_holds_stock(self):
+        response = self.checkout(2)
+        self.assertEqual(response.status_code, 201)
+        hold = InventoryHold.objects.get(order_id=response.data['id'])
+        self.assertEqual(hold.quantity, 2)
+        self.assertEqual(hold.status, 'active')
+        self.assertEqual(available_quantities([self.product])[self.product.id], 1)
+
+    def test_checkout_rejects_oversell(self):
+        self.assertEqual(self.checkout(2).status_code, 201)
+        other = User.objects.create_user(username='other', email='other@example.com', password='secret')
+        self.client.force_authenticate(other)
+        CartItem.objects.create(user=other, product=self.product, quantity=2)
+        response = self.client.post('/api/orders/', {'shipping_address': '2 Main St'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.filter(user=other).count(), 0)
+        self.assertTrue(CartItem.objects.filter(user=other).exists())
+
+    def test_expired_holds_do_not_count_and_are_swept(self):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('30.00'))
+        InventoryHold.objects.create(
+            order=order, product=self.product, quantity=3,
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(available_quantities([self.product])[self.product.id], 3)
+        self.assertEqual(release_expired_holds(batch_size=1), 1)
+        self.assertEqual(InventoryHold.objects.get().status, 'released')
+
+    def test_sweeper_command_releases_in_batches(self):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'))
+        past = timezone.now() - timedelta(minutes=1)
+        InventoryHold.objects.bulk_create([
+            InventoryHold(order=order, product=self.product, quantity=1, expires_at=past)
+            for _ in range(5)
+        ])
+        call_command('release_expired_holds', batch_size=2, stdout=mock.MagicMock())
+        self.assertFalse(InventoryHold.objects.filter(status='active').exists())
+
+    def test_convert_holds_decrements_stock_once(self):
+        order_id = self.checkout(2).data['id']
+        order = Order.objects.get(id=order_id)
+        convert_holds(order)
+        convert_holds(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory_count, 1)
+        self.assertEqual(InventoryHold.objects.get(order=order).status, 'converted')
+
+    def paid_order(self, quantity):
+        order = payments.mark_order_paid(Order.objects.get(id=self.checkout(quantity).data['id']))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory_count, 3 - quantity)
+        return order
+
+    def test_customer_cannot_cancel_paid_order(self):
+        order = self.paid_order(2)
+        response = self.client.patch(f'/api/orders/{order.id}/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'processing')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory_count, 1)
+
+    def test_staff_cancel_of_paid_order_restocks(self):
+        order = self.paid_order(2)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.patch(f'/api/orders/{order.id}/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory_count, 3)
+        self.assertEqual(InventoryHold.objects.get(order=order).status, 'released')
+
+    def test_bulk_cancel_of_paid_order_restocks_once(self):
+        order = self.paid_order(2)
+        self.assertEqual(Order.objects.bulk_transition([order.id], 'cancelled'), (1, 0))
+        self.assertEqual(Order.objects.bulk_transition([order.id], 'cancelled'), (0, 1))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory_count, 3)
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_dummy')
+class OutboxTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        self.product = make_product()
+        CartItem.objects.create(user=self.user, product=self.product, quantity=1)
+
+    @mock.patch('orders.emails.send_confirmation_emails')
+    @mock.patch('orders.notifications.notify_order_created')
+    @mock.patch('stripe.PaymentIntent.create')
+    def test_checkout_records_events_instead_of_sending(self, create_intent, send_slack, send_email):
+        create_intent.return_value = mock.Mock(id='pi_123', client_secret='pi_123_secret')
+        response = self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        send_slack.assert_not_called()
+        send_email.assert_not_called()
+        self.assertEqual(
+            set(OutboxEvent.objects.filter(order_id=response.data['id']).values_list('event_type', flat=True)),
+            {outbox.SLACK_ORDER_CREATED, outbox.EMAIL_ORDER_CONFIRMATION},
+        )
+
+    @mock.patch('orders.notifications.notify_order_created')
+    def test_deliver_marks_event_delivered(self, send_slack):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'))
+        event = outbox.enqueue(outbox.SLACK_ORDER_CREATED, order)
+        self.assertTrue(outbox.deliver(event))
+        send_slack.assert_called_once_with(order)
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'delivered')
+        self.assertIsNotNone(event.delivered_at)
+
+    @override_settings(STRIPE_SECRET_KEY='')
+    def test_events_are_written_with_the_order(self):
+        with mock.patch('orders.outbox.enqueue_order_created', side_effect=RuntimeError('outbox down')):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json')
+        # Neither the order nor its events were committed
+        self.assertFalse(Order.objects.exists())
+        response = self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OutboxEvent.objects.filter(order_id=response.data['id']).count(), 2)
+
+    @mock.patch('orders.emails.send_confirmation_emails')
+    @mock.patch('orders.notifications.notify_order_created')
+    @mock.patch('stripe.PaymentIntent.create', side_effect=stripe.error.APIConnectionError('stripe down'))
+    def test_events_of_order_cancelled_by_stripe_failure_are_skipped(self, create_intent, send_slack, send_email):
+        response = self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        order = Order.objects.get()
+        self.assertEqual(order.status, 'cancelled')
+        with self.settings(EMAIL_HOST_PASSWORD='secret'):
+            self.assertEqual(outbox.deliver_group(outbox.claim_batch(50)), 2)
+        send_slack.assert_not_called()
+        send_email.assert_called_once_with([])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    @mock.patch('orders.notifications.notify_order_created', side_effect=RuntimeError('slack down'))
+    def test_failed_delivery_backs_off_then_gives_up(self, send_slack):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'))
+        event = outbox.enqueue(outbox.SLACK_ORDER_CREATED, order)
+        with self.assertLogs('orders.outbox', 'WARNING') as logs:
+            self.assertFalse(outbox.deliver(event))
+        self.assertIn('retrying', logs.output[0])
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertGreater(event.available_at, timezone.now())
+        self.assertEqual(outbox.claim_batch(10), [])
+        with self.assertLogs('orders.outbox', 'ERROR'):
+            outbox.deliver(event)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('failed', 2))
+        self.assertIn('slack down', event.last_error)
+
+
+class StubSlackHandler(BaseHTTPRequestHandler):
+    """Records posted messages; replies with the server's queued (status, headers) responses."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.client_address[1], json.loads(body)))
+        status_code, headers = self.server.responses.pop(0) if self.server.responses else (200, {})
+        payload = b'ok'
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SlackClientTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubSlackHandler)
+        self.server.received = []
+        self.server.responses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = SlackClient(
+            webhook_url=f'http://127.0.0.1:{self.server.server_port}/hook',
+            timeout=2, sleep=lambda seconds: None,
+        )
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.orders = [Order.objects.create(user=user, total_amount=Decimal('10.00')) for _ in range(3)]
+
+    def test_reuses_one_connection(self):
+        for order in self.orders:
+            self.client.post(notifications.order_created_message(order))
+        self.assertEqual(len(self.server.received), 3)
+        self.assertEqual(len({port for port, _message in self.server.received}), 1)
+
+    def test_retries_rate_limited_and_server_errors(self):
+        self.server.responses = [(429, {'Retry-After': '1'}), (503, {})]
+        self.client.post(notifications.order_created_message(self.orders[0]))
+        self.assertEqual(len(self.server.received), 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.responses = [(429, {'Retry-After': '1'})] * 10
+        with self.assertRaises(SlackError):
+            self.client.post(notifications.order_created_message(self.orders[0]))
+        self.assertEqual(len(self.server.received), self.client.max_retries + 1)
+
+    def test_digest_batches_orders_over_threshold(self):
+        now = [0.0]
+        digest = SlackDigest(self.client, interval=60, threshold=1, clock=lambda: now[0])
+        for order in self.orders:
+            digest.submit('order_created', order, notifications.order_created_message(order))
+        self.assertEqual(len(self.server.received), 1)
+        now[0] = 61.0
+        digest.flush_due()
+        self.assertEqual(len(self.server.received), 2)
+        summary = self.server.received[-1][1]
+        self.assertEqual(summary['text'], ':shopping_cart: *2 new orders*')
+        self.assertIn(f'#{self.orders[2].id}', summary['blocks'][1]['text']['text'])
+
+
+class ClientSecretTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+
+    @mock.patch('stripe.PaymentIntent.retrieve')
+    def test_list_makes_no_stripe_calls(self, retrieve):
+        for i in range(5):
+            Order.objects.create(
+                user=self.user, total_amount=Decimal('10.00'),
+                stripe_payment_intent_id=f'pi_{i}', stripe_client_secret=f'pi_{i}_secret',
+            )
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        retrieve.assert_not_called()
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(order['client_secret'] is None for order in results))
+
+    @override_settings(STRIPE_SECRET_KEY='sk_test_dummy')
+    @mock.patch('stripe.PaymentIntent.retrieve')
+    @mock.patch('stripe.PaymentIntent.create')
+    def test_create_returns_captured_secret(self, create_intent, retrieve):
+        create_intent.return_value = mock.Mock(id='pi_new', client_secret='pi_new_secret')
+        CartItem.objects.create(user=self.user, product=make_product(), quantity=1)
+        response = self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['client_secret'], 'pi_new_secret')
+        retrieve.assert_not_called()
+
+
+TESTDATA = Path(__file__).resolve().parent / 'testdata'
+WEBHOOK_SECRET = 'whsec_test_secret'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(APITestCase):
+    url = '/api/stripe/webhook/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.product = make_product(inventory_count=5)
+        self.order = Order.objects.create(
+            user=self.user, total_amount=Decimal('20.00'),
+            stripe_payment_intent_id='pi_3PqLxBGs0TvWq5Yk1Xn0b8Qz',
+        )
+        InventoryHold.objects.create(
+            order=self.order, product=self.product, quantity=2,
+            expires_at=timezone.now() + timedelta(minutes=15),
+        )
+
+    def replay(self, name, secret=WEBHOOK_SECRET, order_id=None):
+        payload = (TESTDATA / 'stripe' / f'{name}.json').read_text()
+        if order_id is not None:
+            payload = payload.replace('"order_id": "1"', f'"order_id": "{order_id}"')
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.generic(
+            'POST', self.url, payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}',
+        )
+
+    def process_outbox(self):
+        for event in outbox.claim_batch(50):
+            outbox.deliver(event)
+
+    def test_succeeded_event_marks_order_paid(self):
+        response = self.replay('payment_intent.succeeded')
+        self.assertEqual(response.status_code, 200)
+        # Nothing changes until the worker processes the queued event
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+        with mock.patch('orders.notifications.notify_payment_confirmed'):
+            self.process_outbox()
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.order.status, 'processing')
+        self.assertEqual(self.product.inventory_count, 3)
+        self.assertTrue(OutboxEvent.objects.filter(order=self.order, event_type=outbox.SLACK_PAYMENT_CONFIRMED).exists())
+
+    def test_event_before_payment_intent_is_saved_uses_metadata(self):
+        Order.objects.filter(id=self.order.id).update(stripe_payment_intent_id=None)
+        self.replay('payment_intent.succeeded', order_id=self.order.id)
+        with mock.patch('orders.notifications.notify_payment_confirmed'):
+            self.process_outbox()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'processing')
+
+    def test_event_for_uncommitted_order_is_retried(self):
+        Order.objects.filter(id=self.order.id).update(stripe_payment_intent_id=None)
+        self.replay('payment_intent.succeeded', order_id=999999)
+        with self.assertLogs('orders.outbox', 'WARNING'):
+            self.process_outbox()
+        event = OutboxEvent.objects.get(event_type=payments.STRIPE_EVENT)
+        self.assertEqual(event.status, 'pending')
+        self.assertIn('OrderNotReady', event.last_error)
+
+    def test_redelivered_event_is_ignored(self):
+        self.replay('payment_intent.succeeded')
+        self.assertEqual(self.replay('payment_intent.succeeded').status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        self.assertEqual(OutboxEvent.objects.filter(event_type=payments.STRIPE_EVENT).count(), 1)
+
+    def test_canceled_event_releases_stock(self):
+        self.replay('payment_intent.canceled')
+        self.process_outbox()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertEqual(InventoryHold.objects.get(order=self.order).status, 'released')
+
+    def test_bad_signature_is_rejected(self):
+        response = self.replay('payment_intent.succeeded', secret='whsec_wrong')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    @mock.patch('stripe.PaymentIntent.retrieve')
+    def test_confirm_payment_does_not_call_stripe(self, retrieve):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(f'/api/orders/{self.order.id}/confirm_payment/')
+        self.assertEqual(response.status_code, 202)
+        retrieve.assert_not_called()
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        self.product = make_product()
+
+    def test_replayed_order_creation_returns_stored_response(self):
+        CartItem.objects.create(user=self.user, product=self.product, quantity=1)
+        first = self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, 201)
+        # Cart is empty now: a re-executed view would fail with "Cart is empty."
+        second = self.client.post('/api/orders/', {'shipping_address': '1 Main St'}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        self.client.post('/api/cart/', {'product_id': self.product.id, 'quantity': 1}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        response = self.client.post('/api/cart/', {'product_id': self.product.id, 'quantity': 2}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(response.status_code, 422)
+
+    def test_replayed_cart_add_does_not_increment_twice(self):
+        for _ in range(3):
+            self.client.post('/api/cart/', {'product_id': self.product.id, 'quantity': 1}, format='json', HTTP_IDEMPOTENCY_KEY='k2')
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 1)
+
+    def test_expired_keys_are_purged(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key='old', method='POST', path='/api/cart/', fingerprint='x',
+            response_status=201, response_body={}, expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        call_command('purge_idempotency_keys', stdout=mock.MagicMock())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class OrderListQueryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        reviewer = User.objects.create_user(username='reviewer', email='reviewer@example.com', password='secret')
+        products = [make_product(name=f'Product {i}') for i in range(10)]
+        Review.objects.bulk_create([Review(user=reviewer, product=product, rating=4) for product in products])
+        orders = Order.objects.bulk_create([
+            Order(user=self.user, total_amount=Decimal('20.00')) for _ in range(200)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product=products[(i + offset) % 10], quantity=1, unit_price=Decimal('10.00'),
+                product_name=products[(i + offset) % 10].name,
+            )
+            for i, order in enumerate(orders)
+            for offset in range(2)
+        ])
+
+    def test_list_query_count_is_constant(self):
+        # count, orders page, order items
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/orders/', {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 200)
+        first = response.data['results'][0]
+        self.assertEqual(first['items_count'], 2)
+        self.assertEqual(set(first['order_items'][0]['product']), {'id', 'name', 'image_url', 'price'})
+
+    def test_items_render_purchase_time_snapshot(self):
+        item = OrderItem.objects.select_related('product').first()
+        Product.objects.filter(id=item.product_id).update(name='Renamed', price=Decimal('99.00'))
+        response = self.client.get(f'/api/orders/{item.order_id}/')
+        product = response.data['order_items'][0]['product']
+        self.assertEqual(product['name'], item.product.name)
+        self.assertEqual(product['price'], '10.00')
+
+
+class OrderCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'), status='delivered')
+        OrderItem.objects.create(order=self.order, product=make_product(), quantity=1, unit_price=Decimal('10.00'))
+
+    def test_terminal_order_is_served_from_cache(self):
+        first = self.client.get(f'/api/orders/{self.order.id}/')
+        # Only the order lookup; items and count come from the cache
+        with self.assertNumQueries(1):
+            second = self.client.get(f'/api/orders/{self.order.id}/')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(order_cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_status_change_invalidates(self):
+        self.client.get(f'/api/orders/{self.order.id}/')
+        self.order.status = 'cancelled'
+        self.order.save()
+        response = self.client.get(f'/api/orders/{self.order.id}/')
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertEqual(order_cache.stats()['hits'], 0)
+
+    def test_open_orders_are_not_cached(self):
+        Order.objects.filter(id=self.order.id).update(status='shipped')
+        self.client.get(f'/api/orders/{self.order.id}/')
+        self.assertIsNone(cache.get(order_cache.cache_key(self.order.id)))
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        self.product = make_product()
+        old = timezone.now() - timedelta(days=400)
+        self.old_delivered = self.make_order('delivered', old)
+        self.old_pending = self.make_order('pending', old)
+        self.recent_delivered = self.make_order('delivered', timezone.now())
+
+    def make_order(self, status, created_at):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'), status=status)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, unit_price=Decimal('10.00'))
+        Order.objects.filter(id=order.id).update(created_at=created_at)
+        return order
+
+    def test_command_moves_old_terminal_orders(self):
+        paid_at, shipped_at, delivered_at = (timezone.now() - timedelta(days=400 - n) for n in range(3))
+        Order.objects.filter(id=self.old_delivered.id).update(paid_at=paid_at, shipped_at=shipped_at, delivered_at=delivered_at)
+        call_command('archive_orders', months=6, batch_size=1, stdout=mock.MagicMock())
+        self.assertEqual(list(ArchivedOrder.objects.values_list('id', flat=True)), [self.old_delivered.id])
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual(
+            (archived.paid_at, archived.shipped_at, archived.delivered_at, archived.cancelled_at),
+            (paid_at, shipped_at, delivered_at, None),
+        )
+        self.assertFalse(Order.objects.filter(id=self.old_delivered.id).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old_delivered.id).exists())
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_archived_history_is_read_only_when_asked(self):
+        call_command('archive_orders', months=6, stdout=mock.MagicMock())
+        live = self.client.get('/api/orders/').data['results']
+        self.assertNotIn(self.old_delivered.id, [order['id'] for order in live])
+
+        archived = self.client.get('/api/orders/', {'archived': 'true'}).data['results']
+        self.assertEqual([order['id'] for order in archived], [self.old_delivered.id])
+        self.assertEqual(archived[0]['order_items'][0]['product']['name'], self.product.name)
+        self.assertIn('delivered_at', archived[0])
+
+        detail = self.client.get(f'/api/orders/{self.old_delivered.id}/', {'archived': 'true'})
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(detail.data['items_count'], 1)
+        self.assertEqual(self.client.get(f'/api/orders/{self.old_delivered.id}/').status_code, 404)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_HOST_PASSWORD='secret',
+    EMAIL_HOST_USER='orders@example.com',
+)
+class OrderEmailTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        product = make_product(name='Desk Lamp')
+        self.orders = []
+        for _ in range(5):
+            order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'))
+            OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=Decimal('10.00'))
+            outbox.enqueue(outbox.EMAIL_ORDER_CONFIRMATION, order)
+            self.orders.append(order)
+
+    def test_batch_shares_one_connection(self):
+        with mock.patch('orders.emails.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(outbox.deliver_group(outbox.claim_batch(50)), 5)
+        connect.assert_called_once()
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('Desk Lamp', mail.outbox[0].alternatives[0][0])
+        self.assertEqual(OutboxEvent.objects.filter(status='delivered').count(), 5)
+
+    def test_failed_message_is_retried_alone(self):
+        failing_id = self.orders[2].id
+        original = emails.build_confirmation_message
+
+        def build(order, connection=None):
+            if order.id == failing_id:
+                raise ConnectionError('smtp dropped')
+            return original(order, connection=connection)
+
+        with mock.patch('orders.emails.build_confirmation_message', side_effect=build), \
+                self.assertLogs('orders.outbox', 'WARNING'), self.assertLogs('orders.emails', 'ERROR') as logs:
+            self.assertEqual(outbox.deliver_group(outbox.claim_batch(50)), 4)
+        self.assertIn(f'Failed to send order email for order {failing_id}', logs.output[0])
+        self.assertIn('smtp dropped', logs.output[0])
+        failed = OutboxEvent.objects.exclude(status='delivered').get()
+        self.assertEqual(failed.order_id, failing_id)
+        self.assertIn('smtp dropped', failed.last_error)
+
+
+class OrderTransitionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        self.product = make_product()
+
+    def make_order(self, status='pending'):
+        return Order.objects.create(user=self.user, total_amount=Decimal('10.00'), status=status)
+
+    def test_transition_records_timestamp(self):
+        order = self.make_order()
+        order.transition_to('processing')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'processing')
+        self.assertIsNotNone(order.paid_at)
+        with self.assertRaises(InvalidTransition):
+            order.transition_to('delivered')
+
+    def test_api_rejects_invalid_status_change(self):
+        order = self.make_order('delivered')
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(f'/api/orders/{order.id}/', {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+
+    def test_customer_cannot_mark_order_paid_or_shipped(self):
+        self.client.force_authenticate(self.user)
+        for status, target in [('pending', 'processing'), ('processing', 'shipped'), ('shipped', 'delivered')]:
+            order = self.make_order(status)
+            response = self.client.patch(f'/api/orders/{order.id}/', {'status': target}, format='json')
+            self.assertEqual(response.status_code, 400)
+            order.refresh_from_db()
+            self.assertEqual(order.status, status)
+            self.assertIsNone(order.paid_at)
+
+    def test_customer_can_cancel_pending_order(self):
+        order = self.make_order()
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(f'/api/orders/{order.id}/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertIsNotNone(order.cancelled_at)
+
+    def test_bulk_transition_checks_status_in_sql(self):
+        processing = [self.make_order('processing') for _ in range(3)]
+        pending = self.make_order('pending')
+        ids = [order.id for order in processing] + [pending.id, 999999]
+        with self.assertNumQueries(2):
+            updated, skipped = Order.objects.bulk_transition(ids, 'shipped', chunk_size=3)
+        self.assertEqual((updated, skipped), (3, 2))
+        self.assertEqual(Order.objects.filter(status='shipped', shipped_at__isnull=False).count(), 3)
+        self.assertEqual(Order.objects.get(id=pending.id).status, 'pending')
+
+    def test_bulk_cancel_releases_holds(self):
+        order = self.make_order()
+        InventoryHold.objects.create(order=order, product=self.product, quantity=2, expires_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(Order.objects.bulk_transition([order.id], 'cancelled'), (1, 0))
+        self.assertEqual(InventoryHold.objects.get(order=order).status, 'released')
+
+    def test_bulk_transition_from_shipping_csv(self):
+        shipped = [self.make_order('shipped') for _ in range(2)]
+        csv_file = SimpleUploadedFile(
+            'shipments.csv',
+            ('order_id,carrier\n' + ''.join(f'{order.id},ups\n' for order in shipped)).encode(),
+            content_type='text/csv'
+        )
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post('/api/orders/bulk-transition/', {'status': 'delivered'}).status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.post('/api/orders/bulk-transition/', {'status': 'delivered', 'file': csv_file}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(Order.objects.filter(status='delivered').count(), 2)
+
+        response = self.client.post('/api/orders/bulk-transition/', {'status': 'processing', 'order_ids': [shipped[0].id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(SALES_ROLLUP_SETTLE_SECONDS=0)
+class SalesRollupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        self.lamp = make_product(name='Desk Lamp', price=Decimal('20.00'))
+        self.mug = make_product(name='Mug', price=Decimal('5.00'))
+        self.yesterday = timezone.now() - timedelta(days=1)
+
+    def make_order(self, status, lines, created_at=None):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('0.00'), status=status)
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=product.price)
+        if created_at:
+            OrderItem.objects.filter(order=order).update(created_at=created_at)
+        return order
+
+    def test_refresh_rolls_up_paid_orders_by_day(self):
+        self.make_order('processing', [(self.lamp, 2), (self.mug, 1)], self.yesterday)
+        self.make_order('delivered', [(self.mug, 3)])
+        self.make_order('pending', [(self.lamp, 5)])
+        analytics.refresh_sales_rollups()
+
+        yesterday = DailySales.objects.get(date=timezone.localdate(self.yesterday))
+        self.assertEqual((yesterday.revenue, yesterday.units, yesterday.orders), (Decimal('45.00'), 3, 1))
+        today = DailySales.objects.get(date=timezone.localdate())
+        self.assertEqual((today.revenue, today.units, today.orders), (Decimal('15.00'), 3, 1))
+        self.assertEqual(DailyProductSales.objects.get(date=today.date, product_id=self.mug.id).units, 3)
+        self.assertFalse(DailyProductSales.objects.filter(product_id=self.lamp.id, date=today.date).exists())
+
+    def test_incremental_refresh_recomputes_touched_days_only(self):
+        old = self.make_order('processing', [(self.lamp, 1)], self.yesterday)
+        analytics.refresh_sales_rollups()
+        # A stale row for an untouched day survives an incremental refresh
+        DailySales.objects.create(date=timezone.localdate() - timedelta(days=10), revenue=Decimal('1.00'))
+
+        pending = self.make_order('pending', [(self.mug, 2)])
+        analytics.refresh_sales_rollups()
+        self.assertFalse(DailySales.objects.filter(date=timezone.localdate()).exists())
+
+        pending.transition_to('processing')
+        old.transition_to('cancelled')
+        self.assertEqual(analytics.refresh_sales_rollups(), 2)
+        self.assertEqual(DailySales.objects.get(date=timezone.localdate()).revenue, Decimal('10.00'))
+        self.assertFalse(DailySales.objects.filter(date=timezone.localdate(self.yesterday)).exists())
+        self.assertEqual(DailySales.objects.count(), 2)
+
+        call_command('refresh_sales_rollups', rebuild=True, stdout=mock.MagicMock())
+        self.assertEqual(DailySales.objects.count(), 1)
+
+    def test_report_reads_rollups(self):
+        self.make_order('processing', [(self.lamp, 2), (self.mug, 1)], self.yesterday)
+        self.make_order('shipped', [(self.mug, 4)])
+        analytics.refresh_sales_rollups()
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/analytics/sales/').status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/analytics/sales/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals'], {'revenue': Decimal('65.00'), 'units': 7, 'orders': 2})
+        self.assertEqual(len(response.data['days']), 2)
+        self.assertEqual(response.data['top_products'][0]['product_name'], 'Desk Lamp')
+
+        response = self.client.get('/api/analytics/sales/', {'product': self.mug.id, 'start': timezone.localdate().isoformat()})
+        self.assertEqual(response.data['totals']['units'], 4)
+        self.assertEqual(self.client.get('/api/analytics/sales/', {'start': '2030-01-02', 'end': '2030-01-01'}).status_code, 400)
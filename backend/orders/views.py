@@ -1,30 +1,106 @@
 from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.db import transaction
+from django.db.models import Count, prefetch_related_objects
 import stripe
-import requests
-import json
-from .models import Order
-from .serializers import OrderSerializer, OrderDetailSerializer
+from ecommerce.throttling import CheckoutThrottle
+from store.authentication import ClaimsJWTAuthentication
+from . import cache as order_cache
+from .idempotency import idempotent
+from .inventory import release_holds
+from .models import Order, ArchivedOrder, StripeEvent
+from .payments import (
+    HANDLED_EVENT_TYPES, create_payment_intent, enqueue_stripe_event, mark_order_paid, retrieve_payment_intent
+)
+from .analytics import sales_report
+from .fulfillment import bulk_transition
+from .serializers import OrderSerializer, OrderDetailSerializer, ArchivedOrderSerializer, BulkTransitionSerializer, SalesReportQuerySerializer
 
 # Configure Stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+class OrderPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderPagination
+    
+    @property
+    def archived(self):
+        """True when the client asked for archived order history (``?archived=true``)"""
+        return (
+            self.action in ['list', 'retrieve']
+            and self.request.query_params.get('archived', '').lower() in ['1', 'true', 'yes']
+        )
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        if self.archived:
+            return ArchivedOrder.objects.filter(user_id=self.request.user.id).prefetch_related('order_items')
+        queryset = Order.objects.filter(user_id=self.request.user.id)
+        if self.action == 'list':
+            # Items render from their purchase-time snapshot, so products are never loaded
+            queryset = (
+                queryset.annotate(order_items_count=Count('order_items'))
+                .prefetch_related('order_items')
+                .order_by('-created_at')
+            )
+        return queryset
+    
+    def get_throttles(self):
+        # Checkout creates Stripe PaymentIntents; browsing is not limited
+        if self.action == 'create':
+            return [CheckoutThrottle()]
+        return super().get_throttles()
     
     def get_serializer_class(self):
+        if self.archived:
+            return ArchivedOrderSerializer
         if self.action == 'retrieve':
             return OrderDetailSerializer
         return OrderSerializer
     
+    def retrieve(self, request, *args, **kwargs):
+        if self.archived:
+            return super().retrieve(request, *args, **kwargs)
+        order = self.get_object()
+        cacheable = order_cache.is_cacheable(order)
+        if cacheable:
+            data = order_cache.get_cached(order)
+            if data is not None:
+                return Response(data)
+        
+        prefetch_related_objects([order], 'order_items')
+        data = self.get_serializer(order).data
+        if cacheable:
+            order_cache.set_cached(order, dict(data))
+        return Response(data)
+    
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """Hit rate of the delivered/cancelled order cache"""
+        return Response(order_cache.stats())
+    
+    @action(detail=False, methods=['post'], url_path='bulk-transition', permission_classes=[permissions.IsAdminUser])
+    def bulk_transition(self, request):
+        """Move many orders to a new status from a list of ids or a shipping CSV"""
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated, skipped = bulk_transition(serializer.validated_data['order_ids'], serializer.validated_data['status'])
+        return Response({'status': serializer.validated_data['status'], 'updated': updated, 'skipped': skipped})
+    
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         order = serializer.save()
         
@@ -37,19 +113,11 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         # Create Stripe payment intent
         try:
-            payment_intent = stripe.PaymentIntent.create(
-                amount=int(order.total_amount * 100),  # Convert to cents
-                currency='usd',
-                metadata={'order_id': order.id}
-            )
+            payment_intent = create_payment_intent(order)
             order.stripe_payment_intent_id = payment_intent.id
-            order.save()
-            
-            # Send Slack notification
-            self.send_slack_notification(order)
-            
-            # Send order confirmation email
-            self.send_order_email(order)
+            order.stripe_client_secret = payment_intent.client_secret
+            # Only these fields: a fast webhook may already have marked the order paid
+            order.save(update_fields=['stripe_payment_intent_id', 'stripe_client_secret', 'updated_at'])
             
         except stripe.error.AuthenticationError as e:
             # Handle invalid API key
@@ -59,8 +127,8 @@ class OrderViewSet(viewsets.ModelViewSet):
             # Don't raise error for development
         except stripe.error.StripeError as e:
             # Handle other Stripe errors
-            order.status = 'cancelled'
-            order.save()
+            order.transition_to('cancelled')
+            release_holds(order)
             raise serializers.ValidationError(f"Payment processing failed: {str(e)}")
         except Exception as e:
             # Handle other errors
@@ -69,216 +137,29 @@ class OrderViewSet(viewsets.ModelViewSet):
             print(f"Order creation error: {e}")
             # Don't raise error for development
     
-    def send_slack_notification(self, order):
-        """Send notification to Slack when a new order is created"""
-        # Check if webhook URL is configured (easier method)
-        if settings.SLACK_WEBHOOK_URL:
-            self.send_webhook_notification(order)
-            return
-        
-        # Fall back to bot token method
-        if not settings.SLACK_BOT_TOKEN:
-            return
-        
-        # Use channel name if provided, otherwise fall back to channel ID
-        channel = getattr(settings, 'SLACK_CHANNEL_NAME', 'pactle-shopping')
-        if hasattr(settings, 'SLACK_CHANNEL_ID') and settings.SLACK_CHANNEL_ID:
-            channel = settings.SLACK_CHANNEL_ID
-        
-        # Create a more detailed notification message
-        message = {
-            "channel": channel,
-            "text": f":shopping_cart: *New Order Created!*",
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "🛒 New Order Received",
-                        "emoji": True
-                    }
-                },
-                {
-                    "type": "section",
-                    "fields": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Order ID:*\n#{order.id}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Customer:*\n{order.user.username}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Total Amount:*\n${order.total_amount}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Items:*\n{order.items_count} items"
-                        }
-                    ]
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"*Shipping Address:*\n{order.shipping_address}"
-                    }
-                },
-                {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"Order created at {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        headers = {
-            'Authorization': f'Bearer {settings.SLACK_BOT_TOKEN}',
-            'Content-Type': 'application/json'
-        }
-        
-        try:
-            response = requests.post(
-                'https://slack.com/api/chat.postMessage',
-                headers=headers,
-                data=json.dumps(message)
-            )
-            response.raise_for_status()
-            
-            # Check if the API call was successful
-            response_data = response.json()
-            if not response_data.get('ok'):
-                print(f"Slack API error: {response_data.get('error', 'Unknown error')}")
-            else:
-                print(f"Slack notification sent successfully for order {order.id}")
-                
-        except requests.RequestException as e:
-            # Log error but don't fail the order creation
-            print(f"Failed to send Slack notification: {e}")
-        except Exception as e:
-            # Log any other errors
-            print(f"Unexpected error sending Slack notification: {e}")
-    
-    def send_webhook_notification(self, order):
-        """Send notification using webhook URL (easier setup)"""
-        # Create a more detailed notification message
-        message = {
-            "text": f":shopping_cart: *New Order Created!*",
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "🛒 New Order Received",
-                        "emoji": True
-                    }
-                },
-                {
-                    "type": "section",
-                    "fields": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Order ID:*\n#{order.id}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Customer:*\n{order.user.username}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Total Amount:*\n${order.total_amount}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Items:*\n{order.items_count} items"
-                        }
-                    ]
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"*Shipping Address:*\n{order.shipping_address}"
-                    }
-                },
-                {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"Order created at {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        
-        try:
-            response = requests.post(
-                settings.SLACK_WEBHOOK_URL,
-                headers=headers,
-                data=json.dumps(message)
-            )
-            response.raise_for_status()
-            print(f"Webhook notification sent successfully for order {order.id}")
-                
-        except requests.RequestException as e:
-            # Log error but don't fail the order creation
-            print(f"Failed to send webhook notification: {e}")
-        except Exception as e:
-            # Log any other errors
-            print(f"Unexpected error sending webhook notification: {e}")
-    
-    def send_order_email(self, order):
-        """Send order confirmation email"""
-        if not settings.EMAIL_HOST_PASSWORD:
-            return
-        
-        subject = f'Order Confirmation - Order #{order.id}'
-        html_message = render_to_string('orders/order_confirmation_email.html', {
-            'order': order,
-            'user': order.user
-        })
-        
-        try:
-            send_mail(
-                subject=subject,
-                message=f'Thank you for your order #{order.id}. Total: ${order.total_amount}',
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[order.user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-        except Exception as e:
-            # Log error but don't fail the order creation
-            print(f"Failed to send order email: {e}")
-    
     @action(detail=True, methods=['post'])
     def confirm_payment(self, request, pk=None):
-        """Confirm payment with Stripe webhook"""
+        """Report payment status; the Stripe webhook moves the order to processing"""
         order = self.get_object()
         
+        if order.status in ('processing', 'shipped', 'delivered'):
+            return Response({'status': 'Payment confirmed'})
+        if order.status == 'cancelled':
+            return Response(
+                {'error': 'Order was cancelled'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if settings.STRIPE_WEBHOOK_SECRET:
+            # The payment_intent.succeeded webhook will update the order
+            return Response({'status': 'Payment pending'}, status=status.HTTP_202_ACCEPTED)
+        
+        # Without a webhook endpoint, verify the payment intent with Stripe directly
         try:
-            # Verify payment intent with Stripe
-            payment_intent = stripe.PaymentIntent.retrieve(order.stripe_payment_intent_id)
+            payment_intent = retrieve_payment_intent(order.stripe_payment_intent_id)
             
             if payment_intent.status == 'succeeded':
-                order.status = 'processing'
-                order.save()
-                
-                # Send Slack notification for payment confirmation
-                self.send_payment_confirmation_notification(order)
-                
+                mark_order_paid(order)
                 return Response({'status': 'Payment confirmed'})
             else:
                 return Response(
@@ -290,159 +171,47 @@ class OrderViewSet(viewsets.ModelViewSet):
                 {'error': str(e)}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+class StripeWebhookView(APIView):
+    """Receive signed Stripe events and queue them for the outbox worker"""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
     
-    def send_payment_confirmation_notification(self, order):
-        """Send notification to Slack when payment is confirmed"""
-        # Check if webhook URL is configured (easier method)
-        if settings.SLACK_WEBHOOK_URL:
-            self.send_payment_confirmation_webhook(order)
-            return
-        
-        # Fall back to bot token method
-        if not settings.SLACK_BOT_TOKEN:
-            return
-        
-        # Use channel name if provided, otherwise fall back to channel ID
-        channel = getattr(settings, 'SLACK_CHANNEL_NAME', 'pactle-shopping')
-        if hasattr(settings, 'SLACK_CHANNEL_ID') and settings.SLACK_CHANNEL_ID:
-            channel = settings.SLACK_CHANNEL_ID
-        
-        # Create a payment confirmation notification message
-        message = {
-            "channel": channel,
-            "text": f":white_check_mark: *Payment Confirmed!*",
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "✅ Payment Confirmed",
-                        "emoji": True
-                    }
-                },
-                {
-                    "type": "section",
-                    "fields": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Order ID:*\n#{order.id}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Customer:*\n{order.user.username}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Amount Paid:*\n${order.total_amount}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Status:*\nProcessing"
-                        }
-                    ]
-                },
-                {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"Payment confirmed at {order.updated_at.strftime('%Y-%m-%d %H:%M:%S')}"
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        headers = {
-            'Authorization': f'Bearer {settings.SLACK_BOT_TOKEN}',
-            'Content-Type': 'application/json'
-        }
-        
-        try:
-            response = requests.post(
-                'https://slack.com/api/chat.postMessage',
-                headers=headers,
-                data=json.dumps(message)
+    def post(self, request):
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            return Response(
+                {'error': 'Stripe webhooks are not configured'}, 
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
-            response.raise_for_status()
-            
-            # Check if the API call was successful
-            response_data = response.json()
-            if not response_data.get('ok'):
-                print(f"Slack API error: {response_data.get('error', 'Unknown error')}")
-            else:
-                print(f"Payment confirmation Slack notification sent successfully for order {order.id}")
-                
-        except requests.RequestException as e:
-            # Log error but don't fail the payment confirmation
-            print(f"Failed to send payment confirmation Slack notification: {e}")
-        except Exception as e:
-            # Log any other errors
-            print(f"Unexpected error sending payment confirmation Slack notification: {e}")
-    
-    def send_payment_confirmation_webhook(self, order):
-        """Send payment confirmation using webhook URL"""
-        # Create a payment confirmation notification message
-        message = {
-            "text": f":white_check_mark: *Payment Confirmed!*",
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "✅ Payment Confirmed",
-                        "emoji": True
-                    }
-                },
-                {
-                    "type": "section",
-                    "fields": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Order ID:*\n#{order.id}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Customer:*\n{order.user.username}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Amount Paid:*\n${order.total_amount}"
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": f"*Status:*\nProcessing"
-                        }
-                    ]
-                },
-                {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "type": "mrkdwn",
-                            "text": f"Payment confirmed at {order.updated_at.strftime('%Y-%m-%d %H:%M:%S')}"
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        headers = {
-            'Content-Type': 'application/json'
-        }
         
         try:
-            response = requests.post(
-                settings.SLACK_WEBHOOK_URL,
-                headers=headers,
-                data=json.dumps(message)
+            event = stripe.Webhook.construct_event(
+                request.body,
+                request.META.get('HTTP_STRIPE_SIGNATURE', ''),
+                settings.STRIPE_WEBHOOK_SECRET
             )
-            response.raise_for_status()
-            print(f"Payment confirmation webhook notification sent successfully for order {order.id}")
-                
-        except requests.RequestException as e:
-            # Log error but don't fail the payment confirmation
-            print(f"Failed to send payment confirmation webhook notification: {e}")
-        except Exception as e:
-            # Log any other errors
-            print(f"Unexpected error sending payment confirmation webhook notification: {e}")
+        except ValueError:
+            return Response({'error': 'Invalid payload'}, status=status.HTTP_400_BAD_REQUEST)
+        except stripe.error.SignatureVerificationError:
+            return Response({'error': 'Invalid signature'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            # Stripe delivers at least once; only the first delivery is queued
+            _, created = StripeEvent.objects.get_or_create(
+                event_id=event['id'],
+                defaults={'event_type': event['type']}
+            )
+            if created and event['type'] in HANDLED_EVENT_TYPES:
+                enqueue_stripe_event(event)
+        
+        return Response({'received': True})
+
+class SalesReportView(APIView):
+    """Revenue, units and orders for a date range, read from the daily rollups"""
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        query = SalesReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return Response(sales_report(params['start'], params['end'], product_id=params.get('product'), top=params['top']))
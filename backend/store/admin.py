@@ -5,21 +5,35 @@ from .models import Product, CartItem, Review
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'price', 'inventory_count', 'is_in_stock', 'average_rating', 'review_count', 'created_at']
     list_filter = ['created_at', 'inventory_count']
-    search_fields = ['name', 'description']
+    search_fields = ['name__ilike', 'description__ilike']
     readonly_fields = ['average_rating', 'review_count']
     ordering = ['-created_at']
+    
+    def get_queryset(self, request):
+        # One aggregate query for the whole changelist page instead of two per row
+        return super().get_queryset(request).with_ratings()
+    
+    @admin.display(description='Average rating', ordering='rating_average')
+    def average_rating(self, obj):
+        return round(obj.average_rating, 2)
+    
+    @admin.display(description='Reviews', ordering='rating_count')
+    def review_count(self, obj):
+        return obj.review_count
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'quantity', 'total_price', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['user__username', 'product__name']
+    search_fields = ['user__username__ilike', 'product__name__ilike']
     ordering = ['-created_at']
+    list_select_related = ['user', 'product']
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'rating', 'title', 'created_at']
     list_filter = ['rating', 'created_at']
-    search_fields = ['user__username', 'product__name', 'title', 'comment']
+    search_fields = ['user__username__ilike', 'product__name__ilike', 'title__ilike', 'comment__ilike']
     readonly_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
+    list_select_related = ['user', 'product']
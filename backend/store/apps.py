@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "store"
+
+    def ready(self):
+        # Register the ilike lookup used by admin and API search
+        from . import search  # noqa: F401
+        # Connect the token revocation signals
+        from . import authentication  # noqa: F401
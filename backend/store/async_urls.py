@@ -0,0 +1,13 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('register/', async_views.register, name='async-register'),
+    path('token/', async_views.token, name='async-token-obtain-pair'),
+    path('products/', async_views.product_list, name='async-product-list'),
+    path('products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('products/<int:pk>/reviews/', async_views.product_reviews, name='async-product-reviews'),
+    path('reviews/product_reviews/', async_views.reviews_by_product, name='async-product-reviews-by-id'),
+    path('reviews/my_reviews/', async_views.my_reviews, name='async-my-reviews'),
+    path('cart/', async_views.cart, name='async-cart'),
+]
@@ -0,0 +1,199 @@
+"""
+Async endpoints for ASGI deployments.
+
+These serve the read paths of ``ProductViewSet``, ``ReviewViewSet`` and
+``CartItemViewSet``, registration and login as native async Django views,
+mounted under ``/api/async/``; the DRF endpoints stay in place for WSGI. They do not copy
+the DRF behaviour, they run it: query parameters go through the viewsets' own
+filter backends and paginator, tokens through their authenticator, and errors
+through DRF's exception handler, so both return the same JSON.
+
+Querysets are read with the async ORM and fully prefetched before
+serialization, since touching the ORM lazily from async code raises
+``SynchronousOnlyOperation``. The paginator and authenticator are synchronous
+and run in a worker thread.
+
+Registration and login await password hashing on the ``store.hashing``
+process pool, so a signup or login spike does not hold a thread per request:
+the worker keeps serving other requests while the hashes run.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, Throttled
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from ecommerce.renderers import ORJSONRenderer
+from ecommerce.throttling import LoginThrottle, RegisterThrottle
+
+from . import hashing
+from .authentication import ClaimsTokenObtainPairSerializer
+from .models import Product, CartItem, Review
+from .serializers import CartItemSerializer, ReviewSerializer
+from .views import CartItemViewSet, ProductViewSet, new_user, registration_data, save_new_user
+
+
+def json_response(data, status=200):
+    # The same bytes the DRF endpoints return
+    return HttpResponse(ORJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def exception_response(exc, request, view=None):
+    """The response DRF's exception handler gives ``exc``, headers included."""
+    response = api_settings.EXCEPTION_HANDLER(exc, {'request': request, 'view': view, 'args': (), 'kwargs': {}})
+    if response is None:
+        raise exc
+    rendered = json_response(response.data, status=response.status_code)
+    for header, value in response.items():
+        if header != 'Content-Type':
+            rendered[header] = value
+    return rendered
+
+
+def api_view(view):
+    """Answer ``APIException`` and ``Http404`` raised by an async view the way DRF does."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except (APIException, Http404) as exc:
+            return exception_response(exc, request)
+    return wrapper
+
+
+def reviews_queryset():
+    return Review.objects.select_related('user')
+
+
+def viewset(cls, request, action, **kwargs):
+    """An instance of ``cls`` set up as DRF's router would for ``action``."""
+    return cls(request=Request(request), action=action, format_kwarg=None, args=(), kwargs=kwargs)
+
+
+async def authenticate(request, view_class=CartItemViewSet):
+    """
+    The ``ClaimsUser`` for the request's bearer token, authenticated by
+    ``view_class``'s authenticators. Raises ``NotAuthenticated`` without a token
+    and the authenticator's error for a bad one, with DRF's ``WWW-Authenticate``.
+    """
+    authenticators = [authenticator() for authenticator in view_class.authentication_classes]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        user = await sync_to_async(lambda: drf_request.user)()
+        if not user.is_authenticated:
+            raise NotAuthenticated
+    except (NotAuthenticated, AuthenticationFailed) as exc:
+        exc.auth_header = authenticators[0].authenticate_header(drf_request)
+        raise
+    return user
+
+
+def post_request(request):
+    """A DRF ``Request`` for a POST view, parsing the body like the DRF endpoints."""
+    if request.method != 'POST':
+        raise MethodNotAllowed(request.method)
+    return Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+
+
+async def throttle(request, throttle_class):
+    """Raise ``Throttled`` like DRF's ``check_throttles`` when ``throttle_class`` rejects the request."""
+    instance = throttle_class()
+    # The shared bucket store talks to the cache
+    if not await sync_to_async(instance.allow_request)(request, None):
+        raise Throttled(instance.wait())
+
+
+@csrf_exempt
+@api_view
+async def register(request):
+    drf_request = post_request(request)
+    await throttle(drf_request, RegisterThrottle)
+    try:
+        user = new_user(drf_request.data)
+        user.password = await hashing.amake_password(drf_request.data.get('password'))
+        detail = await sync_to_async(save_new_user)(user)
+        if detail:
+            return json_response({'detail': detail}, status=400)
+        return json_response(await sync_to_async(registration_data)(user), status=201)
+    except Exception as e:
+        # Errors are answered like RegisterView does
+        return json_response({'detail': str(e)}, status=400)
+
+
+@csrf_exempt
+@api_view
+async def token(request):
+    drf_request = post_request(request)
+    await throttle(drf_request, LoginThrottle)
+    serializer = ClaimsTokenObtainPairSerializer(data=drf_request.data, context={'request': drf_request})
+    attrs = serializer.to_internal_value(drf_request.data)
+    serializer.user = await aauthenticate(drf_request, **serializer.credentials(attrs))
+    try:
+        return json_response(await sync_to_async(serializer.issue_tokens)())
+    except AuthenticationFailed as exc:
+        exc.auth_header = TokenObtainPairView().get_authenticate_header(drf_request)
+        raise
+
+
+@api_view
+async def product_list(request):
+    view = viewset(ProductViewSet, request, 'list')
+    # Filtering only builds the query; counting and fetching the page run it
+    queryset = view.filter_queryset(view.get_queryset())
+    page = await sync_to_async(view.paginate_queryset)(queryset)
+    data = view.get_serializer(page, many=True).data
+    return json_response(view.get_paginated_response(data).data)
+
+
+@api_view
+async def product_detail(request, pk):
+    view = viewset(ProductViewSet, request, 'retrieve', pk=pk)
+    try:
+        product = await view.filter_queryset(view.get_queryset()).aget(pk=pk)
+    except Product.DoesNotExist:
+        raise Http404('No Product matches the given query.')
+    return json_response(view.get_serializer(product).data)
+
+
+@api_view
+async def product_reviews(request, pk):
+    if not await Product.objects.filter(pk=pk).aexists():
+        raise Http404('No Product matches the given query.')
+    reviews = [review async for review in reviews_queryset().filter(product_id=pk)]
+    return json_response(ReviewSerializer(reviews, many=True).data)
+
+
+@api_view
+async def reviews_by_product(request):
+    # Authenticated like the rest of ReviewViewSet
+    await authenticate(request)
+    product_id = request.GET.get('product_id')
+    if not product_id:
+        return json_response({'detail': 'product_id parameter is required'}, status=400)
+    reviews = [review async for review in reviews_queryset().filter(product_id=product_id)]
+    return json_response(ReviewSerializer(reviews, many=True).data)
+
+
+@api_view
+async def my_reviews(request):
+    user = await authenticate(request)
+    reviews = [review async for review in reviews_queryset().filter(user_id=user.id)]
+    return json_response(ReviewSerializer(reviews, many=True).data)
+
+
+@api_view
+async def cart(request):
+    user = await authenticate(request)
+    queryset = (
+        CartItem.objects.filter(user_id=user.id)
+        .prefetch_related(Prefetch('product', queryset=Product.objects.with_ratings()))
+    )
+    items = [item async for item in queryset]
+    return json_response(CartItemSerializer(items, many=True).data)
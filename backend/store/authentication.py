@@ -0,0 +1,177 @@
+"""
+JWT authentication without a user lookup per request.
+
+Access tokens issued by ``ClaimsTokenObtainPairSerializer`` carry the user's
+username, active and staff flags and a token version. ``ClaimsJWTAuthentication``
+rebuilds a ``ClaimsUser`` from those signed claims, so an authenticated request
+does not load the ``User`` row; views that need the full user read
+``request.user.user``, which loads it once.
+
+Revocation works through ``UserTokenVersion``: ``revoke_tokens`` bumps the
+user's version and every token carrying an older one is rejected. Versions are
+cached in process memory for ``TOKEN_VERSION_CACHE_SECONDS``, so a revocation
+reaches every worker within that window. Deactivating a user, changing their
+password, username or staff flags revokes their tokens automatically; upgrading
+the hash of an unchanged password at login does not.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User, update_last_login
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import UserTokenVersion
+
+VERSION_CLAIM = 'ver'
+DEFAULT_VERSION_CACHE_SECONDS = 30
+# Changing any of these on a user revokes their tokens
+REVOKING_FIELDS = ('username', 'password', 'is_active', 'is_staff', 'is_superuser')
+
+
+class ClaimsUser(TokenUser):
+    """The authenticated user as described by their access token."""
+
+    @cached_property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+    @cached_property
+    def user(self):
+        """The full ``User`` row, loaded on first access."""
+        return User.objects.get(pk=self.id)
+
+
+# {user_id: (version, fetched_at)}; per process
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def current_version(user_id, fresh=False):
+    """The user's token version, read from memory when fetched recently unless ``fresh``."""
+    ttl = getattr(settings, 'TOKEN_VERSION_CACHE_SECONDS', DEFAULT_VERSION_CACHE_SECONDS)
+    now = time.monotonic()
+    with _versions_lock:
+        cached = _versions.get(user_id)
+    if not fresh and cached is not None and now - cached[1] < ttl:
+        return cached[0]
+    version = (
+        UserTokenVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+    )
+    with _versions_lock:
+        _versions[user_id] = (version, now)
+    return version
+
+
+def forget_version(user_id=None):
+    """Drop cached versions (all of them without ``user_id``)."""
+    with _versions_lock:
+        if user_id is None:
+            _versions.clear()
+        else:
+            _versions.pop(user_id, None)
+
+
+def revoke_tokens(user_id):
+    """Invalidate every token issued to the user so far."""
+    updated = UserTokenVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    if not updated:
+        UserTokenVersion.objects.get_or_create(user_id=user_id, defaults={'version': 1})
+    forget_version(user_id)
+
+
+def add_claims(token, user):
+    token['username'] = user.username
+    token['is_active'] = user.is_active
+    token['is_staff'] = user.is_staff
+    token['is_superuser'] = user.is_superuser
+    # Read from the database so a token is never issued with an outdated version
+    token[VERSION_CLAIM] = current_version(user.pk, fresh=True)
+    return token
+
+
+def tokens_for_user(user):
+    """A refresh token (and its access token) carrying the claims ``ClaimsUser`` reads."""
+    return add_claims(RefreshToken.for_user(user), user)
+
+
+def check_version(token):
+    if token.get(VERSION_CLAIM, 0) != current_version(token[api_settings.USER_ID_CLAIM]):
+        raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """Authenticate from token claims; the only query is a cached token version lookup."""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        user = ClaimsUser(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        check_version(validated_token)
+        return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+    def credentials(self, attrs):
+        return {self.username_field: attrs[self.username_field], 'password': attrs['password']}
+
+    def validate(self, attrs):
+        # The async login view runs aauthenticate() itself, then issue_tokens()
+        self.user = authenticate(self.context.get('request'), **self.credentials(attrs))
+        return self.issue_tokens()
+
+    def issue_tokens(self):
+        """The token pair for ``self.user``, or AuthenticationFailed when it may not log in."""
+        if not api_settings.USER_AUTHENTICATION_RULE(self.user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        refresh = self.get_token(self.user)
+        data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, self.user)
+        return data
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # A revoked refresh token must not mint new access tokens
+        check_version(self.token_class(attrs['refresh']))
+        return super().validate(attrs)
+
+
+@receiver(pre_save, sender=User)
+def note_revoking_changes(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only; skip the lookup for saves like that
+    if instance.pk is None or (update_fields is not None and not set(update_fields) & set(REVOKING_FIELDS)):
+        return
+    # PooledHashingBackend upgrading the hash of a password that just checked out
+    if getattr(instance, '_password_rehashed', False) and update_fields is not None and set(update_fields) == {'password'}:
+        instance._password_rehashed = False
+        return
+    previous = User.objects.filter(pk=instance.pk).values(*REVOKING_FIELDS).first()
+    instance._revoke_tokens = previous is not None and any(
+        previous[field] != getattr(instance, field) for field in REVOKING_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def revoke_on_change(sender, instance, created, **kwargs):
+    if getattr(instance, '_revoke_tokens', False):
+        instance._revoke_tokens = False
+        revoke_tokens(instance.pk)
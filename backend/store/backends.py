@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hashing
+
+UserModel = get_user_model()
+
+
+class PooledHashingBackend(ModelBackend):
+    """``ModelBackend`` that verifies passwords on the ``store.hashing`` process pool."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            hashing.make_password(password)
+            return None
+        valid, must_update = hashing.check_password(password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = hashing.make_password(password)
+            # Same password under a new hash: tokens already issued stay valid
+            user._password_rehashed = True
+            user.save(update_fields=['password'])
+        return user
+    
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """``authenticate`` for the async login view, awaiting the pool instead of blocking."""
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            await hashing.amake_password(password)
+            return None
+        valid, must_update = await hashing.acheck_password(password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = await hashing.amake_password(password)
+            user._password_rehashed = True
+            await user.asave(update_fields=['password'])
+        return user
@@ -0,0 +1,132 @@
+"""
+Password hashing on a bounded process pool.
+
+PBKDF2 is deliberately slow, and a signup or login spike would otherwise tie
+up request threads for it. ``make_password`` and ``check_password`` run the
+hashers on a pool of ``PASSWORD_HASHING_WORKERS`` processes and wait for the
+result. A semaphore caps the queued jobs at ``PASSWORD_HASHING_MAX_PENDING``,
+so a burst waits for a free slot instead of growing an unbounded backlog.
+Set ``PASSWORD_HASHING_WORKERS = 0`` to hash inline.
+
+The sync functions still hold the calling thread until the hash is done. The
+async ones (``amake_password``, ``acheck_password``), used by the async
+register and login views, await the pool's future instead, so an ASGI worker
+keeps serving other requests meanwhile.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def init_worker():
+    # Spawned workers import settings from DJANGO_SETTINGS_MODULE like the parent did
+    import django
+    django.setup()
+
+
+def verify(raw_password, encoded):
+    # Top-level so the pool can pickle it; the setter cannot cross processes
+    return hashers.check_password(raw_password, encoded)
+
+
+class HashingPool:
+    """A process pool for hasher calls with at most ``max_pending`` jobs queued or running."""
+
+    def __init__(self, workers, max_pending=None):
+        # spawn rather than fork: request threads may hold locks at fork time
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        )
+        self.pending = threading.BoundedSemaphore(max_pending or workers * 8)
+
+    def run(self, func, *args):
+        with self.pending:
+            return self.executor.submit(func, *args).result()
+
+    async def arun(self, func, *args):
+        # Only a full pool parks a thread, to wait for a slot
+        if not self.pending.acquire(blocking=False):
+            await sync_to_async(self.pending.acquire, thread_sensitive=False)()
+        try:
+            return await asyncio.wrap_future(self.executor.submit(func, *args))
+        finally:
+            self.pending.release()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The shared pool, or None when hashing inline."""
+    global _pool
+    workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', DEFAULT_WORKERS)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(workers, getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', None))
+        return _pool
+
+
+def run(func, *args, pool=None):
+    pool = pool or get_pool()
+    if pool is None:
+        return func(*args)
+    return pool.run(func, *args)
+
+
+async def arun(func, *args, pool=None):
+    pool = pool or get_pool()
+    if pool is None:
+        # Inline hashing must still stay off the event loop
+        return await sync_to_async(func, thread_sensitive=False)(*args)
+    return await pool.arun(func, *args)
+
+
+def make_password(raw_password, pool=None):
+    return run(hashers.make_password, raw_password, pool=pool)
+
+
+async def amake_password(raw_password, pool=None):
+    return await arun(hashers.make_password, raw_password, pool=pool)
+
+
+def check_password(raw_password, encoded, pool=None):
+    """
+    Return ``(valid, must_update)``.
+
+    ``must_update`` says the hash uses outdated hasher settings and should be
+    replaced with ``make_password(raw_password)``.
+    """
+    return check_result(encoded, run(verify, raw_password, encoded, pool=pool))
+
+
+async def acheck_password(raw_password, encoded, pool=None):
+    """Async ``check_password``."""
+    return check_result(encoded, await arun(verify, raw_password, encoded, pool=pool))
+
+
+def check_result(encoded, valid):
+    if not valid:
+        return False, False
+    try:
+        must_update = hashers.identify_hasher(encoded).must_update(encoded)
+    except ValueError:
+        must_update = False
+    return True, must_update
+
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+# (label, uvicorn application, uvicorn interface, URL prefix of the endpoint)
+SERVERS = [
+    ('WSGI (DRF views)', 'ecommerce.wsgi:application', 'wsgi', '/api/'),
+    ('ASGI (async views)', 'ecommerce.asgi:application', 'asgi3', '/api/async/'),
+]
+
+class Command(BaseCommand):
+    help = 'Compare throughput of the sync DRF read endpoints under WSGI with the async ones under ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='products/',
+            help='Endpoint below /api/ and /api/async/ to load (default: products/)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=100,
+            help='Concurrent client connections (default: 100)'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Seconds of load per server (default: 10)'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8765,
+            help='Port for the benchmark server (default: 8765)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"GET {options['path']} with {options['concurrency']} connections for {options['duration']}s "
+            f"on one uvicorn worker, against the current database"
+        )
+        results = {}
+        for label, app, interface, prefix in SERVERS:
+            url = f"http://127.0.0.1:{options['port']}{prefix}{options['path']}"
+            server = self.start_server(app, interface, options['port'], url)
+            try:
+                results[label] = asyncio.run(self.load(url, options['concurrency'], options['duration']))
+            finally:
+                server.terminate()
+                server.wait()
+            self.report(label, results[label])
+
+        wsgi, asgi = (results[label]['rps'] for label, *_ in SERVERS)
+        if wsgi:
+            self.stdout.write(self.style.SUCCESS(f'ASGI/WSGI throughput: {asgi / wsgi:.2f}x'))
+
+    def start_server(self, app, interface, port, url):
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', app, '--interface', interface, '--port', str(port),
+             '--workers', '1', '--no-access-log', '--log-level', 'warning'],
+            env=os.environ.copy(),
+        )
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(url, timeout=5)
+                return server
+            except httpx.TransportError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'{app} did not start on port {port}')
+
+    async def load(self, url, concurrency, duration):
+        latencies, errors = [], 0
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            deadline = time.monotonic() + duration
+
+            async def worker():
+                nonlocal errors
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        response = await client.get(url)
+                    except httpx.HTTPError:
+                        errors += 1
+                        continue
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.monotonic()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.monotonic() - started
+        latencies.sort()
+        return {
+            'rps': len(latencies) / elapsed,
+            'requests': len(latencies),
+            'errors': errors,
+            'p50': latencies[len(latencies) // 2] if latencies else 0,
+            'p99': latencies[int(len(latencies) * 0.99)] if latencies else 0,
+            'mean': statistics.fmean(latencies) if latencies else 0,
+        }
+
+    def report(self, label, result):
+        self.stdout.write(
+            f"{label:<20} {result['rps']:8.1f} req/s  p50 {result['p50'] * 1000:7.1f} ms  "
+            f"p99 {result['p99'] * 1000:7.1f} ms  {result['requests']} ok, {result['errors']} errors"
+        )
@@ -0,0 +1,128 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand
+from store.hashing import DEFAULT_WORKERS, HashingPool, acheck_password, check_password
+
+class Command(BaseCommand):
+    help = (
+        'Measure password checks per second on the request threads versus the hashing process pool, '
+        'and how fast an ASGI worker serves other requests during a login burst with sync and async login views'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--logins',
+            type=int,
+            default=40,
+            help='Password checks per run (default: 40)'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Concurrent request threads in the simulated worker (default: 8)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help=f'Hashing pool processes (default: {DEFAULT_WORKERS})'
+        )
+
+    def run(self, label, check, logins, threads):
+        encoded = hashers.make_password('benchmark-password')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as request_threads:
+            results = list(request_threads.map(lambda _: check('benchmark-password', encoded), range(logins)))
+        elapsed = time.perf_counter() - started
+        if not all(valid for valid, _must_update in results):
+            raise RuntimeError('Password check failed during the benchmark')
+        self.stdout.write(f'{label:<24} {logins / elapsed:8.1f} logins/sec  ({elapsed:.2f}s for {logins})')
+        return logins / elapsed
+
+    async def run_asgi(self, label, login, logins):
+        """
+        Run ``logins`` concurrent logins on one event loop while a client sends
+        a cheap request every 20 ms, and report how long those took.
+        """
+        latencies = []
+        burst_over = asyncio.Event()
+
+        async def other_requests():
+            while not burst_over.is_set():
+                started = time.perf_counter()
+                await sync_view(cheap_request)
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.02)
+
+        client = asyncio.create_task(other_requests())
+        started = time.perf_counter()
+        results = await asyncio.gather(*[login() for _ in range(logins)])
+        elapsed = time.perf_counter() - started
+        burst_over.set()
+        await client
+        if not all(results):
+            raise RuntimeError('Password check failed during the benchmark')
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        self.stdout.write(
+            f'{label:<24} {logins / elapsed:8.1f} logins/sec  other requests: '
+            f'p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, {len(latencies)} served'
+        )
+        return statistics.median(latencies)
+
+    def handle(self, *args, **options):
+        logins, threads = options['logins'], options['threads']
+        self.stdout.write(f'Hasher: {hashers.get_hasher().algorithm}, {logins} logins on {threads} threads')
+
+        def inline(raw_password, encoded):
+            return hashers.check_password(raw_password, encoded), False
+
+        before = self.run('request threads', inline, logins, threads)
+
+        pool = HashingPool(options['workers'])
+        try:
+            # Start the workers before timing
+            pool.run(hashers.make_password, 'warm-up')
+            after = self.run(
+                f'process pool ({options["workers"]} procs)',
+                lambda raw_password, encoded: check_password(raw_password, encoded, pool=pool),
+                logins,
+                threads,
+            )
+            self.stdout.write(self.style.SUCCESS(f'Speedup: {after / before:.2f}x'))
+
+            # Django runs a sync view under ASGI on a thread of its own per request
+            self.stdout.write(f'\nOne ASGI worker, {logins} logins at once')
+            encoded = hashers.make_password('benchmark-password')
+            sync_latency = asyncio.run(self.run_asgi(
+                'sync view, inline hash',
+                lambda: sync_view(hashers.check_password, 'benchmark-password', encoded),
+                logins,
+            ))
+
+            async def async_login():
+                valid, _must_update = await acheck_password('benchmark-password', encoded, pool=pool)
+                return valid
+
+            async_latency = asyncio.run(self.run_asgi('async view, pool', async_login, logins))
+        finally:
+            pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Other requests during the burst: {sync_latency / async_latency:.1f}x faster with async login views'
+        ))
+
+
+def cheap_request():
+    # About a millisecond of Python, like rendering a small page
+    return sum(range(20000))
+
+
+async def sync_view(func, *args):
+    async with ThreadSensitiveContext():
+        return await sync_to_async(func)(*args)
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+INDEX_NAME = 'store_auth_user_email_uniq'
+
+
+def create_email_index(apps, schema_editor):
+    # Blank emails (e.g. users created in the admin) stay allowed
+    schema_editor.execute(
+        f'CREATE UNIQUE INDEX IF NOT EXISTS {INDEX_NAME} '
+        f'ON {schema_editor.quote_name("auth_user")} ({schema_editor.quote_name("email")}) '
+        f"WHERE {schema_editor.quote_name('email')} <> ''"
+    )
+
+
+def drop_email_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+    """
+    Make registration emails unique so RegisterView can rely on the INSERT.
+
+    Fails if auth_user already holds duplicate non-blank emails; merge or
+    blank those accounts first.
+    """
+
+    dependencies = [
+        ("store", "0004_usertokenversion"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
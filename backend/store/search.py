@@ -0,0 +1,47 @@
+"""
+Substring search that can use trigram indexes.
+
+Django's ``icontains`` compiles to ``UPPER(column) LIKE UPPER(%term%)`` on
+PostgreSQL, which no plain index can serve. The ``ilike`` lookup registered
+here compiles to ``column ILIKE %term%`` instead, which PostgreSQL answers from
+the ``gin_trgm_ops`` indexes created in ``store.migrations.0003``. Other
+databases get ordinary ``icontains`` SQL, so ``name__ilike`` works everywhere.
+
+Admin ``search_fields`` and DRF ``SearchFilter`` both accept an explicit
+lookup, e.g. ``search_fields = ['name__ilike']``.
+"""
+
+from django.db import models
+from django.db.models.lookups import IContains
+
+# (table, column) pairs with a pg_trgm GIN index; see store.migrations.0003
+TRIGRAM_INDEXES = [
+    ('store_product', 'name'),
+    ('store_product', 'description'),
+    ('store_review', 'title'),
+    ('store_review', 'comment'),
+    ('auth_user', 'username'),
+]
+
+
+class ILike(IContains):
+    lookup_name = 'ilike'
+
+    def as_sql(self, compiler, connection):
+        # Backends only know the SQL for their built-in lookups
+        return IContains(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection):
+        if not self.rhs_is_direct_value():
+            return self.as_sql(compiler, connection)
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs_sql} ILIKE {rhs_sql}', (*lhs_params, *rhs_params)
+
+
+models.CharField.register_lookup(ILike)
+models.TextField.register_lookup(ILike)
+
+
+def trigram_index_name(table, column):
+    return f'{table}_{column}_trgm'
@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from ecommerce.metrics import TimedSerializerMixin
 from .models import Product, CartItem, Review
 from orders.models import Order, OrderItem
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source='user.username')
     user_full_name = serializers.ReadOnlyField(source='user.get_full_name')
     
@@ -17,17 +18,17 @@ class ReviewSerializer(serializers.ModelSerializer):
         return value
     
     def create(self, validated_data):
-        user = self.context['request'].user
+        user_id = self.context['request'].user.id
         product = validated_data['product']
         
         # Check if user has already reviewed this product
-        if Review.objects.filter(user=user, product=product).exists():
+        if Review.objects.filter(user_id=user_id, product=product).exists():
             raise serializers.ValidationError("You have already reviewed this product.")
         
-        validated_data['user'] = user
+        validated_data['user_id'] = user_id
         return super().create(validated_data)
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_in_stock = serializers.ReadOnlyField()
     average_rating = serializers.ReadOnlyField()
     review_count = serializers.ReadOnlyField()
@@ -43,7 +44,7 @@ class ProductDetailSerializer(ProductSerializer):
     class Meta(ProductSerializer.Meta):
         fields = ProductSerializer.Meta.fields + ['reviews']
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
     total_price = serializers.ReadOnlyField()
@@ -66,13 +67,14 @@ class CartItemSerializer(serializers.ModelSerializer):
         return value
     
     def create(self, validated_data):
-        user = self.context['request'].user
+        user_id = self.context['request'].user.id
         product_id = validated_data.pop('product_id')
-        product = Product.objects.get(id=product_id)
+        # Annotated so the response's nested ratings need no further queries
+        product = Product.objects.with_ratings().get(id=product_id)
         
         # Check if item already exists in cart
         cart_item, created = CartItem.objects.get_or_create(
-            user=user,
+            user_id=user_id,
             product=product,
             defaults={'quantity': validated_data.get('quantity', 1)}
         )
@@ -83,7 +85,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         
         return cart_item
 
-class CartItemUpdateSerializer(serializers.ModelSerializer):
+class CartItemUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['quantity']
@@ -1,3 +1,349 @@
-from django.test import TestCase
+import asyncio
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models.sql import Query
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from ecommerce import throttling
+from orders.models import Order, OrderItem
+from .models import Product, CartItem, Review
+from . import hashing
+from .authentication import forget_version, tokens_for_user
+from .search import ILike
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Changelist pages run the same number of queries however many rows they show."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        self.client.force_login(self.admin)
+        self.rows = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.rows += 1
+            user = User.objects.create_user(username=f'customer{self.rows}', password='secret')
+            product = Product.objects.create(name=f'Product {self.rows}', description='Test', price=Decimal('10.00'), inventory_count=3)
+            Review.objects.create(user=user, product=product, rating=4)
+            CartItem.objects.create(user=user, product=product, quantity=2)
+            order = Order.objects.create(user=user, total_amount=Decimal('10.00'))
+            OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=Decimal('10.00'))
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        urls = [
+            '/admin/store/product/',
+            '/admin/store/cartitem/',
+            '/admin/store/review/',
+            '/admin/orders/order/',
+            '/admin/orders/orderitem/',
+        ]
+        self.add_rows(2)
+        few = {url: self.changelist_queries(url) for url in urls}
+        self.add_rows(8)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.changelist_queries(url), few[url])
+
+    def test_aggregate_columns_are_sortable(self):
+        self.add_rows(2)
+        Review.objects.create(user=self.admin, product=Product.objects.get(name='Product 1'), rating=1)
+        # Column 5 of ProductAdmin.list_display is review_count
+        response = self.client.get('/admin/store/product/', {'o': '-6'})
+        self.assertEqual(response.context['cl'].result_list[0].name, 'Product 1')
+        response = self.client.get('/admin/orders/order/', {'o': '5'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductRatingOrderingTests(APITestCase):
+    def test_orders_by_average_rating_in_the_database(self):
+        reviewer = User.objects.create_user(username='reviewer', password='secret')
+        for name, rating in [('Good', 5), ('Unrated', None), ('Poor', 2)]:
+            product = Product.objects.create(name=name, description='Test', price=Decimal('10.00'))
+            if rating:
+                Review.objects.create(user=reviewer, product=product, rating=rating)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/', {'ordering': '-average_rating'})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Good', 'Poor', 'Unrated'])
+        self.assertEqual(response.data['results'][2]['average_rating'], 0)
+        response = self.client.get('/api/products/', {'ordering': 'average_rating', 'search': 'o'})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Poor', 'Good'])
+
+
+class ILikeSearchTests(APITestCase):
+    def setUp(self):
+        for name in ['Desk Lamp', 'Lamp Shade', '100% Cotton Tee', 'Coffee Mug']:
+            Product.objects.create(name=name, description='Test', price=Decimal('10.00'))
+
+    def test_matches_substrings_case_insensitively(self):
+        names = set(Product.objects.filter(name__ilike='LAMP').values_list('name', flat=True))
+        self.assertEqual(names, {'Desk Lamp', 'Lamp Shade'})
+        # Wildcards in the search term are matched literally
+        self.assertEqual(list(Product.objects.filter(name__ilike='0%').values_list('name', flat=True)), ['100% Cotton Tee'])
+        self.assertFalse(Product.objects.filter(name__ilike='_').exists())
+
+    def test_compiles_to_ilike_on_postgresql(self):
+        query = Query(Product)
+        lookup = ILike(query.resolve_ref('name'), 'lamp')
+        sql, params = lookup.as_postgresql(query.get_compiler(connection=connection), connection)
+        self.assertIn(' ILIKE ', sql)
+        self.assertEqual(params, ('%lamp%',))
+
+    def test_api_search(self):
+        response = self.client.get('/api/products/', {'search': 'lamp'})
+        self.assertEqual(sorted(product['name'] for product in response.data['results']), ['Desk Lamp', 'Lamp Shade'])
+
+    def test_admin_order_search_matches_id_exactly(self):
+        admin_user = User.objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        self.client.force_login(admin_user)
+        orders = [Order.objects.create(user=admin_user, total_amount=Decimal('10.00')) for _ in range(12)]
+        response = self.client.get('/admin/orders/order/', {'q': f'#{orders[0].id}'})
+        self.assertEqual([order.id for order in response.context['cl'].result_list], [orders[0].id])
+        response = self.client.get('/admin/orders/order/', {'q': 'adm'})
+        self.assertEqual(len(response.context['cl'].result_list), 12)
+
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        # Versions cached by earlier tests refer to rolled-back rows
+        forget_version()
+        throttling.reset()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+
+    def obtain(self, username='buyer', password='secret'):
+        response = self.client.post('/api/token/', {'username': username, 'password': password}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get(self, url, access):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_requests_do_not_load_the_user(self):
+        access = self.obtain()['access']
+        # The cart query only; the token version is still cached from issuing the token
+        with self.assertNumQueries(1):
+            response = self.get('/api/cart/', access)
+        self.assertEqual(response.status_code, 200)
+        forget_version()
+        with self.assertNumQueries(2):
+            self.get('/api/cart/', access)
+
+    def test_password_change_revokes_tokens(self):
+        tokens = self.obtain()
+        self.user.set_password('new-secret')
+        self.user.save()
+        self.assertEqual(self.get('/api/cart/', tokens['access']).status_code, 401)
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.get('/api/cart/', self.obtain(password='new-secret')['access']).status_code, 200)
+
+    def test_deactivation_and_staff_claims(self):
+        access = self.obtain()['access']
+        self.assertEqual(self.get('/api/orders/cache_stats/', access).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.get('/api/orders/cache_stats/', self.obtain()['access']).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get('/api/orders/', access).status_code, 401)
+
+
+@override_settings(
+    PASSWORD_HASHING_WORKERS=0,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    AUTHENTICATION_BACKENDS=['store.backends.PooledHashingBackend'],
+)
+class RegistrationTests(APITestCase):
+    def setUp(self):
+        forget_version()
+        throttling.reset()
+
+    def register(self, **data):
+        payload = {'username': 'buyer', 'email': 'buyer@example.com', 'password': 'secret', 'first_name': 'Ann', 'last_name': 'Lee'}
+        payload.update(data)
+        return self.client.post('/api/register/', payload, format='json')
+
+    def test_register_inserts_without_lookups(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register()
+        self.assertEqual(response.status_code, 201)
+        user_queries = [query['sql'] for query in queries if 'auth_user' in query['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertTrue(user_queries[0].startswith('INSERT'))
+        self.assertTrue(User.objects.get(username='buyer').check_password('secret'))
+
+    def test_duplicates_are_reported_from_the_constraint(self):
+        self.register()
+        self.assertEqual(self.register(email='other@example.com').data['detail'], 'Username already exists')
+        self.assertEqual(self.register(username='other').data['detail'], 'Email already exists')
+        # Blank emails are not unique
+        self.assertEqual(self.register(username='a', email='').status_code, 201)
+        self.assertEqual(self.register(username='b', email='').status_code, 201)
+
+    def test_login_through_pooled_backend(self):
+        self.register()
+        self.assertEqual(self.client.post('/api/token/', {'username': 'buyer', 'password': 'secret'}).status_code, 200)
+        self.assertEqual(self.client.post('/api/token/', {'username': 'buyer', 'password': 'wrong'}).status_code, 401)
+        self.assertEqual(self.client.post('/api/token/', {'username': 'nobody', 'password': 'secret'}).status_code, 401)
+
+    def test_rehash_at_login_keeps_issued_tokens(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com')
+        # A salt this short makes the hasher ask for an upgrade
+        User.objects.filter(pk=user.pk).update(password=make_password('secret', salt='short', hasher='md5'))
+        access = tokens_for_user(user).access_token
+        self.assertEqual(self.client.post('/api/token/', {'username': 'buyer', 'password': 'secret'}).status_code, 200)
+        user.refresh_from_db()
+        self.assertNotIn('$short$', user.password)
+        forget_version()
+        self.assertEqual(self.client.get('/api/cart/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 200)
+
+    def both(self, path, data):
+        """POST ``data`` to the DRF endpoint and the async one, in that order."""
+        return [self.client.post(f'{prefix}{path}', data, format='json') for prefix in ['/api/', '/api/async/']]
+
+    @override_settings(THROTTLE_RATES={'register': None})
+    def test_async_register_matches_drf(self):
+        sync, async_response = [
+            self.client.post(f'{prefix}register/', {'username': username, 'email': f'{username}@example.com', 'password': 'secret', 'first_name': 'Ann'}, format='json').json()
+            for prefix, username in [('/api/', 'sync'), ('/api/async/', 'async')]
+        ]
+        self.assertEqual(async_response['user'], {**sync['user'], 'id': async_response['user']['id'], 'username': 'async', 'email': 'async@example.com'})
+        access = async_response['access']
+        self.assertEqual(self.client.get('/api/cart/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 200)
+        self.assertTrue(User.objects.get(username='async').check_password('secret'))
+        for data in [{'username': 'sync', 'password': 'pw'}, {'username': 'new', 'email': 'sync@example.com'}, {'password': 'pw'}]:
+            sync, async_response = self.both('register/', data)
+            self.assertEqual((async_response.status_code, async_response.json()), (sync.status_code, sync.json()))
+
+    def test_async_login_matches_drf(self):
+        self.register()
+        sync, async_response = self.both('token/', {'username': 'buyer', 'password': 'secret'})
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(set(async_response.json()), set(sync.json()))
+        access = async_response.json()['access']
+        self.assertEqual(self.client.get('/api/cart/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 200)
+        for data in [{'username': 'buyer', 'password': 'wrong'}, {'username': 'nobody', 'password': 'secret'}, {'username': 'buyer'}]:
+            sync, async_response = self.both('token/', data)
+            self.assertEqual((async_response.status_code, async_response.json()), (sync.status_code, sync.json()))
+            self.assertEqual(async_response.get('WWW-Authenticate'), sync.get('WWW-Authenticate'))
+        self.assertEqual(self.client.get('/api/async/token/').status_code, 405)
+
+    def test_async_rehash_at_login_keeps_issued_tokens(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com')
+        User.objects.filter(pk=user.pk).update(password=make_password('secret', salt='short', hasher='md5'))
+        access = tokens_for_user(user).access_token
+        self.assertEqual(self.client.post('/api/async/token/', {'username': 'buyer', 'password': 'secret'}).status_code, 200)
+        user.refresh_from_db()
+        self.assertNotIn('$short$', user.password)
+        forget_version()
+        self.assertEqual(self.client.get('/api/cart/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 200)
+
+    @override_settings(THROTTLE_RATES={'login': '1/min'})
+    def test_async_login_is_throttled(self):
+        statuses = [self.client.post('/api/async/token/', {'username': 'x', 'password': 'y'}).status_code for _ in range(2)]
+        self.assertEqual(statuses, [401, 429])
+
+
+class HashingPoolTests(TestCase):
+    def test_hashes_in_worker_process(self):
+        pool = hashing.HashingPool(1)
+        try:
+            encoded = hashing.make_password('secret', pool=pool)
+            self.assertEqual(hashing.check_password('secret', encoded, pool=pool), (True, False))
+            self.assertEqual(hashing.check_password('wrong', encoded, pool=pool), (False, False))
+        finally:
+            pool.shutdown()
+
+    def test_async_hashing_awaits_the_pool(self):
+        pool = hashing.HashingPool(1, max_pending=1)
+
+        async def hash_and_check():
+            # Two at once: the second waits for the single slot
+            encoded, other = await asyncio.gather(hashing.amake_password('secret', pool=pool), hashing.amake_password('other', pool=pool))
+            return await hashing.acheck_password('secret', encoded, pool=pool), await hashing.acheck_password('secret', other, pool=pool)
+
+        try:
+            self.assertEqual(async_to_sync(hash_and_check)(), ((True, False), (False, False)))
+        finally:
+            pool.shutdown()
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0)
+    def test_async_hashing_inline(self):
+        encoded = async_to_sync(hashing.amake_password)('secret')
+        self.assertEqual(async_to_sync(hashing.acheck_password)('secret', encoded), (True, False))
+
+
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        forget_version()
+        throttling.reset()
+        self.user = User.objects.create_user(username='buyer', first_name='Ann', password='secret')
+        self.products = [
+            Product.objects.create(name=f'Lamp {n}', description='Desk lamp', price=Decimal(f'{10 + n}.00'), inventory_count=n)
+            for n in range(15)
+        ]
+        Review.objects.create(user=self.user, product=self.products[3], rating=5, title='Bright')
+        CartItem.objects.create(user=self.user, product=self.products[3], quantity=2)
+
+    def compare(self, path, headers=None, **params):
+        sync = self.client.get(f'/api/{path}', params, **(headers or {}))
+        async_response = self.client.get(f'/api/async/{path}', params, **(headers or {}))
+        self.assertEqual(async_response.status_code, sync.status_code)
+        # Pagination links differ only in the /api/async/ prefix
+        self.assertEqual(json.loads(async_response.content.decode().replace('/api/async/', '/api/')), sync.json())
+        return async_response.json()
+
+    def test_product_reads_match_drf(self):
+        data = self.compare('products/', ordering='price', page=2)
+        self.assertEqual(data['count'], 15)
+        self.compare('products/', search='lamp 1')
+        self.compare(f'products/{self.products[3].id}/')
+        self.compare(f'products/{self.products[3].id}/reviews/')
+        self.assertEqual(self.client.get('/api/async/products/999999/').status_code, 404)
+
+    def test_filters_and_ordering_match_drf(self):
+        Product.objects.filter(id__in=[p.id for p in self.products[:5]]).update(price=Decimal('10.00'))
+        self.compare('products/', search='desk lamp')
+        self.compare('products/', search='nothing')
+        self.compare('products/', ordering='price,-name')
+        self.compare('products/', ordering='-price,name', page=2)
+        self.compare('products/', ordering='-average_rating', page=2)
+        self.compare('products/', inventory_count=3)
+        self.compare('products/', inventory_count='many')
+        self.compare('products/', page=9)
+
+    def test_token_errors_match_drf(self):
+        for headers in [{}, {'HTTP_AUTHORIZATION': 'Bearer not-a-token'}]:
+            for path in ['cart/', 'reviews/my_reviews/', 'reviews/product_reviews/']:
+                sync = self.client.get(f'/api/{path}', **headers)
+                async_response = self.client.get(f'/api/async/{path}', **headers)
+                self.assertEqual(async_response.status_code, 401)
+                self.assertEqual(async_response.json(), sync.json())
+                self.assertEqual(async_response['WWW-Authenticate'], sync['WWW-Authenticate'])
+
+    def test_rating_ordering_puts_unrated_last(self):
+        data = self.client.get('/api/async/products/', {'ordering': '-average_rating'}).json()
+        self.assertEqual(data['results'][0]['id'], self.products[3].id)
+
+    def test_cart_and_my_reviews_need_a_token(self):
+        self.assertEqual(self.client.get('/api/async/cart/').status_code, 401)
+        access = self.client.post('/api/token/', {'username': 'buyer', 'password': 'secret'}).data['access']
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+        self.compare('cart/', headers)
+        self.compare('reviews/my_reviews/', headers)
+        self.compare('reviews/product_reviews/', headers, product_id=self.products[3].id)
+        self.assertEqual(self.client.get('/api/async/reviews/product_reviews/').status_code, 401)
@@ -6,60 +6,74 @@ from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.pagination import PageNumberPagination
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
+from ecommerce.throttling import RegisterThrottle
+from orders.idempotency import idempotent
+from . import hashing
+from .authentication import ClaimsJWTAuthentication, tokens_for_user
 from .models import Product, CartItem, Review
 from .serializers import ProductSerializer, ProductDetailSerializer, CartItemSerializer, CartItemUpdateSerializer, ReviewSerializer
 
 # Create your views here.
 
+def new_user(data):
+    """An unsaved ``User`` from registration ``data``, without its password."""
+    username = data.get('username')
+    if not username:
+        raise ValueError('The given username must be set')
+    return User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(data.get('email')),
+        first_name=data.get('first_name') or '',
+        last_name=data.get('last_name') or ''
+    )
+
+def save_new_user(user):
+    """
+    Insert ``user``. Returns None, or the error to show when the username or
+    email is taken.
+    """
+    # Usernames and emails are unique in the database (see store migration
+    # 0005); a duplicate fails the INSERT instead of being looked up first
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        if User.objects.filter(username=user.username).exists():
+            return 'Username already exists'
+        if User.objects.filter(email=user.email).exists():
+            return 'Email already exists'
+        raise
+    return None
+
+def registration_data(user):
+    """The tokens and profile returned for a new ``user``."""
+    refresh = tokens_for_user(user)
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name
+        }
+    }
+
 class RegisterView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegisterThrottle]
     
     def post(self, request):
         try:
-            username = request.data.get('username')
-            email = request.data.get('email')
-            password = request.data.get('password')
-            first_name = request.data.get('first_name')
-            last_name = request.data.get('last_name')
-            
-            # Check if user already exists
-            if User.objects.filter(username=username).exists():
-                return Response(
-                    {'detail': 'Username already exists'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            if User.objects.filter(email=email).exists():
-                return Response(
-                    {'detail': 'Email already exists'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Create user
-            user = User.objects.create_user(
-                username=username,
-                email=email,
-                password=password,
-                first_name=first_name,
-                last_name=last_name
-            )
-            
-            # Generate tokens
-            refresh = RefreshToken.for_user(user)
-            
-            return Response({
-                'access': str(refresh.access_token),
-                'refresh': str(refresh),
-                'user': {
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name
-                }
-            }, status=status.HTTP_201_CREATED)
+            user = new_user(request.data)
+            user.password = hashing.make_password(request.data.get('password'))
+            detail = save_new_user(user)
+            if detail:
+                return Response({'detail': detail}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(registration_data(user), status=status.HTTP_201_CREATED)
             
         except Exception as e:
             return Response(
@@ -68,54 +82,34 @@ class RegisterView(APIView):
             )
 
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Product.objects.all()
+    # Ratings are annotated so listing them costs no query per product
+    queryset = Product.objects.with_ratings()
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['inventory_count']
-    search_fields = ['name', 'description']
+    # ilike uses the trigram indexes on PostgreSQL (see store.search)
+    search_fields = ['name__ilike', 'description__ilike']
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['-created_at']
     
-    def list(self, request, *args, **kwargs):
-        ordering = request.query_params.get('ordering', '')
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related(Prefetch('reviews', queryset=Review.objects.select_related('user')))
+        return queryset
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        ordering = self.request.query_params.get('ordering', '')
         
         # Handle custom ordering for average_rating
         if ordering in ['average_rating', '-average_rating']:
-            # Get all products and sort them in Python
-            products = list(Product.objects.all())
-            reverse = ordering.startswith('-')
-            products.sort(key=lambda p: p.average_rating, reverse=reverse)
-            
-            # Manual pagination
-            paginator = PageNumberPagination()
-            paginator.page_size = 12
-            
-            # Get the requested page
-            page = request.query_params.get('page', 1)
-            try:
-                page = int(page)
-            except ValueError:
-                page = 1
-            
-            # Calculate pagination
-            start = (page - 1) * paginator.page_size
-            end = start + paginator.page_size
-            page_products = products[start:end]
-            
-            # Serialize the page
-            serializer = self.get_serializer(page_products, many=True)
-            
-            # Create pagination response
-            return Response({
-                'count': len(products),
-                'next': f"{request.build_absolute_uri().split('?')[0]}?ordering={ordering}&page={page + 1}" if end < len(products) else None,
-                'previous': f"{request.build_absolute_uri().split('?')[0]}?ordering={ordering}&page={page - 1}" if page > 1 else None,
-                'results': serializer.data
-            })
-        
-        # Use default behavior for other ordering
-        return super().list(request, *args, **kwargs)
+            # Sort on the annotated average; unrated products rank lowest, like their 0 rating
+            rating = F('rating_average')
+            rating = rating.desc(nulls_last=True) if ordering.startswith('-') else rating.asc(nulls_first=True)
+            queryset = queryset.order_by(rating, '-created_at')
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -135,22 +129,23 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
         product = self.get_object()
-        reviews = product.reviews.all()
+        reviews = product.reviews.select_related('user')
         serializer = ReviewSerializer(reviews, many=True)
         return Response(serializer.data)
 
 class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Review.objects.filter(user=self.request.user)
+        return Review.objects.filter(user_id=self.request.user.id).select_related('user')
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
     
     def perform_update(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
     
     @action(detail=False, methods=['get'])
     def my_reviews(self, request):
@@ -168,7 +163,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            reviews = Review.objects.filter(product_id=product_id)
+            reviews = Review.objects.filter(product_id=product_id).select_related('user')
             serializer = self.get_serializer(reviews, many=True)
             return Response(serializer.data)
         except Review.DoesNotExist:
@@ -179,30 +174,48 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
 class CartItemViewSet(viewsets.ModelViewSet):
     serializer_class = CartItemSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None  # Disable pagination for cart items
     
     def get_queryset(self):
-        return CartItem.objects.filter(user=self.request.user)
+        queryset = CartItem.objects.filter(user_id=self.request.user.id)
+        if self.action in ['list', 'retrieve']:
+            # The nested product renders its ratings
+            queryset = queryset.prefetch_related(Prefetch('product', queryset=Product.objects.with_ratings()))
+        return queryset
     
     def get_serializer_class(self):
         if self.action in ['update', 'partial_update']:
             return CartItemUpdateSerializer
         return CartItemSerializer
     
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
+    @idempotent
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+    
+    @idempotent
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+    
     @action(detail=False, methods=['get'])
     def total(self, request):
-        cart_items = self.get_queryset()
+        cart_items = list(CartItem.objects.filter(user_id=request.user.id).select_related('product'))
         total_amount = sum(item.total_price for item in cart_items)
         total_items = sum(item.quantity for item in cart_items)
         
         return Response({
             'total_amount': total_amount,
             'total_items': total_items,
-            'item_count': cart_items.count()
+            'item_count': len(cart_items)
         })
     
     @action(detail=False, methods=['delete'])
+    @idempotent
     def clear(self, request):
         cart_items = self.get_queryset()
         cart_items.delete()